@@ -0,0 +1,307 @@
+"""
+Benchmark suite for the Utility Infrastructure API.
+
+For each data size, synthetic data is generated and a fresh process loads it
+and measures:
+
+- load time and throughput of both datasets,
+- peak resident memory after loading,
+- p50/p99 latency of every endpoint over a mix of realistic queries,
+- the time of a full reload.
+
+Each size runs in its own process so peak memory is not inflated by an
+earlier, larger run. Results are written as JSON; pass --baseline with an
+earlier result file to flag endpoints that got slower.
+
+Usage:
+    python -m benchmarks.run_benchmarks --sizes 1000,10000,100000 --output bench_results.json
+    python -m benchmarks.run_benchmarks --sizes 1000000 --logs-per-equipment 10 --engine columnar
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.synthetic_data import generate_dataset
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+DEFAULT_REQUESTS = 200
+
+# Slowdown beyond which a comparison with a baseline reports a regression
+REGRESSION_THRESHOLD = 1.2
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Return the sample at a fraction of the sorted samples (nearest rank)."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    """Summarize latencies in seconds as milliseconds."""
+    return {
+        "requests": len(samples),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3)
+    }
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def endpoint_requests(rng: random.Random) -> Dict[str, Callable[[], str]]:
+    """Return a URL factory per endpoint, drawing parameters from the loaded data."""
+    from src.data_processor import get_entity_catalog, get_equipment_data
+
+    entities = get_entity_catalog()["entities"]
+    equipment = get_equipment_data()
+
+    def pick(key: str) -> str:
+        return rng.choice(entities[key]) if entities[key] else ""
+
+    def equipment_id() -> str:
+        return equipment[rng.randrange(len(equipment))]["equipment_id"]
+
+    def month() -> str:
+        # Synthetic maintenance dates span 2015-2024
+        return f"{rng.randint(2015, 2024)}-{rng.randint(1, 12):02d}"
+
+    return {
+        "GET /": lambda: "/",
+        "GET /health/live": lambda: "/health/live",
+        "GET /api/equipment": lambda: f"/api/equipment?equipment_type={pick('equipment_types')}&limit=100",
+        "GET /api/equipment (page)": lambda: "/api/equipment?limit=1000",
+        "GET /api/maintenance": lambda: f"/api/maintenance?technician={pick('technicians')}&limit=100",
+        "GET /api/maintenance (date range)": lambda: (f"/api/maintenance?date_from={month()}-01"
+                                                      f"&date_to={month()[:4]}-12-31&limit=100"),
+        "GET /api/equipment (date range)": lambda: (f"/api/equipment?equipment_type={pick('equipment_types')}"
+                                                    f"&installed_from={rng.randint(1995, 2020)}-01-01&limit=100"),
+        "GET /api/maintenance/schedule": lambda: (f"/api/maintenance/schedule?status={rng.choice(['upcoming', 'overdue'])}"
+                                                  f"&as_of={month()}-15&days=60&limit=100"),
+        "GET /api/entities": lambda: "/api/entities?top=10",
+        "GET /api/search": lambda: f"/api/search?query={pick('equipment_types').lower()}&limit=100",
+        "GET /api/search (ranked)": lambda: (f"/api/search?query={pick('maintenance_types').lower()}"
+                                             f"%20{pick('equipment_types').lower()}&mode=ranked&limit=20"),
+        "GET /api/search (prefix)": lambda: f"/api/search?query={pick('technicians')[:3]}&mode=prefix&limit=100",
+        "GET /api/autocomplete": lambda: f"/api/autocomplete?prefix={pick('technicians')[:2]}&limit=10",
+        "GET /api/equipment/{id}/relationships": lambda: f"/api/equipment/{equipment_id()}/relationships",
+        "GET /api/relationships/{target}": lambda: (f"/api/relationships/technicians?equipment_type="
+                                                     f"{pick('equipment_types')}&location={pick('locations')}"),
+        "GET /api/analytics/costs": lambda: f"/api/analytics/costs?group_by={rng.choice(['location', 'technician', 'month'])}"
+    }
+
+def batch_body(rng: random.Random) -> Callable[[], bytes]:
+    """Return a factory of batch request bodies mixing list, date range and search queries."""
+    from src.data_processor import get_entity_catalog
+
+    entities = get_entity_catalog()["entities"]
+
+    def pick(key: str) -> str:
+        return rng.choice(entities[key]) if entities[key] else ""
+
+    def body() -> bytes:
+        year = rng.randint(2015, 2024)
+        queries = []
+        for number in range(10):
+            queries += [
+                {"id": f"type{number}", "type": "equipment",
+                 "params": {"equipment_type": pick("equipment_types"), "limit": 20}},
+                {"id": f"tech{number}", "type": "maintenance",
+                 "params": {"technician": pick("technicians"), "date_from": f"{year}-01-01", "limit": 20}},
+                {"id": f"search{number}", "type": "search",
+                 "params": {"query": pick("maintenance_types").lower(), "limit": 20}}
+            ]
+        return json.dumps({"queries": queries}).encode("utf-8")
+    return body
+
+def time_requests(client, make_url: Callable[[], str], count: int, method: str = "GET",
+                  body: Optional[Callable[[], bytes]] = None, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Issue requests and summarize their latency; fails on any non-2xx response."""
+    samples = []
+    for _ in range(count):
+        url = make_url()
+        content = body() if body else None
+        started = time.perf_counter()
+        response = client.request(method, url, content=content, headers=headers)
+        samples.append(time.perf_counter() - started)
+        if response.status_code >= 300:
+            raise RuntimeError(f"{method} {url} returned {response.status_code}: {response.text[:200]}")
+    return summarize(samples)
+
+def benchmark_size(equipment_count: int, log_count: int, requests: int = DEFAULT_REQUESTS,
+                   engine: str = "rows", use_cache: bool = False, workdir: Optional[Path] = None,
+                   seed: int = 0) -> Dict[str, Any]:
+    """Generate, load and benchmark one data size in the current process."""
+    from fastapi.testclient import TestClient
+    from main import app
+    from src import data_processor
+    from src import api
+    from src.response_cache import response_cache
+
+    data_processor.set_storage_engine(engine)
+    with tempfile.TemporaryDirectory(dir=workdir) as directory:
+        started = time.perf_counter()
+        equipment_path, maintenance_path = generate_dataset(Path(directory), equipment_count, log_count, seed)
+        generate_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        if not data_processor.load_equipment_data(equipment_path):
+            raise RuntimeError("Loading equipment failed")
+        equipment_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        if not data_processor.load_maintenance_logs(maintenance_path):
+            raise RuntimeError("Loading maintenance failed")
+        maintenance_seconds = time.perf_counter() - started
+        load_peak = peak_rss_mb()
+
+        if not use_cache:
+            # Measure the handlers rather than cache hits
+            response_cache.max_entries = 0
+
+        rng = random.Random(seed)
+        endpoints = {}
+        # Without the context manager the app's lifespan does not load the sample data
+        client = TestClient(app)
+        for name, make_url in endpoint_requests(rng).items():
+            time_requests(client, make_url, min(5, requests))
+            endpoints[name] = time_requests(client, make_url, requests)
+
+        make_batch = batch_body(rng)
+        for name, url in (("POST /api/batch", "/api/batch"), ("POST /api/batch (stream)", "/api/batch?stream=true")):
+            time_requests(client, lambda: url, min(5, requests), method="POST", body=make_batch,
+                          headers={"Content-Type": "application/json"})
+            endpoints[name] = time_requests(client, lambda: url, max(1, requests // 10), method="POST",
+                                            body=make_batch, headers={"Content-Type": "application/json"})
+
+        # Ingestion is an admin endpoint; use a token private to this run
+        api.ADMIN_TOKEN = "benchmark"
+        ingest_rows = 100
+        counter = iter(range(10**9))
+        endpoints["POST /api/maintenance/ingest"] = time_requests(
+            client, lambda: "/api/maintenance/ingest", max(1, requests // 10), method="POST",
+            headers={"Content-Type": "application/x-ndjson", "X-Admin-Token": "benchmark"},
+            body=lambda: "\n".join(json.dumps({
+                "log_id": f"BENCH{next(counter)}", "equipment_id": "EQ0000001", "technician": "Bench Tech",
+                "maintenance_type": "Routine Inspection", "date": "2024-06-01", "cost": 100.0
+            }) for _ in range(ingest_rows)).encode("utf-8")
+        )
+
+        started = time.perf_counter()
+        if data_processor.reload_data(equipment_path, maintenance_path) is None:
+            raise RuntimeError("Reload failed")
+        reload_seconds = time.perf_counter() - started
+
+    snapshot = data_processor.get_snapshot()
+    return {
+        "equipment": equipment_count,
+        "maintenance": log_count,
+        "engine": engine,
+        "response_cache": use_cache,
+        "generate_seconds": round(generate_seconds, 3),
+        "load": {
+            "equipment_seconds": round(equipment_seconds, 3),
+            "maintenance_seconds": round(maintenance_seconds, 3),
+            "equipment_records_per_second": round(equipment_count / equipment_seconds, 1),
+            "maintenance_records_per_second": round(log_count / maintenance_seconds, 1),
+            "reload_seconds": round(reload_seconds, 3)
+        },
+        "peak_rss_mb": {"after_load": load_peak, "after_requests": peak_rss_mb()},
+        "records_loaded": {"equipment": len(snapshot.equipment.records), "maintenance": len(snapshot.maintenance.records)},
+        "endpoints": endpoints
+    }
+
+def _run_in_child(queue, *args):
+    try:
+        queue.put(("ok", benchmark_size(*args)))
+    except Exception as e:
+        queue.put(("error", f"{type(e).__name__}: {e}"))
+
+def run_isolated(*args) -> Dict[str, Any]:
+    """Run benchmark_size in a fresh process so peak memory reflects that size alone."""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_in_child, args=(queue, *args))
+    process.start()
+    status, result = queue.get()
+    process.join()
+    if status != "ok":
+        raise RuntimeError(result)
+    return result
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any],
+            threshold: float = REGRESSION_THRESHOLD) -> List[Dict[str, Any]]:
+    """List endpoints and loads whose time grew beyond the threshold versus a baseline run."""
+    previous = {(run["equipment"], run["maintenance"], run["engine"]): run for run in baseline["runs"]}
+    regressions = []
+    for run in results["runs"]:
+        before = previous.get((run["equipment"], run["maintenance"], run["engine"]))
+        if before is None:
+            continue
+
+        checks = [(f"load {key}", run["load"][key], before["load"].get(key))
+                  for key in ("equipment_seconds", "maintenance_seconds", "reload_seconds")]
+        checks += [(f"{name} p99", stats["p99_ms"], before["endpoints"].get(name, {}).get("p99_ms"))
+                   for name, stats in run["endpoints"].items()]
+
+        for metric, value, old in checks:
+            if old and value > old * threshold:
+                regressions.append({"size": run["equipment"], "metric": metric, "baseline": old,
+                                    "current": value, "ratio": round(value / old, 2)})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark loading and endpoint latency at several data sizes")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma-separated equipment counts")
+    parser.add_argument("--logs-per-equipment", type=float, default=10, help="Maintenance logs per equipment row")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="Timed requests per endpoint")
+    parser.add_argument("--engine", choices=("rows", "columnar"), default="rows", help="Storage engine")
+    parser.add_argument("--cache", action="store_true", help="Leave the response cache enabled")
+    parser.add_argument("--workdir", type=Path, default=None, help="Directory for generated data files")
+    parser.add_argument("--output", type=Path, default=Path("bench_results.json"), help="Result file (JSON)")
+    parser.add_argument("--baseline", type=Path, default=None, help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    runs = []
+    for size in (int(value) for value in args.sizes.split(",") if value.strip()):
+        log_count = int(size * args.logs_per_equipment)
+        print(f" Benchmarking {size} equipment / {log_count} logs ({args.engine})")
+        run = run_isolated(size, log_count, args.requests, args.engine, args.cache, args.workdir)
+        runs.append(run)
+        print(f"  load {run['load']['equipment_seconds']}s + {run['load']['maintenance_seconds']}s, "
+              f"peak {run['peak_rss_mb']['after_load']} MiB")
+        for name, stats in run["endpoints"].items():
+            print(f"  {name:<42} p50 {stats['p50_ms']:>9.3f} ms   p99 {stats['p99_ms']:>9.3f} ms")
+
+    results = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": runs
+    }
+
+    if args.baseline:
+        results["regressions"] = compare(results, json.loads(args.baseline.read_text()))
+        for regression in results["regressions"]:
+            print(f" Regression at {regression['size']}: {regression['metric']} "
+                  f"{regression['baseline']} -> {regression['current']} (x{regression['ratio']})")
+
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f" Results written to {args.output}")
+    if results.get("regressions"):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
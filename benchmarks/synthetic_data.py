@@ -0,0 +1,255 @@
+"""
+Synthetic utility data generator for benchmarks.
+
+Writes equipment inventories and maintenance logs in the same formats as the
+files in data/, with skewed, realistic distributions: a few equipment types,
+locations, manufacturers and technicians account for most records, some
+equipment is maintained far more often than the rest, and costs follow a
+log-normal distribution per maintenance type. Records are written as they are
+generated, so millions of rows need no more memory than a handful.
+
+Usage:
+    python -m benchmarks.synthetic_data --equipment 1000000 --logs 10000000 --output /tmp/utility-data
+"""
+
+import argparse
+import bisect
+import csv
+import json
+import math
+import random
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+EQUIPMENT_FIELDS = [
+    "equipment_id", "equipment_type", "location", "manufacturer", "model",
+    "installation_date", "status", "last_maintenance"
+]
+
+# Equipment type -> (relative frequency, manufacturers, model prefix)
+EQUIPMENT_TYPES = {
+    "Meter": (30, ["Landis+Gyr", "Itron", "Elster", "Sensus"], "E"),
+    "Transformer": (18, ["Siemens", "Schneider", "ABB", "Hitachi Energy"], "TR"),
+    "Cable": (14, ["Nexans", "Prysmian", "Southwire"], "HV"),
+    "Switch": (9, ["ABB", "Eaton", "S&C Electric"], "SW"),
+    "Breaker": (8, ["Eaton", "Siemens", "GE", "Mitsubishi Electric"], "CB"),
+    "Capacitor": (6, ["Cooper", "ABB", "GE"], "CAP"),
+    "Relay": (6, ["SEL", "GE", "Siemens"], "REL"),
+    "Generator": (4, ["GE", "Caterpillar", "Cummins"], "GEN"),
+    "Motor": (3, ["WEG", "Baldor", "Siemens"], "MOT"),
+    "Recloser": (2, ["S&C Electric", "Eaton", "Tavrida"], "RC")
+}
+
+SITE_KINDS = [
+    "Substation", "Distribution Center", "Power Plant", "Pump Station", "Control Center",
+    "Industrial Zone", "Residential Zone", "Underground Route", "Switchyard", "Feeder"
+]
+SITE_NAMES = [
+    "Alpha", "Beta", "Gamma", "Delta", "Epsilon", "Zeta", "Eta", "Theta", "Iota", "Kappa",
+    "Lambda", "Sigma", "North", "South", "East", "West", "Central", "Harbor", "Ridge", "Valley"
+]
+
+STATUSES = [("Active", 85), ("Maintenance", 8), ("Inactive", 5), ("Decommissioned", 2)]
+LOG_STATUSES = [("Completed", 88), ("In Progress", 6), ("Scheduled", 4), ("Cancelled", 2)]
+
+# Maintenance type -> (relative frequency, median cost, months to next visit, descriptions)
+MAINTENANCE_TYPES = {
+    "Routine Inspection": (45, 250, 3, [
+        "Checked oil levels, tested voltage regulation, all parameters within normal range",
+        "Visual inspection completed, no corrosion or leaks found",
+        "Thermal imaging scan performed, no hot spots detected"
+    ]),
+    "Preventive Maintenance": (30, 900, 6, [
+        "Replaced air filters, checked fuel injection system, performed load test",
+        "Tightened connections, cleaned contacts, lubricated moving parts",
+        "Calibrated sensors and updated firmware"
+    ]),
+    "Repair": (15, 2200, 12, [
+        "Replaced damaged insulator after storm, restored service",
+        "Repaired faulty control board, tested under load",
+        "Fixed oil leak at main gasket and refilled coolant"
+    ]),
+    "Emergency Repair": (6, 5200, 12, [
+        "Responded to outage, replaced blown fuse and damaged bushing",
+        "Emergency cable splice after excavation damage",
+        "Restored power after lightning strike, replaced surge arrester"
+    ]),
+    "Calibration": (4, 400, 12, [
+        "Calibrated meter accuracy against reference standard",
+        "Adjusted relay settings and verified trip timing"
+    ])
+}
+
+PARTS = [
+    "Air Filter AF-500", "Fuel Filter FF-200", "Fuse 100A", "Bushing B-12", "Gasket G-7",
+    "Surge Arrester SA-9", "Insulator I-33", "Control Board CB-1", "Contact Kit CK-4", "Coolant 20L"
+]
+
+FIRST_NAMES = [
+    "John", "Maria", "David", "Sarah", "Robert", "Lisa", "Mike", "Anna", "James", "Priya",
+    "Wei", "Carlos", "Fatima", "Olga", "Kenji", "Grace", "Ahmed", "Elena", "Tom", "Nina"
+]
+LAST_NAMES = [
+    "Smith", "Garcia", "Wilson", "Johnson", "Chen", "Thompson", "Anderson", "Patel", "Kim", "Nguyen",
+    "Lopez", "Muller", "Rossi", "Okafor", "Novak", "Silva", "Tanaka", "Brown", "Ivanova", "Haddad"
+]
+
+START_DATE = date(2015, 1, 1)
+END_DATE = date(2024, 12, 31)
+
+class WeightedChoice:
+    """Draw items with fixed relative weights in O(log n) per draw."""
+
+    def __init__(self, items: Sequence, weights: Sequence[float]):
+        self.items = list(items)
+        self.cumulative = []
+        total = 0.0
+        for weight in weights:
+            total += weight
+            self.cumulative.append(total)
+        self.total = total
+
+    def __call__(self, rng: random.Random):
+        return self.items[bisect.bisect_right(self.cumulative, rng.random() * self.total)]
+
+def zipf_weights(count: int, exponent: float = 1.1) -> List[float]:
+    """Weights of a Zipf distribution: the k-th item is drawn about 1/k^s as often as the first."""
+    return [1.0 / (rank ** exponent) for rank in range(1, count + 1)]
+
+def _pairs(options: List[Tuple[str, int]]) -> WeightedChoice:
+    return WeightedChoice([item for item, _ in options], [weight for _, weight in options])
+
+def _random_date(rng: random.Random, start: date = START_DATE, end: date = END_DATE) -> date:
+    return start + timedelta(days=rng.randrange((end - start).days + 1))
+
+def make_locations(equipment_count: int) -> List[str]:
+    """Return a site list that grows with the inventory, from about 20 to a few thousand sites."""
+    site_count = max(20, min(len(SITE_KINDS) * len(SITE_NAMES) * 20, equipment_count // 200))
+    locations = []
+    for index in range(site_count):
+        kind = SITE_KINDS[index % len(SITE_KINDS)]
+        name = SITE_NAMES[(index // len(SITE_KINDS)) % len(SITE_NAMES)]
+        number = index // (len(SITE_KINDS) * len(SITE_NAMES))
+        locations.append(f"{kind} {name}" + (f" {number + 1}" if number else ""))
+    return locations
+
+def make_technicians(log_count: int) -> List[str]:
+    """Return a technician roster sized to the workload, from about 20 to 400 people."""
+    count = max(20, min(len(FIRST_NAMES) * len(LAST_NAMES), log_count // 25_000))
+    return [f"{FIRST_NAMES[index % len(FIRST_NAMES)]} {LAST_NAMES[(index * 7 + index // len(FIRST_NAMES)) % len(LAST_NAMES)]}"
+            for index in range(count)]
+
+def equipment_id(index: int) -> str:
+    return f"EQ{index + 1:07d}"
+
+def generate_equipment(path: Path, count: int, seed: int = 0) -> Dict[str, int]:
+    """Write an equipment inventory CSV; returns the number of rows per equipment type."""
+    rng = random.Random(seed)
+    types = WeightedChoice(list(EQUIPMENT_TYPES), [spec[0] for spec in EQUIPMENT_TYPES.values()])
+    locations = make_locations(count)
+    location_choice = WeightedChoice(locations, zipf_weights(len(locations), 0.8))
+    statuses = _pairs(STATUSES)
+    counts = {}
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(EQUIPMENT_FIELDS)
+        for index in range(count):
+            equipment_type = types(rng)
+            _, manufacturers, prefix = EQUIPMENT_TYPES[equipment_type]
+            installed = _random_date(rng, date(1995, 1, 1), date(2023, 12, 31))
+            writer.writerow([
+                equipment_id(index),
+                equipment_type,
+                location_choice(rng),
+                manufacturers[min(int(rng.expovariate(1.2)), len(manufacturers) - 1)],
+                f"{prefix}-{rng.choice((50, 100, 200, 300, 400, 500, 650))}",
+                installed.isoformat(),
+                statuses(rng),
+                _random_date(rng, max(installed, START_DATE)).isoformat()
+            ])
+            counts[equipment_type] = counts.get(equipment_type, 0) + 1
+    return counts
+
+def _log_record(rng: random.Random, index: int, equipment: str, technician: str,
+                maintenance_type: str, status: str, unknown: bool) -> Dict:
+    _, median_cost, months, descriptions = MAINTENANCE_TYPES[maintenance_type]
+    performed = _random_date(rng)
+    return {
+        "log_id": f"LOG{index + 1:08d}",
+        "equipment_id": equipment_id(rng.randrange(10_000_000, 20_000_000)) if unknown else equipment,
+        "maintenance_type": maintenance_type,
+        "date": performed.isoformat(),
+        "technician": technician,
+        "description": rng.choice(descriptions),
+        "status": status,
+        "next_scheduled": (performed + timedelta(days=30 * months)).isoformat(),
+        "parts_used": rng.sample(PARTS, min(len(PARTS), int(rng.expovariate(1.0)))),
+        "cost": round(rng.lognormvariate(math.log(median_cost), 0.6), 2)
+    }
+
+def generate_maintenance(path: Path, count: int, equipment_count: int, seed: int = 0,
+                         ndjson: bool = False, orphan_rate: float = 0.001) -> int:
+    """
+    Write maintenance logs as a JSON array (or NDJSON); returns the number written.
+
+    Logs concentrate on a subset of the equipment (Zipf over a shuffled
+    order), and a small fraction reference unknown equipment so integrity
+    checks have something to report.
+    """
+    rng = random.Random(seed + 1)
+    types = WeightedChoice(list(MAINTENANCE_TYPES), [spec[0] for spec in MAINTENANCE_TYPES.values()])
+    statuses = _pairs(LOG_STATUSES)
+    technicians = make_technicians(count)
+    technician_choice = WeightedChoice(technicians, zipf_weights(len(technicians), 0.7))
+
+    # Zipf over equipment ranks, with ranks mapped to equipment through a multiplicative permutation
+    ranks = WeightedChoice(range(min(equipment_count, 100_000)), zipf_weights(min(equipment_count, 100_000), 0.6))
+    stride = 7_919 if equipment_count % 7_919 else 7_907
+
+    with open(path, "w", encoding="utf-8") as f:
+        if not ndjson:
+            f.write("[\n")
+        for index in range(count):
+            rank = ranks(rng) if rng.random() < 0.5 else rng.randrange(equipment_count)
+            record = _log_record(
+                rng, index, equipment_id((rank * stride) % equipment_count), technician_choice(rng),
+                types(rng), statuses(rng), rng.random() < orphan_rate
+            )
+            line = json.dumps(record)
+            if ndjson:
+                f.write(line + "\n")
+            else:
+                f.write(("  " if index == 0 else ",\n  ") + line)
+        if not ndjson:
+            f.write("\n]\n")
+    return count
+
+def generate_dataset(directory: Path, equipment_count: int, log_count: int, seed: int = 0,
+                     ndjson: bool = False) -> Tuple[Path, Path]:
+    """Generate both files in a directory and return their paths."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    equipment_path = directory / "equipment_inventory.csv"
+    maintenance_path = directory / ("maintenance_logs.ndjson" if ndjson else "maintenance_logs.json")
+    generate_equipment(equipment_path, equipment_count, seed)
+    generate_maintenance(maintenance_path, log_count, equipment_count, seed, ndjson)
+    return equipment_path, maintenance_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic utility equipment and maintenance data")
+    parser.add_argument("--equipment", type=int, default=10_000, help="Number of equipment rows")
+    parser.add_argument("--logs", type=int, default=None, help="Number of maintenance logs (default 10 per equipment)")
+    parser.add_argument("--output", type=Path, default=Path("synthetic_data"), help="Output directory")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--ndjson", action="store_true", help="Write maintenance logs as NDJSON")
+    args = parser.parse_args()
+
+    logs = args.logs if args.logs is not None else args.equipment * 10
+    equipment_path, maintenance_path = generate_dataset(args.output, args.equipment, logs, args.seed, args.ndjson)
+    print(f" Wrote {args.equipment} equipment rows to {equipment_path}")
+    print(f" Wrote {logs} maintenance logs to {maintenance_path}")
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,15 @@ import uvicorn
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from src.data_processor import load_equipment_data, load_maintenance_logs, validate_data_integrity
-from src.api import root, get_equipment, get_maintenance, get_entities, search_data
+from src.api import root, liveness, get_equipment, get_maintenance, get_entities, search_data, reload_datasets
+from src.api import ingest_equipment, ingest_maintenance
+from src.api import get_equipment_relationships, get_related_entities, get_cost_analytics
+from src.api import metrics, slow_request_profiles, get_maintenance_schedule, batch_query, get_autocomplete
+from src.metrics import MetricsMiddleware
+from src.query_pool import query_pool
+from src.reloader import DataFileWatcher, RELOAD_INTERVAL
+from src.shared_data import shared_store, serve_workers, SHARED_POLL_INTERVAL, WORKERS
+from src.response_cache import ResponseCacheMiddleware
 
 # Application startup/shutdown handling
 @asynccontextmanager
@@ -15,9 +23,12 @@ async def lifespan(app: FastAPI):
     """Handle application startup and shutdown."""
     print(" Starting application.")
     
-    # Load data on startup
-    equipment_loaded = load_equipment_data()
-    maintenance_loaded = load_maintenance_logs()
+    # Workers started by a supervisor attach to the data it loaded; otherwise load it here
+    if shared_store and shared_store.attach():
+        equipment_loaded = maintenance_loaded = True
+    else:
+        equipment_loaded = load_equipment_data()
+        maintenance_loaded = load_maintenance_logs()
     
     if equipment_loaded and maintenance_loaded:
         validation_issues = validate_data_integrity()
@@ -26,8 +37,22 @@ async def lifespan(app: FastAPI):
             for issue in validation_issues:
                 print(f"  - {issue}")
     
+    # Watch the data files for changes when hot reload is enabled
+    watcher = None
+    if shared_store:
+        # The supervisor watches the files; workers follow its published generations
+        watcher = DataFileWatcher([shared_store.manifest_path], SHARED_POLL_INTERVAL, shared_store.attach)
+        watcher.start()
+    elif RELOAD_INTERVAL > 0:
+        watcher = DataFileWatcher(interval=RELOAD_INTERVAL)
+        watcher.start()
+        print(f" Watching data files every {RELOAD_INTERVAL}s")
+    
     print(" Application ready")
     yield
+    if watcher:
+        watcher.stop()
+    query_pool.shutdown()
     print(" Application shutdown")
 
 # Create FastAPI application
@@ -38,14 +63,35 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Serve repeated GETs against unchanged data from the response cache
+app.add_middleware(ResponseCacheMiddleware)
+# Added last so it is outermost and also times responses served from the cache
+app.add_middleware(MetricsMiddleware)
+
 # Register API routes
 app.get("/", summary="API Status")(root)
+app.get("/health/live", summary="Liveness Probe")(liveness)
 app.get("/api/equipment", summary="List Equipment")(get_equipment)
 app.get("/api/maintenance", summary="List Maintenance Activities")(get_maintenance)
+app.get("/api/maintenance/schedule", summary="Upcoming and Overdue Maintenance")(get_maintenance_schedule)
 app.get("/api/entities", summary="Extract Key Entities")(get_entities)
 app.get("/api/search", summary="Search Across Entities")(search_data)
+app.post("/api/batch", summary="Batch Queries")(batch_query)
+app.get("/api/autocomplete", summary="Autocomplete Ids and Entity Names")(get_autocomplete)
+app.get("/api/equipment/{equipment_id}/relationships", summary="Equipment Relationships")(get_equipment_relationships)
+app.get("/api/relationships/{target}", summary="Query Relationships")(get_related_entities)
+app.get("/api/analytics/costs", summary="Maintenance Cost Analytics")(get_cost_analytics)
+app.post("/api/equipment/ingest", summary="Ingest Equipment")(ingest_equipment)
+app.post("/api/maintenance/ingest", summary="Ingest Maintenance Activities")(ingest_maintenance)
+app.post("/admin/reload", summary="Reload Data Files")(reload_datasets)
+app.get("/metrics", summary="Prometheus Metrics")(metrics)
+app.get("/admin/profiles", summary="Slow Request Profiles")(slow_request_profiles)
 
 # Run Application
 if __name__ == "__main__":
     
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    if WORKERS > 1:
+        # Parse the data once in this process; each worker restores its own copy from snapshot files
+        serve_workers("main:app", host="0.0.0.0", port=8000, workers=WORKERS, reload_interval=RELOAD_INTERVAL)
+    else:
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -4,63 +4,330 @@ API endpoints for the Utility Infrastructure Knowledge Extraction API.
 This module contains all the FastAPI route definitions.
 """
 
-from typing import Optional
-from fastapi import HTTPException, Query
+import asyncio
+import csv
+import functools
+import heapq
+import hmac
+import os
+import tempfile
+from datetime import date
+from typing import List, Optional
+from fastapi import Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from src.data_processor import (
+    get_snapshot,
     get_equipment_data, 
     get_maintenance_logs, 
-    extract_entities, 
-    validate_data_integrity
+    reload_data,
+    ingest_file,
+    get_entity_catalog,
+    top_entities,
+    validate_data_integrity,
+    build_equipment_relationships,
+    find_related,
+    cost_rollup,
+    format_cost_stats,
+    ranked_search,
+    QueryLookups,
+    filter_row_ids,
+    get_records,
+    get_encoded_records,
+    encode_cursor,
+    decode_cursor,
+    page_row_ids,
+    maintenance_schedule,
+    autocomplete,
+    autocomplete_ready,
+    SEARCH_MODES,
+    SCHEDULE_STATUSES,
+    RELATIONSHIP_TARGETS,
+    COST_DIMENSIONS,
+    AUTOCOMPLETE_CATEGORIES
 )
+from src.metrics import recent_profiles, render_metrics
+from src.query_pool import QueryRejected, QueryTimeout, query_pool
+from src.serialization import RawJSON, encode_json, encode_records, join_array
+from src.shared_data import shared_store
+
+MAX_PAGE_SIZE = 1000
+
+# Results returned by ranked search when no limit is given
+DEFAULT_RANKED_RESULTS = 20
+
+# Autocomplete suggestions per category by default and at most
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 100
+
+# Queries accepted in one batch request
+MAX_BATCH_QUERIES = 100
+BATCH_TYPES = ("equipment", "maintenance", "search")
+
+# Parameters of batch list queries, named as on the matching GET endpoints
+BATCH_FILTERS = {
+    "equipment": ("equipment_type", "status", "location", "manufacturer"),
+    "maintenance": ("equipment_id", "status", "technician")
+}
+BATCH_DATE_RANGES = {
+    "equipment": {
+        "installation_date": ("installed_from", "installed_to"),
+        "last_maintenance": ("last_maintenance_from", "last_maintenance_to")
+    },
+    "maintenance": {
+        "date": ("date_from", "date_to"),
+        "next_scheduled": ("next_scheduled_from", "next_scheduled_to")
+    }
+}
+
+# Orderings accepted by the cost analytics endpoint
+COST_SORT_KEYS = ("key", "count", "sum", "mean", "min", "max")
+
+# Shared secret required by the admin and ingestion endpoints; without it they are refused
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+# Set to 1 to leave those endpoints open when no token is configured, e.g. for local development
+ADMIN_AUTH_DISABLED = os.environ.get("ADMIN_AUTH_DISABLED", "0") == "1"
+
+# List pages of more records than this are built on the query pool rather than the event loop
+INLINE_PAGE_SIZE = 100
+
+# Uploaded bodies beyond this size are spooled to disk while they are parsed
+SPOOL_MEMORY_LIMIT = 8 * 1024 * 1024
+CSV_CONTENT_TYPES = {"text/csv", "application/csv"}
+JSON_CONTENT_TYPES = {"application/json", "application/x-ndjson", "application/ndjson", "application/jsonl"}
+
+class JSONBytesResponse(Response):
+    """JSON response encoded with the fast path, embedding pre-encoded records as-is."""
+    
+    media_type = "application/json"
+    
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return encode_json(content)
+
+def _records_json(dataset: str, row_ids, fields: Optional[List[str]], snapshot):
+    """Return a JSON array of records, reusing their load-time encoding unless projected."""
+    if fields:
+        return join_array(encode_records(get_records(dataset, row_ids, fields, snapshot)))
+    return join_array(get_encoded_records(dataset, row_ids, snapshot))
+
+def _ranked_results(query: str, limit: int, fields: Optional[List[str]], snapshot) -> List[dict]:
+    """Merge the top hits of both datasets and encode only the records that made the cut."""
+    hits = heapq.nlargest(limit, (
+        (score, dataset, row_id)
+        for dataset in ("equipment", "maintenance")
+        for row_id, score in ranked_search(dataset, query, limit, snapshot)
+    ), key=lambda hit: hit[0])
+    
+    encoded = {}
+    for dataset in ("equipment", "maintenance"):
+        row_ids = [row_id for _, hit_dataset, row_id in hits if hit_dataset == dataset]
+        if fields:
+            records = encode_records(get_records(dataset, row_ids, fields, snapshot))
+        else:
+            records = get_encoded_records(dataset, row_ids, snapshot)
+        encoded.update(zip(((dataset, row_id) for row_id in row_ids), records))
+    
+    return [
+        {"dataset": dataset, "score": round(score, 4), "record": RawJSON(encoded[dataset, row_id])}
+        for score, dataset, row_id in hits
+    ]
+
+def _list_page(dataset: str, row_ids, limit: Optional[int], after, fields: Optional[List[str]], snapshot) -> dict:
+    """Build one page of a list response from the matching row ids."""
+    page, has_more = page_row_ids(row_ids, limit, after[1] if after else None)
+    return {
+        "count": len(row_ids),
+        dataset: _records_json(dataset, page, fields, snapshot),
+        "next_cursor": encode_cursor(dataset, page[-1]) if has_more else None
+    }
+
+async def _page_response(dataset: str, row_ids, limit: Optional[int], after, fields: Optional[List[str]],
+                         snapshot) -> JSONBytesResponse:
+    """Build a list page inline when it is small, otherwise on the query pool."""
+    size = min(limit, len(row_ids)) if limit else len(row_ids)
+    if size > INLINE_PAGE_SIZE:
+        return JSONBytesResponse(await _offload(_encoded, _list_page, dataset, row_ids, limit, after, fields, snapshot))
+    return JSONBytesResponse(_list_page(dataset, row_ids, limit, after, fields, snapshot))
+
+def _encoded(func, *args) -> bytes:
+    """Call a response builder and encode its result; used to encode on a query pool worker."""
+    return encode_json(func(*args))
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma-separated field projection parameter."""
+    if not fields:
+        return None
+    parsed = [field.strip() for field in fields.split(",") if field.strip()]
+    return parsed or None
+
+def _parse_date(value: Optional[str], name: str) -> Optional[date]:
+    """Parse an ISO date query parameter."""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be a date (YYYY-MM-DD)")
+
+def _parse_cursor(cursor: Optional[str], dataset: Optional[str] = None):
+    """Decode a pagination cursor, rejecting malformed or foreign cursors."""
+    if not cursor:
+        return None
+    try:
+        cursor_dataset, row_id = decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if dataset and cursor_dataset != dataset:
+        raise HTTPException(status_code=400, detail="Cursor does not belong to this endpoint")
+    return cursor_dataset, row_id
+
+async def _filter_row_ids(dataset: str, filters, snapshot, date_ranges):
+    """Resolve list filters; equality lookups stay inline, date ranges can sort large slices and are offloaded."""
+    if any(bounds != (None, None) for bounds in date_ranges.values()):
+        return await _offload(filter_row_ids, dataset, filters, snapshot, date_ranges)
+    return filter_row_ids(dataset, filters, snapshot, date_ranges)
+
+async def _offload(func, *args):
+    """Run a CPU-heavy query in the query pool, answering overload and timeouts with 503 and 504."""
+    try:
+        return await query_pool.run(func, *args)
+    except QueryRejected:
+        raise HTTPException(status_code=503, detail="Too many queries in progress, retry shortly",
+                            headers={"Retry-After": "1"})
+    except QueryTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+def _check_admin_token(token: Optional[str]):
+    """Reject admin requests without the configured token; fail closed when none is configured."""
+    if not ADMIN_TOKEN:
+        if ADMIN_AUTH_DISABLED:
+            return
+        raise HTTPException(status_code=403,
+                            detail="Admin endpoints are disabled; configure ADMIN_TOKEN to enable them")
+    if token is None or not hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+async def _spool_request_body(request: Request):
+    """Copy a streamed request body into a spooled temporary file."""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_LIMIT)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+def _upload_format(filename: Optional[str], content_type: Optional[str]) -> str:
+    """Pick the parser for an uploaded file from its name or content type."""
+    if (filename or "").lower().endswith(".csv") or (content_type or "") in CSV_CONTENT_TYPES:
+        return "csv"
+    return "json"
+
+async def _ingest_request(dataset: str, request: Request):
+    """Parse an ingestion request body and append its records to a dataset."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    
+    if content_type == "multipart/form-data":
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Multipart uploads must include a 'file' field")
+        body, file_format = upload.file, _upload_format(upload.filename, upload.content_type)
+    elif content_type in JSON_CONTENT_TYPES:
+        body, file_format = await _spool_request_body(request), "json"
+    elif content_type in CSV_CONTENT_TYPES:
+        body, file_format = await _spool_request_body(request), "csv"
+    else:
+        raise HTTPException(status_code=415, detail="Send CSV, a JSON array, NDJSON or a multipart file upload")
+    
+    try:
+        # Parse and index off the event loop; the batch is published as one new snapshot
+        ingest = functools.partial(ingest_file, dataset, body, file_format)
+        if shared_store:
+            # Append to the latest shared generation and publish the result to every worker
+            return await asyncio.to_thread(shared_store.write, ingest)
+        return await asyncio.to_thread(ingest)
+    except (ValueError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse upload, nothing was ingested: {str(e)}")
+    finally:
+        body.close()
+
+async def liveness():
+    """Report that the process is up, without touching any data."""
+    return {"status": "alive"}
 
 async def root():
     """Get API status and data summary."""
-    equipment_data = get_equipment_data()
-    maintenance_logs = get_maintenance_logs()
-    validation_issues = validate_data_integrity()
+    snapshot = get_snapshot()
+    equipment_data = get_equipment_data(snapshot)
+    maintenance_logs = get_maintenance_logs(snapshot)
+    # Computed when the snapshot was published; the load balancer probes this, so it never queues
+    validation_issues = validate_data_integrity(snapshot)
     
     return {
         "api": "Utility Infrastructure Knowledge Extraction API",
         "version": "1.0.0",
         "status": "healthy" if not validation_issues else "issues_detected",
+        "data_version": snapshot.version,
         "data_summary": {
             "equipment_count": len(equipment_data),
             "maintenance_count": len(maintenance_logs),
             "validation_issues": len(validation_issues)
         },
         "endpoints": [
+            "GET /health/live - Liveness probe",
             "GET /api/equipment - List equipment with filters",
             "GET /api/maintenance - List maintenance with filters",
+            "GET /api/maintenance/schedule - Upcoming or overdue maintenance",
             "GET /api/entities - Extract key entities",
-            "GET /api/search - Search across all data"
+            "GET /api/search - Search across all data",
+            "GET /api/autocomplete - Complete ids and entity names from a prefix",
+            "POST /api/batch - Run many list and search queries in one request",
+            "GET /api/equipment/{equipment_id}/relationships - Relationships of one piece of equipment",
+            "GET /api/relationships/{target} - Multi-hop relationship queries",
+            "GET /api/analytics/costs - Maintenance cost aggregates",
+            "POST /api/equipment/ingest - Append equipment records",
+            "POST /api/maintenance/ingest - Append maintenance records",
+            "POST /admin/reload - Reload data files",
+            "GET /metrics - Prometheus metrics",
+            "GET /admin/profiles - Profiles of slow sampled requests"
         ]
     }
 
 async def get_equipment(
     equipment_type: Optional[str] = Query(None, description="Filter by equipment type"),
-    status: Optional[str] = Query(None, description="Filter by status")
+    status: Optional[str] = Query(None, description="Filter by status"),
+    location: Optional[str] = Query(None, description="Filter by location"),
+    manufacturer: Optional[str] = Query(None, description="Filter by manufacturer"),
+    installed_from: Optional[str] = Query(None, description="Installed on or after this date (YYYY-MM-DD)"),
+    installed_to: Optional[str] = Query(None, description="Installed on or before this date (YYYY-MM-DD)"),
+    last_maintenance_from: Optional[str] = Query(None, description="Last maintained on or after this date"),
+    last_maintenance_to: Optional[str] = Query(None, description="Last maintained on or before this date"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Maximum records to return"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return")
 ):
     """Get equipment list with basic filtering."""
     try:
-        equipment_data = get_equipment_data()
+        snapshot = get_snapshot()
+        equipment_data = get_equipment_data(snapshot)
         if not equipment_data:
             raise HTTPException(status_code=503, detail="Equipment data not available")
         
-        result = equipment_data.copy()
+        after = _parse_cursor(cursor, "equipment")
         
-        # Apply basic filters
-        if equipment_type:
-            result = [eq for eq in result 
-                     if eq.get("equipment_type", "").lower() == equipment_type.lower()]
-        
-        if status:
-            result = [eq for eq in result 
-                     if eq.get("status", "").lower() == status.lower()]
-        
-        return {
-            "count": len(result),
-            "equipment": result
-        }
+        # Resolve filters through the secondary indexes
+        row_ids = await _filter_row_ids("equipment", {
+            "equipment_type": equipment_type or None,
+            "status": status or None,
+            "location": location or None,
+            "manufacturer": manufacturer or None
+        }, snapshot, {
+            "installation_date": (_parse_date(installed_from, "installed_from"),
+                                  _parse_date(installed_to, "installed_to")),
+            "last_maintenance": (_parse_date(last_maintenance_from, "last_maintenance_from"),
+                                 _parse_date(last_maintenance_to, "last_maintenance_to"))
+        })
+        return await _page_response("equipment", row_ids, limit, after, _parse_fields(fields), snapshot)
         
     except HTTPException:
         raise
@@ -69,112 +336,495 @@ async def get_equipment(
 
 async def get_maintenance(
     equipment_id: Optional[str] = Query(None, description="Filter by equipment ID"),
-    status: Optional[str] = Query(None, description="Filter by status")
+    status: Optional[str] = Query(None, description="Filter by status"),
+    technician: Optional[str] = Query(None, description="Filter by technician"),
+    date_from: Optional[str] = Query(None, description="Performed on or after this date (YYYY-MM-DD)"),
+    date_to: Optional[str] = Query(None, description="Performed on or before this date (YYYY-MM-DD)"),
+    next_scheduled_from: Optional[str] = Query(None, description="Next due on or after this date (YYYY-MM-DD)"),
+    next_scheduled_to: Optional[str] = Query(None, description="Next due on or before this date (YYYY-MM-DD)"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Maximum records to return"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return")
 ):
     """Get maintenance activities with basic filtering."""
     try:
-        maintenance_logs = get_maintenance_logs()
+        snapshot = get_snapshot()
+        maintenance_logs = get_maintenance_logs(snapshot)
         if not maintenance_logs:
             raise HTTPException(status_code=503, detail="Maintenance data not available")
         
-        result = maintenance_logs.copy()
+        after = _parse_cursor(cursor, "maintenance")
         
-        # Apply basic filters
-        if equipment_id:
-            result = [log for log in result if log.get("equipment_id") == equipment_id]
+        # Resolve filters through the secondary indexes
+        row_ids = await _filter_row_ids("maintenance", {
+            "equipment_id": equipment_id or None,
+            "status": status or None,
+            "technician": technician or None
+        }, snapshot, {
+            "date": (_parse_date(date_from, "date_from"), _parse_date(date_to, "date_to")),
+            "next_scheduled": (_parse_date(next_scheduled_from, "next_scheduled_from"),
+                               _parse_date(next_scheduled_to, "next_scheduled_to"))
+        })
+        return await _page_response("maintenance", row_ids, limit, after, _parse_fields(fields), snapshot)
         
-        if status:
-            result = [log for log in result 
-                     if log.get("status", "").lower() == status.lower()]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving maintenance: {str(e)}")
+
+async def get_maintenance_schedule(
+    status: str = Query("upcoming", description="upcoming or overdue"),
+    days: int = Query(30, ge=0, le=3650, description="Days ahead covered by the upcoming window"),
+    as_of: Optional[str] = Query(None, description="Reference date (YYYY-MM-DD), today by default"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Maximum records to return"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return")
+):
+    """List the current maintenance schedule of each piece of equipment that is upcoming or overdue."""
+    try:
+        if status not in SCHEDULE_STATUSES:
+            raise HTTPException(status_code=400, detail=f"Status must be one of: {', '.join(SCHEDULE_STATUSES)}")
         
-        return {
-            "count": len(result),
-            "maintenance": result
-        }
+        reference = _parse_date(as_of, "as_of") or date.today()
+        snapshot = get_snapshot()
+        row_ids = await _offload(maintenance_schedule, status, reference, days, snapshot)
+        page = row_ids[:limit]
+        if len(page) > INLINE_PAGE_SIZE:
+            records = await _offload(_records_json, "maintenance", page, _parse_fields(fields), snapshot)
+        else:
+            records = _records_json("maintenance", page, _parse_fields(fields), snapshot)
+        
+        return JSONBytesResponse({
+            "status": status,
+            "as_of": reference.isoformat(),
+            "until": date.fromordinal(reference.toordinal() + days).isoformat() if status == "upcoming" else None,
+            "count": len(row_ids),
+            "data_version": snapshot.version,
+            "maintenance": records
+        })
         
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error retrieving maintenance: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error retrieving maintenance schedule: {str(e)}")
 
-async def get_entities():
+async def get_entities(
+    top: Optional[int] = Query(None, ge=1, description="Also return the N most frequent entities per category")
+):
     """Extract and return key entities from the data."""
     try:
-        equipment_data = get_equipment_data()
-        maintenance_logs = get_maintenance_logs()
+        snapshot = get_snapshot()
+        equipment_data = get_equipment_data(snapshot)
+        maintenance_logs = get_maintenance_logs(snapshot)
         
         if not equipment_data and not maintenance_logs:
             raise HTTPException(status_code=503, detail="No data available")
         
-        entities = extract_entities()
-        
-        return {
-            "entities": entities,
-            "summary": {
-                "equipment_types": len(entities["equipment_types"]),
-                "locations": len(entities["locations"]),
-                "maintenance_types": len(entities["maintenance_types"]),
-                "manufacturers": len(entities["manufacturers"]),
-                "technicians": len(entities["technicians"]),
-                "total_unique_entities": sum(len(v) for v in entities.values())
-            }
+        catalog = get_entity_catalog(snapshot)
+        response = {
+            "version": catalog["version"],
+            "entities": catalog["entities"],
+            "summary": catalog["summary"]
         }
+        if top:
+            response["top_entities"] = top_entities(top, catalog)
+        
+        # Catalogs of large datasets take a while to encode
+        return JSONBytesResponse(await _offload(encode_json, response))
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting entities: {str(e)}")
 
-async def search_data(query: str = Query(..., description="Search query")):
+def _search(query: str, mode: str, limit: Optional[int], after, projection: Optional[List[str]], snapshot,
+            lookups: Optional[QueryLookups] = None) -> dict:
+    """Run a search and build its response."""
+    if mode == "ranked":
+        results = _ranked_results(query, limit or DEFAULT_RANKED_RESULTS, projection, snapshot)
+        return {
+            "query": query,
+            "mode": mode,
+            "total_results": len(results),
+            "results": results,
+            "next_cursor": None
+        }
+    
+    # Results are ordered by (dataset, row id): equipment first, then maintenance
+    lookups = lookups or QueryLookups(snapshot)
+    equipment_ids = lookups.search_row_ids("equipment", query, mode)
+    maintenance_ids = lookups.search_row_ids("maintenance", query, mode)
+    
+    if after and after[0] == "maintenance":
+        equipment_page, equipment_more = [], False
+    else:
+        equipment_page, equipment_more = page_row_ids(equipment_ids, limit, after[1] if after else None)
+    
+    next_cursor = None
+    maintenance_page = []
+    if equipment_more:
+        next_cursor = encode_cursor("equipment", equipment_page[-1])
+    else:
+        remaining = None if limit is None else limit - len(equipment_page)
+        if remaining == 0:
+            # Page filled up exactly at the boundary between the datasets
+            if maintenance_ids:
+                next_cursor = encode_cursor("equipment", equipment_page[-1])
+        else:
+            maintenance_after = after[1] if after and after[0] == "maintenance" else None
+            maintenance_page, maintenance_more = page_row_ids(maintenance_ids, remaining, maintenance_after)
+            if maintenance_more:
+                next_cursor = encode_cursor("maintenance", maintenance_page[-1])
+    
+    results = {
+        "equipment": _records_json("equipment", equipment_page, projection, snapshot),
+        "maintenance": _records_json("maintenance", maintenance_page, projection, snapshot)
+    }
+    
+    return {
+        "query": query,
+        "mode": mode,
+        "total_results": len(equipment_ids) + len(maintenance_ids),
+        "results": results,
+        "next_cursor": next_cursor
+    }
+
+async def search_data(
+    query: str = Query(..., description="Search query"),
+    mode: str = Query("token", description="Match mode: token, prefix, substring or ranked"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Maximum records to return"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return")
+):
     """Search across all entities and data."""
     try:
         if not query.strip():
             raise HTTPException(status_code=400, detail="Search query cannot be empty")
         
-        equipment_data = get_equipment_data()
-        maintenance_logs = get_maintenance_logs()
+        if mode not in SEARCH_MODES:
+            raise HTTPException(status_code=400, detail=f"Search mode must be one of: {', '.join(SEARCH_MODES)}")
         
-        query_lower = query.lower()
-        results = {
-            "equipment": [],
-            "maintenance": []
-        }
+        after = _parse_cursor(cursor)
+        if mode == "ranked" and cursor:
+            raise HTTPException(status_code=400, detail="Ranked search returns the top results only and takes no cursor")
         
-        # Search equipment data
-        for equipment in equipment_data:
-            searchable_text = " ".join([
-                equipment.get("equipment_id", ""),
-                equipment.get("equipment_type", ""),
-                equipment.get("location", ""),
-                equipment.get("manufacturer", ""),
-                equipment.get("model", ""),
-                equipment.get("status", "")
-            ]).lower()
-            
-            if query_lower in searchable_text:
-                results["equipment"].append(equipment)
-        
-        # Search maintenance data
-        for log in maintenance_logs:
-            searchable_text = " ".join([
-                log.get("log_id", ""),
-                log.get("equipment_id", ""),
-                log.get("maintenance_type", ""),
-                log.get("technician", ""),
-                log.get("description", ""),
-                log.get("status", "")
-            ]).lower()
-            
-            if query_lower in searchable_text:
-                results["maintenance"].append(log)
+        return JSONBytesResponse(await _offload(_encoded, _search, query, mode, limit, after, _parse_fields(fields),
+                                                get_snapshot()))
         
-        return {
-            "query": query,
-            "total_results": len(results["equipment"]) + len(results["maintenance"]),
-            "results": results
-        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error performing search: {str(e)}")
+
+async def get_autocomplete(
+    prefix: str = Query(..., description="Beginning of the name or id to complete"),
+    categories: Optional[str] = Query(None, description="Comma-separated categories, all by default"),
+    limit: int = Query(DEFAULT_SUGGESTIONS, ge=1, le=MAX_SUGGESTIONS, description="Suggestions per category")
+):
+    """Suggest ids and entity names starting with a prefix, most frequent first."""
+    try:
+        if not prefix.strip():
+            raise HTTPException(status_code=400, detail="Prefix cannot be empty")
+        
+        selected = _parse_fields(categories) or list(AUTOCOMPLETE_CATEGORIES)
+        snapshot = get_snapshot()
+        try:
+            if autocomplete_ready(selected, snapshot):
+                suggestions = autocomplete(prefix, selected, limit, snapshot)
+            else:
+                # Building a prefix index walks a whole category; later lookups are cheap enough to run inline
+                suggestions = await _offload(autocomplete, prefix, selected, limit, snapshot)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        return JSONBytesResponse({
+            "prefix": prefix,
+            "data_version": snapshot.version,
+            "suggestions": suggestions
+        })
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error completing prefix: {str(e)}")
+
+async def get_equipment_relationships(equipment_id: str):
+    """Get the maintenance history, technicians and related equipment of one piece of equipment."""
+    try:
+        relationships = build_equipment_relationships(equipment_id, get_snapshot())
+        if relationships is None:
+            raise HTTPException(status_code=404, detail=f"Equipment {equipment_id} not found")
+        
+        return JSONBytesResponse(relationships)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving relationships: {str(e)}")
+
+async def get_related_entities(
+    target: str,
+    equipment_id: Optional[str] = Query(None, description="Start from this equipment"),
+    equipment_type: Optional[str] = Query(None, description="Start from equipment of this type"),
+    location: Optional[str] = Query(None, description="Start from equipment at this location"),
+    manufacturer: Optional[str] = Query(None, description="Start from equipment by this manufacturer"),
+    technician: Optional[str] = Query(None, description="Start from equipment this technician worked on")
+):
+    """Find the entities related to the equipment matching all given filters."""
+    try:
+        if target not in RELATIONSHIP_TARGETS:
+            raise HTTPException(status_code=404, detail=f"Target must be one of: {', '.join(RELATIONSHIP_TARGETS)}")
+        
+        try:
+            related = await _offload(find_related, target, {
+                "equipment_id": equipment_id or None,
+                "equipment_type": equipment_type or None,
+                "location": location or None,
+                "manufacturer": manufacturer or None,
+                "technician": technician or None
+            }, get_snapshot())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        return JSONBytesResponse(related)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error querying relationships: {str(e)}")
+
+def _cost_analytics(group_by: str, sort: str, limit: Optional[int], snapshot) -> bytes:
+    """Roll up, order and encode cost groups; called on a query pool worker."""
+    groups = [{"key": key, **format_cost_stats(stat)} for key, stat in cost_rollup(group_by, snapshot).items()]
+    if sort == "key":
+        groups.sort(key=lambda group: str(group["key"]))
+    else:
+        groups.sort(key=lambda group: (group[sort] is None, -(group[sort] or 0), str(group["key"])))
+    
+    total = snapshot.maintenance.aggregates["total"].get("all")
+    return encode_json({
+        "group_by": group_by,
+        "data_version": snapshot.version,
+        "total": format_cost_stats(total) if total else format_cost_stats([0, 0, 0.0, None, None]),
+        "group_count": len(groups),
+        "groups": groups[:limit] if limit else groups
+    })
+
+async def get_cost_analytics(
+    group_by: str = Query(..., description="Group by location, equipment_type, manufacturer, technician or month"),
+    sort: str = Query("key", description="Order by key, or descending by count, sum, mean, min or max"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum groups to return")
+):
+    """Get maintenance cost count, sum, mean, min and max per group from the materialized aggregates."""
+    try:
+        if group_by not in COST_DIMENSIONS:
+            raise HTTPException(status_code=400, detail=f"group_by must be one of: {', '.join(COST_DIMENSIONS)}")
+        if sort not in COST_SORT_KEYS:
+            raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(COST_SORT_KEYS)}")
+        
+        return JSONBytesResponse(await _offload(_cost_analytics, group_by, sort, limit, get_snapshot()))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing cost analytics: {str(e)}")
+
+async def ingest_equipment(request: Request, x_admin_token: Optional[str] = Header(None)):
+    """Append equipment records from a CSV, JSON or NDJSON body or file upload."""
+    _check_admin_token(x_admin_token)
+    try:
+        return await _ingest_request("equipment", request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error ingesting equipment: {str(e)}")
+
+async def ingest_maintenance(request: Request, x_admin_token: Optional[str] = Header(None)):
+    """Append maintenance records from a CSV, JSON or NDJSON body or file upload."""
+    _check_admin_token(x_admin_token)
+    try:
+        return await _ingest_request("maintenance", request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error ingesting maintenance: {str(e)}")
+
+async def reload_datasets(x_admin_token: Optional[str] = Header(None)):
+    """Reload the data files into a new snapshot and swap it in atomically."""
+    _check_admin_token(x_admin_token)
+    
+    # Build off the event loop so requests keep being served from the old snapshot
+    snapshot = await asyncio.to_thread(shared_store.reload if shared_store else reload_data)
+    if snapshot is None:
+        raise HTTPException(status_code=500, detail="Reload failed, previous data is still being served")
+    
+    return {
+        "status": "reloaded",
+        "data_version": snapshot.version,
+        "equipment_count": len(snapshot.equipment.records),
+        "maintenance_count": len(snapshot.maintenance.records)
+    }
+
+async def metrics():
+    """Expose request, data and cache metrics in the Prometheus text format."""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+async def slow_request_profiles(x_admin_token: Optional[str] = Header(None)):
+    """List the profiles kept for slow sampled requests, newest first."""
+    _check_admin_token(x_admin_token)
+    profiles = recent_profiles()
+    return {"count": len(profiles), "profiles": profiles}
+
+def _parse_batch_query(position: int, spec) -> dict:
+    """Validate one query of a batch and resolve its parameters."""
+    def invalid(message: str) -> HTTPException:
+        return HTTPException(status_code=400, detail=f"Query {position}: {message}")
+    
+    if not isinstance(spec, dict):
+        raise invalid("must be an object")
+    query_type = spec.get("type")
+    if query_type not in BATCH_TYPES:
+        raise invalid(f"type must be one of: {', '.join(BATCH_TYPES)}")
+    params = spec.get("params") or {}
+    if not isinstance(params, dict):
+        raise invalid("params must be an object")
+    
+    if query_type == "search":
+        allowed = ("query", "mode")
+    else:
+        allowed = BATCH_FILTERS[query_type] + tuple(name for pair in BATCH_DATE_RANGES[query_type].values() for name in pair)
+    unknown = [name for name in params if name not in allowed + ("limit", "cursor", "fields")]
+    if unknown:
+        raise invalid(f"unknown parameter '{unknown[0]}'")
+    
+    # The matching GET endpoints take every other parameter as a query string
+    for name, value in params.items():
+        if name not in ("limit", "fields") and value is not None and not isinstance(value, str):
+            raise invalid(f"{name} must be a string")
+    
+    limit = params.get("limit")
+    if limit is not None and (type(limit) is not int or not 1 <= limit <= MAX_PAGE_SIZE):
+        raise invalid(f"limit must be an integer from 1 to {MAX_PAGE_SIZE}")
+    fields = params.get("fields")
+    if isinstance(fields, list) and all(isinstance(field, str) for field in fields):
+        fields = ",".join(fields)
+    elif fields is not None and not isinstance(fields, str):
+        raise invalid("fields must be a string or a list of strings")
+    
+    query = {"id": spec.get("id", position), "type": query_type, "limit": limit, "fields": _parse_fields(fields)}
+    try:
+        query["after"] = _parse_cursor(params.get("cursor"), None if query_type == "search" else query_type)
+        if query_type == "search":
+            query["query"] = params.get("query") or ""
+            query["mode"] = params.get("mode") or "token"
+            if not query["query"].strip():
+                raise invalid("search query cannot be empty")
+            if query["mode"] not in SEARCH_MODES:
+                raise invalid(f"search mode must be one of: {', '.join(SEARCH_MODES)}")
+            if query["mode"] == "ranked" and query["after"]:
+                raise invalid("ranked search returns the top results only and takes no cursor")
+        else:
+            query["filters"] = {name: params.get(name) or None for name in BATCH_FILTERS[query_type]}
+            query["date_ranges"] = {
+                field: (_parse_date(params.get(start), start), _parse_date(params.get(end), end))
+                for field, (start, end) in BATCH_DATE_RANGES[query_type].items()
+            }
+    except HTTPException as e:
+        raise e if str(e.detail).startswith("Query ") else invalid(e.detail)
+    return query
+
+def _batch_signature(query: dict) -> tuple:
+    """Key under which equal queries of a batch share one result."""
+    return (
+        query["type"], query.get("query"), query.get("mode"), query["limit"], query["after"],
+        tuple(query["fields"] or ()),
+        tuple(sorted((name, str(value)) for name, value in query.get("filters", {}).items())),
+        tuple(sorted((field, str(bounds)) for field, bounds in query.get("date_ranges", {}).items()))
+    )
+
+def _plan_batch(queries: List[dict], snapshot) -> QueryLookups:
+    """Prepare the lookups a batch shares; substring searches are answered in one pass up front."""
+    lookups = QueryLookups(snapshot)
+    lookups.prefetch_substrings([query["query"] for query in queries
+                                 if query["type"] == "search" and query["mode"] == "substring"])
+    return lookups
+
+def _batch_result(query: dict, lookups: QueryLookups, results: dict) -> dict:
+    """Run one query of a batch, reusing the result of an equal query."""
+    entry = {"id": query["id"], "type": query["type"]}
+    signature = _batch_signature(query)
+    try:
+        if signature in results:
+            lookups.shared += 1
+        else:
+            if query["type"] == "search":
+                results[signature] = _search(query["query"], query["mode"], query["limit"], query["after"],
+                                             query["fields"], lookups.snapshot, lookups)
+            else:
+                row_ids = lookups.filter_row_ids(query["type"], query["filters"], query["date_ranges"])
+                results[signature] = _list_page(query["type"], row_ids, query["limit"], query["after"],
+                                                query["fields"], lookups.snapshot)
+        return {**entry, "status": 200, "result": results[signature]}
+    except ValueError as e:
+        return {**entry, "status": 400, "error": str(e)}
+    except Exception as e:
+        return {**entry, "status": 500, "error": f"Error running query: {str(e)}"}
+
+def _run_batch(queries: List[dict], lookups: QueryLookups) -> bytes:
+    """Run a whole batch and encode its response."""
+    results = {}
+    entries = [_batch_result(query, lookups, results) for query in queries]
+    return encode_json({
+        "data_version": lookups.snapshot.version,
+        "count": len(entries),
+        "lookups": {"resolved": lookups.resolved, "shared": lookups.shared},
+        "results": entries
+    })
+
+async def batch_query(request: Request, stream: bool = Query(False, description="Stream results as NDJSON")):
+    """
+    Answer many list and search queries against one snapshot in a single request.
+    
+    The body is {"queries": [{"id": ..., "type": "equipment" | "maintenance" | "search",
+    "params": {...}}]} with the parameters of the matching GET endpoint. Equal
+    filters and searches are resolved once and substring searches share one
+    scan. With stream=true (or Accept: application/x-ndjson) each result is
+    sent as an NDJSON line as soon as it is ready, followed by a summary line.
+    """
+    try:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Request body must be JSON")
+        specs = body.get("queries") if isinstance(body, dict) else None
+        if not isinstance(specs, list) or not specs:
+            raise HTTPException(status_code=400, detail="Body must contain a non-empty 'queries' list")
+        if len(specs) > MAX_BATCH_QUERIES:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+        
+        queries = [_parse_batch_query(position, spec) for position, spec in enumerate(specs)]
+        lookups = await _offload(_plan_batch, queries, get_snapshot())
+        
+        if not (stream or "application/x-ndjson" in request.headers.get("accept", "")):
+            return JSONBytesResponse(await _offload(_run_batch, queries, lookups))
+        
+        async def lines():
+            results = {}
+            for query in queries:
+                try:
+                    yield await _offload(_encoded, _batch_result, query, lookups, results) + b"\n"
+                except HTTPException as e:
+                    # Headers are already sent; report overload or timeouts on the query's line
+                    yield encode_json({"id": query["id"], "type": query["type"], "status": e.status_code,
+                                       "error": e.detail}) + b"\n"
+            yield encode_json({"summary": {
+                "data_version": lookups.snapshot.version,
+                "count": len(queries),
+                "lookups": {"resolved": lookups.resolved, "shared": lookups.shared}
+            }}) + b"\n"
+        
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
         
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error performing search: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error running batch: {str(e)}")
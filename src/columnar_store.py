@@ -0,0 +1,213 @@
+"""
+Columnar storage engine for the Utility Infrastructure API.
+
+Stores a dataset as a pandas DataFrame with dictionary-encoded (categorical)
+string columns, float cost columns and datetime64 date columns. Filtering
+and aggregation run vectorized over the columns, while FrameRecords exposes
+the frame as a read-only sequence of dicts so existing callers keep working.
+"""
+
+from bisect import bisect_right
+from collections.abc import Sequence
+from itertools import accumulate
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Column types by field name, shared by the equipment and maintenance datasets
+CATEGORICAL_COLUMNS = {
+    "equipment_id", "equipment_type", "location", "manufacturer", "model",
+    "status", "maintenance_type", "technician"
+}
+DATE_COLUMNS = {"installation_date", "last_maintenance", "date", "next_scheduled"}
+FLOAT_COLUMNS = {"cost"}
+
+DATE_FORMAT = "%Y-%m-%d"
+
+def build_frame(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Convert a list of records into a typed, dictionary-encoded DataFrame."""
+    frame = pd.DataFrame.from_records(records)
+
+    for column in frame.columns:
+        if column in CATEGORICAL_COLUMNS:
+            frame[column] = frame[column].astype("category")
+        elif column in DATE_COLUMNS:
+            stripped = frame[column].map(lambda value: value.strip() if isinstance(value, str) else value)
+            frame[column] = pd.to_datetime(stripped, format=DATE_FORMAT, errors="coerce")
+        elif column in FLOAT_COLUMNS:
+            frame[column] = pd.to_numeric(frame[column], errors="coerce").astype("float64")
+
+    return frame
+
+def concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenate frames built from consecutive record batches.
+
+    Categorical columns are merged with a union of their categories so they
+    stay dictionary-encoded instead of falling back to object columns.
+    """
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+
+    columns = list(dict.fromkeys(column for frame in frames for column in frame.columns))
+    merged = {}
+    for column in columns:
+        parts = [frame[column] if column in frame.columns else pd.Series([None] * len(frame))
+                 for frame in frames]
+        if column in CATEGORICAL_COLUMNS:
+            # Align category dtypes (e.g. str vs object for all-missing parts) before the union
+            parts = [part.astype("category") for part in parts]
+            parts = [part.cat.set_categories(part.cat.categories.astype(object)) for part in parts]
+            merged[column] = pd.Series(union_categoricals(parts))
+        elif column in DATE_COLUMNS:
+            # Parts missing the column are all-None objects; keep the merged column typed
+            merged[column] = pd.to_datetime(pd.concat(parts, ignore_index=True))
+        elif column in FLOAT_COLUMNS:
+            merged[column] = pd.to_numeric(pd.concat(parts, ignore_index=True)).astype("float64")
+        else:
+            merged[column] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(merged)
+
+def drop_rows(frame: pd.DataFrame, positions) -> pd.DataFrame:
+    """Return the frame without the rows at the given positions, renumbered from 0."""
+    keep = np.ones(len(frame), dtype=bool)
+    keep[list(positions)] = False
+    return frame[keep].reset_index(drop=True)
+
+def _column_reader(series: pd.Series):
+    """Return a function that materializes one cell of a column as a plain Python value."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories.tolist()
+        codes = series.cat.codes.to_numpy()
+        return lambda row_id: categories[codes[row_id]] if codes[row_id] >= 0 else None
+
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        values = series.to_numpy()
+        return lambda row_id: (None if np.isnat(values[row_id])
+                               else pd.Timestamp(values[row_id]).strftime(DATE_FORMAT))
+
+    if pd.api.types.is_float_dtype(series.dtype):
+        values = series.to_numpy()
+        return lambda row_id: None if np.isnan(values[row_id]) else float(values[row_id])
+
+    values = series.to_numpy()
+    return lambda row_id: None if _is_missing(values[row_id]) else values[row_id]
+
+def _is_missing(value: Any) -> bool:
+    """Check whether a cell holds a missing-value marker."""
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+class FrameRecords(Sequence):
+    """
+    Read-only sequence of record dicts backed by columnar DataFrames.
+
+    Records appended later are kept in frames of their own, shared by every
+    version appended after them. While the newest frame has at least half
+    the rows of the one before, the two are concatenated, so each row is
+    copied O(log n) times however small the appended batches. A column
+    missing from some frames reads as None there, as after concat_frames.
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        self._set_frames([frame] if len(frame) else [], [])
+
+    def _set_frames(self, frames: List[pd.DataFrame], readers: List[Dict[str, Any]]):
+        self.frames = tuple(frames)
+        # Frames past the shared ones still need their column readers
+        self._readers = readers + [{column: _column_reader(frame[column]) for column in frame.columns}
+                                   for frame in frames[len(readers):]]
+        # Row id of the first row of each frame, then the row count
+        self.starts = list(accumulate((len(frame) for frame in frames), initial=0))
+        self.columns = list(dict.fromkeys(column for frame in frames for column in frame.columns))
+
+    def appended(self, frame: pd.DataFrame) -> "FrameRecords":
+        """Return a version with the rows of frame after these, leaving this one as it is."""
+        frames = list(self.frames)
+        readers = list(self._readers)
+        while frames and len(frames[-1]) <= 2 * len(frame):
+            frame = concat_frames([frames.pop(), frame])
+            readers.pop()
+        records = FrameRecords.__new__(FrameRecords)
+        records._set_frames(frames + [frame], readers)
+        return records
+
+    def __getstate__(self):
+        # Column readers are closures; rebuild them from the frames when unpickled
+        return self.frames
+
+    def __setstate__(self, frames):
+        self._set_frames(list(frames), [])
+
+    def __len__(self) -> int:
+        return self.starts[-1]
+
+    def __getitem__(self, row_id):
+        if isinstance(row_id, slice):
+            return [self[i] for i in range(*row_id.indices(len(self)))]
+
+        if row_id < 0:
+            row_id += len(self)
+        if not 0 <= row_id < len(self):
+            raise IndexError("record index out of range")
+
+        position = bisect_right(self.starts, row_id) - 1
+        readers = self._readers[position]
+        row_id -= self.starts[position]
+        return {column: readers[column](row_id) if column in readers else None for column in self.columns}
+
+    def __iter__(self):
+        for row_id in range(len(self)):
+            yield self[row_id]
+
+def filter_row_ids(records: FrameRecords, filters: Dict[str, Any]) -> List[int]:
+    """
+    Resolve case-insensitive equality filters with vectorized column masks.
+
+    For categorical columns the comparison runs once per distinct category
+    and the row mask is derived from the integer codes.
+    """
+    row_ids = []
+    for frame, start in zip(records.frames, records.starts):
+        mask = _filter_mask(frame, filters)
+        if mask is not None:
+            row_ids.extend((np.flatnonzero(mask) + start).tolist())
+    return row_ids
+
+def _filter_mask(frame: pd.DataFrame, filters: Dict[str, Any]):
+    """Return the row mask of a frame for the filters, or None when no row matches."""
+    mask = np.ones(len(frame), dtype=bool)
+
+    for field, value in filters.items():
+        if field not in frame.columns:
+            return None
+        folded = str(value).strip().casefold()
+        series = frame[field]
+
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = series.cat.categories
+            matching = np.flatnonzero(categories.astype(str).str.strip().str.casefold() == folded)
+            mask &= np.isin(series.cat.codes.to_numpy(), matching)
+        else:
+            mask &= (series.astype(str).str.strip().str.casefold() == folded).to_numpy()
+
+        if not mask.any():
+            return None
+
+    return mask
+
+def cost_summary(records: FrameRecords, row_ids: List[int]) -> Dict[str, Any]:
+    """Aggregate the cost column over the given rows."""
+    if "cost" not in records.columns or not row_ids:
+        return {"count": len(row_ids), "total_cost": 0}
+
+    row_ids = np.asarray(row_ids)
+    total = 0.0
+    for frame, start, end in zip(records.frames, records.starts, records.starts[1:]):
+        if "cost" in frame.columns:
+            inside = row_ids[(row_ids >= start) & (row_ids < end)]
+            total += np.nansum(frame["cost"].to_numpy()[inside - start])
+    return {"count": len(row_ids), "total_cost": float(total)}
@@ -5,114 +5,1688 @@ This module contains functions for loading, processing, and analyzing
 utility equipment and maintenance data.
 """
 
-import csv
-import json
+import base64
+import binascii
+import gc
+import heapq
+import io
+import itertools
+import math
+import multiprocessing
+import os
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+from src.ingestion import (
+    ID_FIELDS,
+    LoadProgress,
+    is_sharded,
+    iter_batches,
+    iter_csv_records,
+    iter_json_records,
+    iter_shard_records,
+    resolve_shards,
+    validate_record
+)
+from src.metrics import INDEX_LOOKUPS, LOAD_DURATION, Gauge, register_callback
+from src.segments import (
+    SEGMENT_SIZE,
+    SegmentedList,
+    SortedRuns,
+    append_array,
+    appendable,
+    layered,
+    plain_array,
+    segmented
+)
+from src.serialization import encode_records
+from src.snapshot_file import SNAPSHOT_DIR, read_snapshot, snapshot_path, source_fingerprint, write_snapshot
 
-# Global storage for processed data
-equipment_data = []
-maintenance_logs = []
+# Data sources: a single file, or a directory or glob of CSV/JSON/NDJSON shards
+EQUIPMENT_FILE = Path(os.environ.get("EQUIPMENT_SOURCE", "data/equipment_inventory.csv"))
+MAINTENANCE_FILE = Path(os.environ.get("MAINTENANCE_SOURCE", "data/maintenance_logs.json"))
 
-def load_equipment_data():
-    """Load and process equipment data from CSV file."""
-    global equipment_data
-    filepath = Path("data/equipment_inventory.csv")
+# Directory of the append logs that keep ingested records across reloads and restarts
+INGEST_LOG_DIR = Path(os.environ.get("INGEST_LOG_DIR", "data/ingest"))
+
+# Processes that parse and index the shards of a sharded source
+LOAD_WORKERS = int(os.environ.get("LOAD_WORKERS", str(os.cpu_count() or 1)))
+
+# Storage engine: "rows" keeps lists of dicts, "columnar" keeps typed pandas frames
+STORAGE_ENGINES = ("rows", "columnar")
+STORAGE_ENGINE = os.environ.get("STORAGE_ENGINE", "rows")
+
+# Fields that make up the searchable text of each dataset
+SEARCH_FIELDS = {
+    "equipment": ["equipment_id", "equipment_type", "location", "manufacturer", "model", "status"],
+    "maintenance": ["log_id", "equipment_id", "maintenance_type", "technician", "description", "status"]
+}
+SEARCH_MODES = ("token", "prefix", "substring", "ranked")
+
+# Weight of one token occurrence per field in ranked search (other fields count 1);
+# identifiers and categories outweigh words of a free-text description
+SEARCH_BOOSTS = {
+    "equipment_id": 3, "log_id": 3,
+    "equipment_type": 2, "maintenance_type": 2, "technician": 2, "location": 2, "manufacturer": 2, "model": 2
+}
+
+# BM25 term frequency saturation and document length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Maximum number of rejected records described in an ingestion result
+MAX_REPORTED_ERRORS = 20
+
+# Fields with case-folded secondary indexes used for filtering
+FILTER_FIELDS = {
+    "equipment": ["equipment_id", "equipment_type", "status", "location", "manufacturer"],
+    "maintenance": ["equipment_id", "status", "technician"]
+}
+
+# Indexed fields that link records into the equipment-maintenance graph; the
+# columnar engine keeps hash indexes for these even though it filters on frames
+RELATION_FIELDS = {
+    "equipment": ["equipment_id", "equipment_type", "location", "manufacturer"],
+    "maintenance": ["equipment_id", "technician"]
+}
+
+# Date fields parsed into sorted indexes for range queries
+DATE_FIELDS = {
+    "equipment": ["installation_date", "last_maintenance"],
+    "maintenance": ["date", "next_scheduled"]
+}
+
+# Windows of the maintenance schedule query
+SCHEDULE_STATUSES = ("upcoming", "overdue")
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Entity categories and the (dataset, field) each one is counted from
+ENTITY_FIELDS = {
+    "equipment_types": ("equipment", "equipment_type"),
+    "locations": ("equipment", "location"),
+    "maintenance_types": ("maintenance", "maintenance_type"),
+    "manufacturers": ("equipment", "manufacturer"),
+    "technicians": ("maintenance", "technician")
+}
+
+# Dimensions maintenance cost can be rolled up by; location, equipment_type and
+# manufacturer come from the equipment each log references
+COST_DIMENSIONS = ("location", "equipment_type", "manufacturer", "technician", "month")
+
+# Groupings materialized on the maintenance dataset as logs are loaded
+_LOG_AGGREGATES = ("total", "equipment_id", "technician", "month")
+
+_MONTH_PATTERN = re.compile(r"\d{4}-\d{2}")
+
+# Things a relationship query can return: equipment ids or any entity category
+RELATIONSHIP_TARGETS = ("equipment",) + tuple(ENTITY_FIELDS)
+
+# Categories of autocomplete suggestions: identifiers and every entity category
+AUTOCOMPLETE_CATEGORIES = ("equipment_ids", "log_ids") + tuple(ENTITY_FIELDS)
+
+def _empty_search_index():
+    """
+    Return an empty inverted index (token -> sorted row ids).
     
-    try:
+    Alongside each posting list, the boosted frequency of the token in each
+    record is kept, and the boosted length of every record, for ranking.
+    """
+    return {"postings": {}, "frequencies": {}, "vocabulary": SortedRuns(), "texts": [], "lengths": array("l"),
+            "total_length": 0}
+
+# Source of dataset version numbers; every loaded dataset gets a new one
+_dataset_versions = itertools.count(1)
+
+class DatasetState:
+    """Records of one dataset together with everything derived from them at load time."""
+    
+    def __init__(self, name: str, records: Sequence[Dict[str, Any]], search_index: Dict[str, Any],
+                 filter_index: Dict[str, Dict[str, List[int]]], entity_counts: Dict[str, Counter],
+                 references, stats: Dict[str, Any], encoded: Optional[List[bytes]],
+                 aggregates: Dict[str, Dict[Any, list]], date_index: Dict[str, Dict[str, array]]):
+        self.name = name
+        self.records = records
+        # JSON bytes of each record, encoded once so responses can reuse them;
+        # None for the columnar engine, which encodes the requested rows from the frame
+        self.encoded = encoded
+        self.search_index = search_index
+        self.filter_index = filter_index
+        self.entity_counts = entity_counts
+        # equipment: equipment ids (as keys); maintenance: equipment_id -> [(row_id, log_id)]
+        self.references = references
+        # maintenance: grouping -> key -> [count, costed, sum, min, max] of cost
+        self.aggregates = aggregates
+        # field -> {"dates": runs of sorted day ordinals with their row ids, "by_row": ordinal of each row (0 = none)}
+        self.date_index = date_index
+        self.stats = stats
+        self.version = next(_dataset_versions)
+        # Equipment ids referenced by the logs an append added, to update integrity checks incrementally
+        self.new_references = ()
+    
+    def __getstate__(self):
+        # Appended states view buffers that newer versions extend; save only the items they show
+        state = self.__dict__.copy()
+        state["search_index"] = {**self.search_index, "lengths": plain_array(self.search_index["lengths"])}
+        state["date_index"] = {field: {**index, "by_row": plain_array(index["by_row"])}
+                               for field, index in self.date_index.items()}
+        return state
+
+def _empty_dataset(dataset: str) -> DatasetState:
+    """Return a dataset state with no records."""
+    return DatasetState(
+        dataset, [], _empty_search_index(), build_filter_index([], FILTER_FIELDS[dataset]),
+        _empty_entity_counts(dataset), {},
+        {"records": 0, "rejected": 0, "seconds": 0.0, "records_per_second": 0.0}, [],
+        _empty_aggregates(dataset), extend_date_index(None, {field: [] for field in DATE_FIELDS[dataset]}, 0)
+    )
+
+class DataSnapshot:
+    """
+    Consistent view of both datasets and the structures derived across them.
+    
+    A snapshot is never modified once published. Loads and reloads build a
+    new snapshot and swap the module-level reference in one assignment, so a
+    request holding a snapshot never sees a partially updated state.
+    
+    previous is the snapshot one of the datasets was appended to, if any;
+    derived structures are then updated from it instead of rebuilt.
+    """
+    
+    def __init__(self, equipment: DatasetState, maintenance: DatasetState, version: int,
+                 previous: Optional["DataSnapshot"] = None):
+        self.equipment = equipment
+        self.maintenance = maintenance
+        self.version = version
+        merged_counts = {**equipment.entity_counts, **maintenance.entity_counts}
+        self.entity_counts = {key: merged_counts[key] for key in ENTITY_FIELDS}
+        self.entity_catalog = _build_entity_catalog(self.entity_counts, version)
+        self.orphaned_references = _orphaned_references(equipment, maintenance, previous)
+        self.integrity_issues = None
+        self.cost_rollups = {}
+        # Sorted due dates of each equipment's latest log, built on first use and carried across appends
+        self.schedule = _carried_schedule(previous, maintenance)
+        # Prefix indexes of autocomplete categories, built on first use and carried across appends
+        self.autocomplete = _carried_autocomplete(previous, self)
+    
+    def dataset(self, name: str) -> DatasetState:
+        """Return the state of a dataset by name."""
+        return self.equipment if name == "equipment" else self.maintenance
+    
+    @property
+    def dataset_versions(self) -> Tuple[int, int]:
+        return self.equipment.version, self.maintenance.version
+
+def _orphaned_references(equipment: DatasetState, maintenance: DatasetState,
+                         previous: Optional[DataSnapshot]) -> Dict[Any, list]:
+    """
+    Map the equipment ids logs reference but no equipment defines to those references.
+    
+    After an append only the appended side is checked: new logs can add
+    orphans, new equipment can only resolve some.
+    """
+    if previous is not None and previous.equipment is equipment:
+        orphaned = dict(previous.orphaned_references)
+        for equipment_id in maintenance.new_references:
+            if equipment_id not in equipment.references:
+                orphaned[equipment_id] = maintenance.references[equipment_id]
+        return orphaned
+    if previous is not None and previous.maintenance is maintenance:
+        return {equipment_id: refs for equipment_id, refs in previous.orphaned_references.items()
+                if equipment_id not in equipment.references}
+    # Walks the distinct referenced equipment ids, not the logs
+    return {equipment_id: refs for equipment_id, refs in maintenance.references.items()
+            if equipment_id not in equipment.references}
+
+def _build_entity_catalog(counts: Dict[str, Counter], version: int) -> Dict[str, Any]:
+    """Precompute the sorted and frequency-ranked views of the entity counts."""
+    entities = {key: sorted(counter) for key, counter in counts.items()}
+    ranked = {key: sorted(counter.items(), key=lambda item: (-item[1], item[0]))
+              for key, counter in counts.items()}
+    return {
+        "version": version,
+        "entities": entities,
+        "ranked": ranked,
+        "summary": {
+            **{key: len(values) for key, values in entities.items()},
+            "total_unique_entities": sum(len(values) for values in entities.values())
+        }
+    }
+
+def load_equipment_data(filepath: Path = EQUIPMENT_FILE):
+    """Load and process equipment data from a CSV file or a directory or glob of shards."""
+    with _write_lock:
+        try:
+            _publish(equipment=_load_dataset("equipment", filepath))
+            _report_load("equipment")
+            return True
+        except FileNotFoundError:
+            print(" Equipment CSV not found")
+            _publish(equipment=_empty_dataset("equipment"))
+            return False
+        except Exception as e:
+            print(f" Error loading equipment: {e}")
+            _publish(equipment=_empty_dataset("equipment"))
+            return False
+
+def load_maintenance_logs(filepath: Path = MAINTENANCE_FILE):
+    """Load and process maintenance data from a JSON array or NDJSON file, or a directory or glob of shards."""
+    with _write_lock:
+        try:
+            _publish(maintenance=_load_dataset("maintenance", filepath))
+            _report_load("maintenance")
+            return True
+        except FileNotFoundError:
+            print(" Maintenance JSON not found")
+            _publish(maintenance=_empty_dataset("maintenance"))
+            return False
+        except Exception as e:
+            print(f" Error loading maintenance: {e}")
+            _publish(maintenance=_empty_dataset("maintenance"))
+            return False
+
+def reload_data(equipment_path: Path = EQUIPMENT_FILE, maintenance_path: Path = MAINTENANCE_FILE) -> Optional[DataSnapshot]:
+    """
+    Rebuild both datasets from their files and swap them in together.
+    
+    Requests keep being served from the current snapshot while the new one
+    is built. If either file fails to load, the current snapshot stays in
+    place and None is returned.
+    """
+    with _write_lock:
+        try:
+            equipment, maintenance = load_datasets(equipment_path, maintenance_path)
+        except Exception as e:
+            print(f" Reload failed, still serving version {_snapshot.version}: {e}")
+            return None
+        
+        snapshot = _publish(equipment=equipment, maintenance=maintenance)
+        print(f" Reloaded {len(equipment.records)} equipment and {len(maintenance.records)} "
+              f"maintenance records as version {snapshot.version}")
+        return snapshot
+
+def load_datasets(equipment_path: Path = EQUIPMENT_FILE,
+                  maintenance_path: Path = MAINTENANCE_FILE) -> Tuple[DatasetState, DatasetState]:
+    """Build new states for both datasets from their files without publishing them."""
+    return _load_dataset("equipment", equipment_path), _load_dataset("maintenance", maintenance_path)
+
+def install_datasets(equipment: DatasetState, maintenance: DatasetState) -> DataSnapshot:
+    """
+    Publish dataset states built elsewhere, such as ones restored from snapshot files.
+    
+    The states get fresh versions, since other processes number their own.
+    """
+    with _write_lock:
+        equipment.version = next(_dataset_versions)
+        maintenance.version = next(_dataset_versions)
+        return _publish(equipment=equipment, maintenance=maintenance)
+
+def _load_dataset(dataset: str, filepath: Path) -> DatasetState:
+    """Load a dataset from its source with the records ingested since replayed on top."""
+    return _replay_ingest_log(_load_source(dataset, filepath))
+
+def _load_source(dataset: str, filepath: Path) -> DatasetState:
+    """
+    Stream a data file, or load the shards of a directory or glob, into a new dataset state.
+    
+    When snapshots are enabled, a snapshot that is still valid for the
+    source is restored instead, and a fresh parse is written out as a new
+    snapshot.
+    """
+    filepath = Path(filepath)
+    source = resolve_shards(filepath) if is_sharded(filepath) else filepath
+    path = snapshot_path(dataset, STORAGE_ENGINE, SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+    
+    if path is not None:
+        started = time.perf_counter()
+        state = read_snapshot(path, dataset, STORAGE_ENGINE, source)
+        if state is not None:
+            # A restored state is new to this process and gets a fresh version
+            state.version = next(_dataset_versions)
+            state.stats = {**state.stats, "seconds": round(time.perf_counter() - started, 3), "snapshot": True}
+            LOAD_DURATION.observe(time.perf_counter() - started, dataset=dataset, source="snapshot")
+            return state
+        # Fingerprint before parsing, so edits made during the load invalidate the snapshot
+        fingerprint = source_fingerprint(source)
+    
+    started = time.perf_counter()
+    if isinstance(source, list):
+        state = _load_shards(dataset, source)
+    elif dataset == "equipment":
+        with filepath.open("r", encoding="utf-8", newline="") as f:
+            state = _ingest_stream(dataset, iter_csv_records(f))
+    else:
         with filepath.open("r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            equipment_data = list(reader)
-        print(f" Loaded {len(equipment_data)} equipment records")
-        return True
-    except FileNotFoundError:
-        print(" Equipment CSV not found")
-        equipment_data = []
-        return False
-    except Exception as e:
-        print(f" Error loading equipment: {e}")
-        equipment_data = []
-        return False
-
-def load_maintenance_logs():
-    """Load and process maintenance data from JSON file."""
-    global maintenance_logs
-    filepath = Path("data/maintenance_logs.json")
+            state = _ingest_stream(dataset, iter_json_records(f))
+    _segment_lists(state)
+    LOAD_DURATION.observe(time.perf_counter() - started, dataset=dataset, source="parse")
+    
+    if path is not None:
+        try:
+            write_snapshot(path, state, dataset, STORAGE_ENGINE, fingerprint)
+        except Exception as e:
+            print(f" Could not write {dataset} snapshot: {e}")
+    return state
+
+def ingest_log_path(dataset: str) -> Path:
+    """Return the path of the append log holding the records ingested into a dataset."""
+    return INGEST_LOG_DIR / f"{dataset}.ndjson"
+
+@contextmanager
+def _ingest_log(dataset: str):
+    """
+    Open the ingest log of a dataset to append one batch to.
     
+    A batch that fails part way is cut off the log again, and a complete one
+    is flushed to disk on exit, before its records are published.
+    """
+    path = ingest_log_path(dataset)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("ab") as log:
+        end = log.tell()
+        try:
+            yield log
+        except BaseException:
+            log.truncate(end)
+            raise
+        log.flush()
+        os.fsync(log.fileno())
+
+def _replay_ingest_log(state: DatasetState) -> DatasetState:
+    """
+    Append the records of a dataset's ingest log to a state loaded from its source.
+    
+    A last line without its newline was cut short by a crash before its
+    batch was acknowledged, and is dropped from the log.
+    """
+    path = ingest_log_path(state.name)
+    if not path.exists() or not path.stat().st_size:
+        return state
+    with path.open("r+b") as log:
+        log.seek(-1, os.SEEK_END)
+        if log.read(1) != b"\n":
+            log.seek(0)
+            log.truncate(log.read().rfind(b"\n") + 1)
+            print(f" Dropped an incomplete record at the end of {path}")
+        log.seek(0)
+        text = io.TextIOWrapper(log, encoding="utf-8")
+        try:
+            replayed = _ingest_stream(state.name, iter_json_records(text), base=state)
+        finally:
+            text.detach()
+    replayed.stats = {**state.stats, "records": replayed.stats["records"], "replayed": replayed.stats["appended"]}
+    return replayed
+
+def _segment_lists(state: DatasetState):
+    """Store the long lists of a freshly parsed state segmented, so appends fork them instead of copying."""
+    if not hasattr(state.records, "frames"):
+        state.records = segmented(state.records)
+        state.encoded = segmented(state.encoded)
+    state.search_index["texts"] = segmented(state.search_index["texts"])
+    for mapping in (state.search_index["postings"], state.search_index["frequencies"], state.references,
+                    *state.filter_index.values()):
+        for key, values in mapping.items():
+            if isinstance(values, list) and len(values) >= SEGMENT_SIZE:
+                mapping[key] = SegmentedList(values)
+
+def _load_shards(dataset: str, shards: List[Path]) -> DatasetState:
+    """
+    Parse and index shard files in parallel and merge them into one dataset state.
+    
+    Records are deduplicated by id: a record whose id occurs again later,
+    in the same shard or a later one in name order, is superseded by that
+    occurrence and dropped. Each worker parses one shard once, building its
+    state with row ids counted from 0 and listing the id of every row; the
+    superseded rows are then resolved from those lists and dropped while
+    the states are concatenated in shard order.
+    """
+    started = time.perf_counter()
+    workers = max(1, min(LOAD_WORKERS, len(shards)))
+    # Spawned rather than forked: the server may already run threads holding locks
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) if workers > 1 else None
+    run = pool.map if pool else map
     try:
-        with filepath.open("r", encoding="utf-8") as f:
-            maintenance_logs = json.load(f)
-        print(f" Loaded {len(maintenance_logs)} maintenance records")
-        return True
-    except FileNotFoundError:
-        print(" Maintenance JSON not found")
-        maintenance_logs = []
-        return False
-    except Exception as e:
-        print(f" Error loading maintenance: {e}")
-        maintenance_logs = []
-        return False
-
-def extract_entities():
+        with _gc_paused():
+            built = list(run(_build_shard, [dataset] * len(shards), shards, [STORAGE_ENGINE] * len(shards)))
+            superseded = _superseded_rows([ids for _, ids in built])
+            state = _concat_states(dataset, [state for state, _ in built], superseded)
+    finally:
+        if pool:
+            pool.shutdown()
+    
+    elapsed = time.perf_counter() - started
+    state.stats.update({
+        "shards": len(shards),
+        "workers": workers,
+        "duplicates": sum(len(rows) for rows in superseded),
+        "seconds": round(elapsed, 3),
+        "records_per_second": round(state.stats["records"] / elapsed, 1) if elapsed > 0 else 0.0
+    })
+    return state
+
+def _build_shard(dataset: str, path: Path, engine: str) -> Tuple[DatasetState, List[str]]:
+    """Build the state of one shard and list the id of each of its rows; runs in a loader process."""
+    set_storage_engine(engine)
+    ids = []
+    with _gc_paused():
+        state = _ingest_stream(dataset, iter_shard_records(path), ids=ids)
+    for error in state.stats["errors"]:
+        error["shard"] = Path(path).name
+    return state, ids
+
+def _superseded_rows(ids: List[List[str]]) -> List[set]:
+    """Return the rows of each shard whose id occurs again later, in that shard or a later one."""
+    latest = {}
+    for shard, shard_ids in enumerate(ids):
+        for row_id, record_id in enumerate(shard_ids):
+            latest[record_id] = (shard, row_id)
+    
+    return [{row_id for row_id, record_id in enumerate(shard_ids) if latest[record_id] != (shard, row_id)}
+            for shard, shard_ids in enumerate(ids)]
+
+def _concat_states(dataset: str, states: List[DatasetState], superseded: List[set]) -> DatasetState:
+    """
+    Concatenate dataset states built separately, each with row ids counted from 0.
+    
+    The row ids of each part are shifted past the rows kept from earlier
+    parts, and the rows listed in superseded are dropped. Entity counts of
+    dropped rows are subtracted; cost minimums and maximums cannot be, so
+    the cost aggregates of a part that lost rows are refolded from its kept
+    records, which are already in memory.
+    """
+    columnar = STORAGE_ENGINE == "columnar"
+    search_index = _empty_search_index()
+    postings = search_index["postings"]
+    frequencies = search_index["frequencies"]
+    filter_index = build_filter_index([], FILTER_FIELDS[dataset])
+    counts = _empty_entity_counts(dataset)
+    references = {}
+    aggregates = _empty_aggregates(dataset)
+    dates = {field: [] for field in DATE_FIELDS[dataset]}
+    records = []
+    encoded = None if columnar else []
+    frames = []
+    errors = []
+    rejected = 0
+    row_count = 0
+    
+    for state, dropped in zip(states, superseded):
+        # Global row id of each row of this part, -1 for dropped rows
+        size = len(state.records)
+        if dropped:
+            kept = [row_id for row_id in range(size) if row_id not in dropped]
+            rows = [-1] * size
+            for position, row_id in enumerate(kept):
+                rows[row_id] = row_count + position
+        else:
+            kept = None
+            rows = range(row_count, row_count + size)
+        
+        shift = row_count.__add__
+        
+        def shifted(row_ids):
+            if kept is None:
+                return list(map(shift, row_ids))
+            return [rows[row_id] for row_id in row_ids if rows[row_id] >= 0]
+        
+        def kept_items(items):
+            return items if kept is None else [items[row_id] for row_id in kept]
+        
+        part = state.search_index
+        for token, row_ids in part["postings"].items():
+            weights = part["frequencies"][token]
+            if kept is not None:
+                weights = [weight for row_id, weight in zip(row_ids, weights) if rows[row_id] >= 0]
+            row_ids = shifted(row_ids)
+            if row_ids:
+                postings.setdefault(token, []).extend(row_ids)
+                frequencies.setdefault(token, []).extend(weights)
+        lengths = kept_items(part["lengths"])
+        search_index["texts"].extend(kept_items(part["texts"]))
+        search_index["lengths"].extend(lengths)
+        search_index["total_length"] += sum(lengths)
+        
+        for field, buckets in state.filter_index.items():
+            merged = filter_index[field]
+            for value, row_ids in buckets.items():
+                row_ids = shifted(row_ids)
+                if row_ids:
+                    merged.setdefault(value, []).extend(row_ids)
+        
+        part_counts = state.entity_counts
+        if dropped:
+            removed = _empty_entity_counts(dataset)
+            for row_id in dropped:
+                count_entities(removed, dataset, state.records[row_id])
+            part_counts = {key: counter - removed[key] for key, counter in part_counts.items()}
+        for key, counter in part_counts.items():
+            counts[key].update(counter)
+        
+        if dataset == "equipment":
+            # A dropped row's id is kept by the row that superseded it
+            references.update(state.references)
+        else:
+            for equipment_id, refs in state.references.items():
+                refs = [(rows[row_id], log_id) for row_id, log_id in refs if kept is None or rows[row_id] >= 0]
+                if refs:
+                    references.setdefault(equipment_id, []).extend(refs)
+            part_aggregates = state.aggregates
+            if dropped:
+                part_aggregates = _empty_aggregates(dataset)
+                for row_id in kept:
+                    aggregate_cost(part_aggregates, state.records[row_id])
+            for grouping, groups in part_aggregates.items():
+                merged = aggregates[grouping]
+                for key, stat in groups.items():
+                    merged[key] = _merge_cost(merged.get(key), *stat)
+        
+        for field, ordinals in dates.items():
+            ordinals.extend(kept_items(state.date_index[field]["by_row"]))
+        
+        if columnar:
+            if dropped:
+                from src.columnar_store import concat_frames, drop_rows
+                frames.append(drop_rows(concat_frames(list(state.records.frames)), dropped))
+            else:
+                frames.extend(state.records.frames)
+        else:
+            records.extend(kept_items(state.records))
+            encoded.extend(kept_items(state.encoded))
+        errors.extend(state.stats["errors"])
+        rejected += state.stats["rejected"]
+        row_count += size - len(dropped)
+    
+    search_index["vocabulary"] = SortedRuns(sorted(postings))
+    if columnar:
+        from src.columnar_store import FrameRecords, concat_frames
+        records = FrameRecords(concat_frames(frames))
+    
+    stats = {"records": len(records), "rejected": rejected, "errors": errors[:MAX_REPORTED_ERRORS]}
+    return DatasetState(dataset, records, search_index, filter_index, counts, references, stats, encoded,
+                        aggregates, extend_date_index(None, dates, 0))
+
+@contextmanager
+def _gc_paused():
+    """Pause cyclic garbage collection while building millions of containers, none of which are garbage yet."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def _publish(equipment: Optional[DatasetState] = None, maintenance: Optional[DatasetState] = None,
+             base: Optional[DatasetState] = None) -> DataSnapshot:
+    """
+    Combine new dataset states with the current ones and swap in the resulting snapshot.
+    
+    base is the state a new one was appended to, if it was.
+    """
+    global _snapshot, equipment_data, maintenance_logs
+    with _publish_lock:
+        current = _snapshot
+        snapshot = DataSnapshot(
+            equipment or current.equipment,
+            maintenance or current.maintenance,
+            current.version + 1,
+            current if base is not None and base is current.dataset(base.name) else None
+        )
+        # Formatted before the swap so status checks read it without doing any work
+        validate_data_integrity(snapshot)
+        _snapshot = snapshot
+        equipment_data = snapshot.equipment.records
+        maintenance_logs = snapshot.maintenance.records
+    return snapshot
+
+def get_snapshot() -> DataSnapshot:
+    """Get the currently published data snapshot."""
+    return _snapshot
+
+def _ingest_stream(dataset: str, stream, base: Optional[DatasetState] = None,
+                   ids: Optional[List[str]] = None, log=None) -> DatasetState:
+    """
+    Validate, index and store a record stream one batch at a time.
+    
+    Only one batch of raw records is held at once on top of the stored data.
+    The result is a new dataset state; nothing is published until the whole
+    stream has been consumed, so a failed load leaves nothing half-built.
+    
+    With a base state the stream is appended to it without copying it:
+    lists are forked (see src.segments) and the index mappings only collect
+    the keys new records touch, each list of the base being forked on first
+    touch, before they are layered over the mappings of the base. An append
+    costs what its records add, existing records are never re-parsed or
+    re-indexed and the base stays valid for its readers.
+    
+    ids, when given, collects the id of every stored record in row order,
+    and log, a binary file, receives every stored record as a JSON line.
+    """
+    if base is None:
+        search_index = _empty_search_index()
+        filter_index = build_filter_index([], FILTER_FIELDS[dataset])
+        counts = _empty_entity_counts(dataset)
+        references = {}
+        aggregates = _empty_aggregates(dataset)
+        columnar = STORAGE_ENGINE == "columnar"
+        records = []
+        encoded = None if columnar else []
+        bases = None
+    else:
+        bases = {}
+        search_index = {
+            "postings": _changes(base.search_index["postings"], bases),
+            "frequencies": _changes(base.search_index["frequencies"], bases),
+            "vocabulary": base.search_index["vocabulary"],
+            "texts": appendable(base.search_index["texts"]),
+            "lengths": array("l"),
+            "total_length": base.search_index["total_length"]
+        }
+        filter_index = {field: _changes(buckets, bases) for field, buckets in base.filter_index.items()}
+        counts = {key: Counter(counter) for key, counter in base.entity_counts.items()}
+        references = _changes(base.references, bases)
+        aggregates = {grouping: _changes(groups, bases) for grouping, groups in base.aggregates.items()}
+        columnar = hasattr(base.records, "frames")
+        records = [] if columnar else appendable(base.records)
+        encoded = None if columnar else appendable(base.encoded)
+    
+    row_count = len(base.records) if base is not None else 0
+    first_row = row_count
+    dates = {field: [] for field in DATE_FIELDS[dataset]}
+    frames = []
+    progress = LoadProgress(dataset)
+    errors = []
+    
+    for batch in iter_batches(stream):
+        valid = []
+        for position, record in enumerate(batch, start=progress.loaded + progress.rejected):
+            error = validate_record(dataset, record)
+            if error is None:
+                valid.append(record)
+                if ids is not None:
+                    ids.append(str(record[ID_FIELDS[dataset]]).strip())
+            elif len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"record": position, "error": error})
+        
+        for record in valid:
+            index_search_record(search_index, row_count, record, SEARCH_FIELDS[dataset], bases)
+            index_filter_record(filter_index, row_count, record,
+                                RELATION_FIELDS[dataset] if columnar else FILTER_FIELDS[dataset], bases)
+            count_entities(counts, dataset, record)
+            track_references(references, dataset, row_count, record, bases)
+            if dataset == "maintenance":
+                aggregate_cost(aggregates, record, bases)
+            for field, ordinals in dates.items():
+                ordinals.append(date_ordinal(record.get(field)))
+            row_count += 1
+        
+        fragments = encode_records(valid) if not columnar or log is not None else None
+        if columnar:
+            if valid:
+                from src.columnar_store import build_frame
+                frames.append(build_frame(valid))
+        else:
+            records.extend(valid)
+            encoded.extend(fragments)
+        if log is not None:
+            log.writelines(fragment + b"\n" for fragment in fragments)
+        progress.update(len(valid), len(batch) - len(valid))
+    
+    if columnar:
+        from src.columnar_store import FrameRecords, concat_frames
+        if base is None:
+            records = FrameRecords(concat_frames(frames))
+        else:
+            records = base.records.appended(concat_frames(frames)) if frames else base.records
+    
+    new_references = ()
+    if base is None:
+        search_index["vocabulary"] = SortedRuns(sorted(search_index["postings"]))
+    else:
+        new_tokens = sorted(token for token in search_index["postings"] if token not in base.search_index["postings"])
+        search_index["vocabulary"] = base.search_index["vocabulary"].added(new_tokens)
+        for key in ("postings", "frequencies"):
+            search_index[key] = layered(base.search_index[key], search_index[key])
+        search_index["lengths"] = append_array(base.search_index["lengths"], search_index["lengths"])
+        filter_index = {field: layered(base.filter_index[field], buckets) for field, buckets in filter_index.items()}
+        new_references = tuple(references)
+        references = layered(base.references, references)
+        aggregates = {grouping: layered(base.aggregates[grouping], groups) for grouping, groups in aggregates.items()}
+    
+    stats = progress.summary()
+    stats["errors"] = errors
+    if base is not None:
+        stats["appended"] = stats["records"]
+        stats["records"] += base.stats["records"]
+    
+    date_index = extend_date_index(base.date_index if base is not None else None, dates, first_row)
+    state = DatasetState(dataset, records, search_index, filter_index, counts, references, stats, encoded,
+                         aggregates, date_index)
+    state.new_references = new_references
+    return state
+
+def _changes(base: Dict[Any, Any], bases: Dict[int, Dict[Any, Any]]) -> Dict[Any, Any]:
+    """Return an empty dict that collects changes to a mapping of a base state, registered in bases."""
+    changes = {}
+    bases[id(changes)] = base
+    return changes
+
+def append_records(dataset: str, stream) -> Dict[str, Any]:
+    """
+    Validate and append a record stream to a dataset, then publish a new snapshot.
+    
+    Indexes, entity counts and integrity references are extended
+    incrementally from the current state. Writers are serialized, so
+    concurrent appends and reloads never lose each other's records.
+    
+    Accepted records are written to the dataset's ingest log and flushed to
+    disk before they are published; loads replay the log on top of the
+    source, so they survive reloads and restarts. A stream without a valid
+    record publishes nothing.
+    """
+    with _write_lock:
+        base = _snapshot.dataset(dataset)
+        with _ingest_log(dataset) as log:
+            state = _ingest_stream(dataset, stream, base=base, log=log)
+        snapshot = _publish(**{dataset: state}, base=base) if state.stats["appended"] else _snapshot
+    
+    stats = state.stats
+    return {
+        "dataset": dataset,
+        "accepted": stats["appended"],
+        "rejected": stats["rejected"],
+        "errors": stats["errors"],
+        "total_records": len(snapshot.dataset(dataset).records),
+        "data_version": snapshot.version,
+        "ingest_log": str(ingest_log_path(dataset)),
+        "seconds": stats["seconds"],
+        "records_per_second": stats["records_per_second"]
+    }
+
+def ingest_file(dataset: str, binary_file, file_format: str) -> Dict[str, Any]:
+    """Append records from an uploaded CSV, JSON array or NDJSON file."""
+    text = io.TextIOWrapper(binary_file, encoding="utf-8", newline="")
+    try:
+        stream = iter_csv_records(text) if file_format == "csv" else iter_json_records(text)
+        return append_records(dataset, stream)
+    finally:
+        text.detach()
+
+def _report_load(dataset: str):
+    """Print the record count and throughput of the last load of a dataset."""
+    stats = _snapshot.dataset(dataset).stats
+    if stats.get("snapshot"):
+        message = f" Loaded {stats['records']} {dataset} records from snapshot in {stats['seconds']}s"
+    else:
+        message = (f" Loaded {stats['records']} {dataset} records in {stats['seconds']}s "
+                   f"({stats['records_per_second']:,.0f} records/s)")
+        if stats.get("shards"):
+            message += f" from {stats['shards']} shards on {stats['workers']} workers"
+        if stats.get("duplicates"):
+            message += f", dropped {stats['duplicates']} superseded duplicates"
+        if stats["rejected"]:
+            message += f", rejected {stats['rejected']} invalid records"
+    if stats.get("replayed"):
+        message += f", replayed {stats['replayed']} ingested records"
+    print(message)
+
+def set_storage_engine(engine: str):
+    """Select the storage engine used by subsequent loads."""
+    global STORAGE_ENGINE
+    if engine not in STORAGE_ENGINES:
+        raise ValueError(f"Storage engine must be one of: {', '.join(STORAGE_ENGINES)}")
+    STORAGE_ENGINE = engine
+
+def _fold(value: Any) -> str:
+    """Normalize a field value for case-insensitive index lookups."""
+    return str(value).strip().casefold()
+
+def _dataset_records(dataset: str, snapshot: Optional[DataSnapshot] = None) -> Sequence[Dict[str, Any]]:
+    """Return the record list backing a dataset name."""
+    return (snapshot or _snapshot).dataset(dataset).records
+
+def build_filter_index(records: List[Dict[str, Any]], fields: List[str]) -> Dict[str, Dict[str, List[int]]]:
+    """Build case-folded hash indexes (value -> sorted row ids) for each field."""
+    index = {field: {} for field in fields}
+    
+    for row_id, record in enumerate(records):
+        index_filter_record(index, row_id, record, fields)
+    
+    return index
+
+def _append_owned(mapping: Dict[Any, list], key: Any, value: Any, bases: Optional[Dict[int, Dict[Any, list]]]):
+    """Append to mapping[key]; a mapping of changes registered in bases first forks the list of its base."""
+    values = mapping.get(key)
+    if values is None:
+        shared = bases[id(mapping)].get(key) if bases is not None else None
+        values = mapping[key] = appendable(shared) if shared is not None else []
+    values.append(value)
+
+def index_filter_record(index: Dict[str, Dict[str, List[int]]], row_id: int,
+                        record: Dict[str, Any], fields: List[str], bases: Optional[Dict[int, dict]] = None):
+    """Add one record to the filter indexes; row ids must arrive in increasing order."""
+    for field in fields:
+        value = record.get(field)
+        if value is not None:
+            _append_owned(index[field], _fold(value), row_id, bases)
+
+def filter_row_ids(dataset: str, filters: Dict[str, Any], snapshot: Optional[DataSnapshot] = None,
+                   date_ranges: Optional[Dict[str, Tuple[Optional[date], Optional[date]]]] = None):
+    """
+    Resolve equality filters and date ranges to the matching row ids of a dataset.
+    
+    Filters with a value of None are ignored. Each remaining filter is looked
+    up in its secondary index and the buckets are intersected, so the cost
+    depends on bucket sizes rather than dataset size. Date ranges map a date
+    field to inclusive (start, end) bounds, either of which may be None; they
+    are resolved by binary search in the sorted date indexes. Returns a
+    sorted sequence of row ids (a range when nothing is filtered).
+    """
+    state = (snapshot or _snapshot).dataset(dataset)
+    active = {field: value for field, value in filters.items() if value is not None}
+    ranges = {field: bounds for field, bounds in (date_ranges or {}).items() if bounds != (None, None)}
+    if not active and not ranges:
+        return range(len(state.records))
+    
+    unknown = [field for field in active if field not in FILTER_FIELDS[dataset]]
+    if unknown:
+        raise ValueError(f"Field '{unknown[0]}' is not indexed for {dataset}")
+    unknown = [field for field in ranges if field not in DATE_FIELDS[dataset]]
+    if unknown:
+        raise ValueError(f"Field '{unknown[0]}' has no date index for {dataset}")
+    
+    row_ids = _equality_row_ids(state, active) if active else None
+    if ranges and (row_ids is None or len(row_ids)):
+        row_ids = _date_range_row_ids(state, ranges, row_ids)
+    return row_ids
+
+def _equality_row_ids(state: DatasetState, active: Dict[str, Any]):
+    if hasattr(state.records, "frames"):
+        from src.columnar_store import filter_row_ids as filter_frame_row_ids
+        return filter_frame_row_ids(state.records, active)
+    
+    buckets = []
+    for field, value in active.items():
+        bucket = state.filter_index[field].get(_fold(value))
+        INDEX_LOOKUPS.inc(index="filter", result="hit" if bucket else "miss")
+        if not bucket:
+            return []
+        buckets.append(bucket)
+    
+    if len(buckets) == 1:
+        return buckets[0]
+    
+    buckets.sort(key=len)
+    result = set(buckets[0])
+    for bucket in buckets[1:]:
+        result.intersection_update(bucket)
+        if not result:
+            break
+    return sorted(result)
+
+def _date_range_row_ids(state: DatasetState, ranges: Dict[str, Tuple[Optional[date], Optional[date]]],
+                        row_ids: Optional[Sequence[int]]) -> List[int]:
+    """Narrow row ids (None for all rows) to those whose dates lie within every range."""
+    bounds = []
+    for field, (start, end) in ranges.items():
+        index = state.date_index[field]
+        low = start.toordinal() if start else 1
+        high = end.toordinal() if end else date.max.toordinal()
+        count = sum(bisect_right(dates, high) - bisect_left(dates, low) for dates, _ in index["dates"].runs)
+        INDEX_LOOKUPS.inc(index="date", result="hit" if count else "miss")
+        bounds.append((count, index, low, high))
+    
+    if row_ids is None:
+        # Slice the narrowest range out of its sorted index and check the others row by row
+        bounds.sort(key=lambda bound: bound[0])
+        _, index, low, high = bounds.pop(0)
+        row_ids = sorted(itertools.chain.from_iterable(rows[bisect_left(dates, low):bisect_right(dates, high)]
+                                                       for dates, rows in index["dates"].runs))
+    
+    checks = [(index["by_row"], low, high) for _, index, low, high in bounds]
+    return [row_id for row_id in row_ids if all(low <= by_row[row_id] <= high for by_row, low, high in checks)]
+
+def get_records(dataset: str, row_ids: Sequence[int], fields: Optional[List[str]] = None,
+                snapshot: Optional[DataSnapshot] = None) -> List[Dict[str, Any]]:
+    """Materialize records for row ids, optionally projected to the given fields."""
+    records = _dataset_records(dataset, snapshot)
+    if not fields:
+        return [records[row_id] for row_id in row_ids]
+    return [{field: records[row_id][field] for field in fields if field in records[row_id]}
+            for row_id in row_ids]
+
+def get_encoded_records(dataset: str, row_ids: Sequence[int],
+                        snapshot: Optional[DataSnapshot] = None) -> List[bytes]:
+    """Return the pre-encoded JSON of the records for row ids.
+    
+    The columnar engine keeps no per-record bytes, so only the requested rows
+    are encoded from the frame.
+    """
+    state = (snapshot or _snapshot).dataset(dataset)
+    if state.encoded is None:
+        return encode_records(state.records[row_id] for row_id in row_ids)
+    return [state.encoded[row_id] for row_id in row_ids]
+
+def encode_cursor(dataset: str, row_id: int) -> str:
+    """Encode the position of the last returned row as an opaque cursor."""
+    raw = f"{dataset}:{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Decode a cursor produced by encode_cursor into (dataset, row_id)."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        dataset, row_id = base64.urlsafe_b64decode(padded).decode("utf-8").split(":")
+        if dataset not in SEARCH_FIELDS:
+            raise ValueError(dataset)
+        return dataset, int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid pagination cursor")
+
+def page_row_ids(row_ids: Sequence[int], limit: Optional[int], after: Optional[int] = None) -> Tuple[Sequence[int], bool]:
+    """
+    Slice a sorted row id sequence into one page.
+    
+    Rows are ordered by row id, which is stable because records are only
+    ever appended. Returns the page and whether more rows follow it.
+    """
+    start = bisect_right(row_ids, after) if after is not None else 0
+    if limit is None:
+        return row_ids[start:], False
+    end = start + limit
+    return row_ids[start:end], end < len(row_ids)
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase alphanumeric search tokens."""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+def index_search_record(index: Dict[str, Any], row_id: int, record: Dict[str, Any], fields: List[str],
+                        bases: Optional[Dict[int, dict]] = None):
+    """
+    Add one record to a search index; row ids must arrive in increasing order.
+    
+    The sorted vocabulary is not updated here, callers re-sort it once the
+    batch of new records is indexed.
+    """
+    values = []
+    weights = {}
+    length = 0
+    for field in fields:
+        value = str(record.get(field) or "").lower()
+        values.append(value)
+        tokens = _TOKEN_PATTERN.findall(value)
+        if tokens:
+            boost = SEARCH_BOOSTS.get(field, 1)
+            length += boost * len(tokens)
+            for token in tokens:
+                weights[token] = weights.get(token, 0) + boost
+    
+    index["texts"].append(" ".join(values))
+    index["lengths"].append(length)
+    index["total_length"] += length
+    postings = index["postings"]
+    frequencies = index["frequencies"]
+    for token, weight in weights.items():
+        _append_owned(postings, token, row_id, bases)
+        _append_owned(frequencies, token, weight, bases)
+
+def _prefix_postings(index: Dict[str, Any], prefix: str) -> set:
+    """Collect row ids of every indexed token starting with prefix."""
+    postings = index["postings"]
+    row_ids = set()
+    for tokens, _ in index["vocabulary"].runs:
+        position = bisect_left(tokens, prefix)
+        while position < len(tokens) and tokens[position].startswith(prefix):
+            row_ids.update(postings[tokens[position]])
+            position += 1
+    return row_ids
+
+def search_row_ids(dataset: str, query: str, mode: str = "token",
+                   snapshot: Optional[DataSnapshot] = None) -> List[int]:
+    """
+    Find the row ids in a dataset that match a search query.
+    
+    - token: every query token must appear as a whole token in the record
+    - prefix: every query token must be a prefix of some token in the record
+    - substring: the whole query must appear in the record text (legacy behaviour)
+    - ranked: any query token must appear; use ranked_search for the best matches
+    """
+    index = (snapshot or _snapshot).dataset(dataset).search_index
+    result = _search_index(index, query.lower(), mode)
+    INDEX_LOOKUPS.inc(index=f"search_{mode}", result="hit" if result else "miss")
+    return result
+
+def _search_index(index: Dict[str, Any], query_lower: str, mode: str) -> List[int]:
+    if mode == "substring":
+        return [row_id for row_id, text in enumerate(index["texts"]) if query_lower in text]
+    
+    tokens = set(tokenize(query_lower))
+    if not tokens:
+        return []
+    
+    if mode == "ranked":
+        return sorted(set().union(*(index["postings"].get(token, ()) for token in tokens)))
+    
+    if mode == "prefix":
+        candidate_sets = [_prefix_postings(index, token) for token in tokens]
+    else:
+        postings = index["postings"]
+        if any(token not in postings for token in tokens):
+            return []
+        candidate_sets = [postings[token] for token in tokens]
+    
+    # Intersect starting from the smallest posting list
+    candidate_sets.sort(key=len)
+    result = set(candidate_sets[0])
+    for candidates in candidate_sets[1:]:
+        result.intersection_update(candidates)
+        if not result:
+            break
+    return sorted(result)
+
+def ranked_search(dataset: str, query: str, limit: int,
+                  snapshot: Optional[DataSnapshot] = None) -> List[Tuple[int, float]]:
+    """
+    Rank the records of a dataset against a query with BM25 and return the best (row id, score) pairs.
+    
+    A record matches when it contains any query token. Token frequencies and
+    record lengths are weighted by SEARCH_BOOSTS, so a hit in an identifier or
+    category scores above the same word in a description.
+    
+    Tokens are scored rarest first. No token adds more than idf * (k1 + 1) to
+    a record, so once the k-th best score so far exceeds what the remaining
+    tokens could add, records not seen yet cannot reach the top k: the posting
+    lists of common tokens are then only probed for the records still in
+    contention instead of being scored in full.
+    """
+    index = (snapshot or _snapshot).dataset(dataset).search_index
+    postings = index["postings"]
+    tokens = [token for token in dict.fromkeys(tokenize(query)) if token in postings]
+    if not tokens or limit <= 0:
+        INDEX_LOOKUPS.inc(index="search_ranked", result="miss")
+        return []
+    INDEX_LOOKUPS.inc(index="search_ranked", result="hit")
+    
+    lengths = index["lengths"]
+    count = len(lengths)
+    tokens.sort(key=lambda token: len(postings[token]))
+    scales = [(BM25_K1 + 1) * math.log(1 + (count - len(postings[token]) + 0.5) / (len(postings[token]) + 0.5))
+              for token in tokens]
+    # Most that the tokens after each one can still add to a record
+    bounds = list(itertools.accumulate(reversed(scales[1:]), initial=0.0))[::-1]
+    # Length normalization of a record is norm_base + norm_slope * its length
+    norm_base = BM25_K1 * (1 - BM25_B)
+    norm_slope = BM25_K1 * BM25_B * count / index["total_length"]
+    
+    scores = {}
+    threshold = 0.0
+    for token, scale, remaining in zip(tokens, scales, bounds):
+        rows = postings[token]
+        frequencies = index["frequencies"][token]
+        open_to_new = len(scores) < limit or scale + remaining > threshold
+        
+        if open_to_new:
+            for row_id, frequency in zip(rows, frequencies):
+                score = scale * frequency / (frequency + norm_base + norm_slope * lengths[row_id])
+                scores[row_id] = scores.get(row_id, 0.0) + score
+        elif len(scores) * max(1, len(rows).bit_length()) < len(rows):
+            # Few records in contention: binary search them in the sorted posting list
+            for row_id in scores:
+                position = bisect_left(rows, row_id)
+                if position < len(rows) and rows[position] == row_id:
+                    frequency = frequencies[position]
+                    scores[row_id] += scale * frequency / (frequency + norm_base + norm_slope * lengths[row_id])
+        else:
+            for row_id, frequency in zip(rows, frequencies):
+                if row_id in scores:
+                    scores[row_id] += scale * frequency / (frequency + norm_base + norm_slope * lengths[row_id])
+        
+        if len(scores) >= limit:
+            threshold = heapq.nlargest(limit, scores.values())[-1]
+            if remaining < threshold:
+                # Drop records that cannot catch up with the k-th best any more
+                scores = {row_id: score for row_id, score in scores.items() if score + remaining >= threshold}
+    
+    return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+
+class QueryLookups:
+    """
+    Row id lookups shared by a batch of queries against one snapshot.
+    
+    Queries with the same filters or the same search resolve their row ids
+    once, whatever their paging or projection. Substring searches, the only
+    ones that scan every record, are answered together: prefetch_substrings
+    makes a single pass over each dataset for all of them.
+    """
+    
+    def __init__(self, snapshot: Optional[DataSnapshot] = None):
+        self.snapshot = snapshot or _snapshot
+        # Distinct lookups made, and uses of a lookup made for an earlier query
+        self.resolved = 0
+        self.shared = 0
+        self._row_ids = {}
+        self._prefetched = set()
+    
+    def _memo(self, key: Tuple, resolve):
+        if key in self._prefetched:
+            self._prefetched.discard(key)
+        elif key in self._row_ids:
+            self.shared += 1
+        else:
+            self.resolved += 1
+            self._row_ids[key] = resolve()
+        return self._row_ids[key]
+    
+    def filter_row_ids(self, dataset: str, filters: Dict[str, Any],
+                       date_ranges: Optional[Dict[str, Tuple[Optional[date], Optional[date]]]] = None):
+        """Memoized filter_row_ids."""
+        key = ("filter", dataset,
+               tuple(sorted((field, _fold(value)) for field, value in filters.items() if value is not None)),
+               tuple(sorted((field, bounds) for field, bounds in (date_ranges or {}).items() if bounds != (None, None))))
+        return self._memo(key, lambda: filter_row_ids(dataset, filters, self.snapshot, date_ranges))
+    
+    def _search_key(self, dataset: str, query: str, mode: str) -> Tuple:
+        terms = query.lower() if mode == "substring" else tuple(sorted(set(tokenize(query))))
+        return ("search", dataset, mode, terms)
+    
+    def search_row_ids(self, dataset: str, query: str, mode: str = "token") -> List[int]:
+        """Memoized search_row_ids."""
+        return self._memo(self._search_key(dataset, query, mode),
+                          lambda: search_row_ids(dataset, query, mode, self.snapshot))
+    
+    def prefetch_substrings(self, queries: Sequence[str]):
+        """Answer substring searches with one pass over the texts of each dataset."""
+        for dataset in SEARCH_FIELDS:
+            pending = {}
+            for query in queries:
+                key = self._search_key(dataset, query, "substring")
+                if key not in self._row_ids:
+                    pending[key[-1]] = key
+            if not pending:
+                continue
+            
+            matches = {needle: [] for needle in pending}
+            for row_id, text in enumerate(self.snapshot.dataset(dataset).search_index["texts"]):
+                for needle, row_ids in matches.items():
+                    if needle in text:
+                        row_ids.append(row_id)
+            for needle, row_ids in matches.items():
+                self._row_ids[pending[needle]] = row_ids
+                self._prefetched.add(pending[needle])
+                self.resolved += 1
+                INDEX_LOOKUPS.inc(index="search_substring", result="hit" if row_ids else "miss")
+
+def _empty_entity_counts(dataset: str) -> Dict[str, Counter]:
+    """Return fresh counters for the entity categories sourced from a dataset."""
+    return {key: Counter() for key, (source, _) in ENTITY_FIELDS.items() if source == dataset}
+
+def count_entities(counts: Dict[str, Counter], dataset: str, record: Dict[str, Any]):
+    """Add the entities of one record to the matching counters."""
+    for key, (source, field) in ENTITY_FIELDS.items():
+        if source == dataset and key in counts:
+            value = str(record.get(field) or "").strip()
+            if value:
+                counts[key][value] += 1
+
+def get_entity_catalog(snapshot: Optional[DataSnapshot] = None) -> Dict[str, Any]:
+    """Get the precomputed, version-stamped entity catalog."""
+    return (snapshot or _snapshot).entity_catalog
+
+def top_entities(limit: int, catalog: Optional[Dict[str, Any]] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """Return the most frequent entities of each category with their counts."""
+    catalog = catalog or _snapshot.entity_catalog
+    return {key: [{"name": name, "count": count} for name, count in ranked[:limit]]
+            for key, ranked in catalog["ranked"].items()}
+
+def extract_entities(snapshot: Optional[DataSnapshot] = None):
     """Extract key entities from both datasets."""
-    entities = {
-        "equipment_types": set(),
-        "locations": set(),
-        "maintenance_types": set(),
-        "manufacturers": set(),
-        "technicians": set()
+    return (snapshot or _snapshot).entity_catalog["entities"]
+
+def build_prefix_index(counts: Dict[str, int]) -> Dict[str, Any]:
+    """
+    Build a case-insensitive prefix index over names and their frequencies.
+    
+    Names are sorted by their case-folded form, so the names starting with
+    a prefix form one contiguous range found by binary search. A tournament
+    tree over the sorted positions holds the most frequent position of each
+    subtree (ties go to the earlier name), so the top names of any range
+    are found without scanning it.
+    """
+    entries = sorted((str(name).casefold(), str(name), count) for name, count in counts.items() if name)
+    frequencies = [count for _, _, count in entries]
+    
+    size = 1
+    while size < len(entries):
+        size *= 2
+    # Node i covers nodes 2i and 2i + 1; leaves start at size and hold positions, -1 past the end
+    tree = array("l", [-1]) * (2 * size)
+    tree[size:size + len(entries)] = array("l", range(len(entries)))
+    for node in range(size - 1, 0, -1):
+        left, right = tree[2 * node], tree[2 * node + 1]
+        tree[node] = left if right < 0 or frequencies[left] >= frequencies[right] else right
+    
+    return {
+        "keys": [key for key, _, _ in entries],
+        "names": [name for _, name, _ in entries],
+        "counts": frequencies,
+        "tree": tree
     }
+
+def prefix_matches(index: Dict[str, Any], prefix: str, limit: int) -> List[Tuple[str, int]]:
+    """
+    Return up to limit (name, count) pairs starting with prefix, most frequent first.
+    
+    The range of matching positions is covered by O(log n) subtrees, and the
+    subtree with the most frequent remaining position is expanded until
+    limit leaves come out, so a lookup costs O(limit log n) however many
+    names match.
+    """
+    positions = itertools.islice(_prefix_positions(index, prefix), limit)
+    return [(index["names"][position], index["counts"][position]) for position in positions]
+
+def _prefix_positions(index: Dict[str, Any], prefix: str):
+    """Yield the positions of the names starting with prefix, most frequent first."""
+    keys = index["keys"]
+    counts = index["counts"]
+    tree = index["tree"]
+    size = len(tree) // 2
+    prefix = prefix.casefold()
+    start = bisect_left(keys, prefix)
+    end = bisect_left(keys, prefix + "\U0010ffff", start)
     
-    # Extract from equipment data
-    for equipment in equipment_data:
-        entities["equipment_types"].add(equipment.get("equipment_type", "").strip())
-        entities["locations"].add(equipment.get("location", "").strip())
-        entities["manufacturers"].add(equipment.get("manufacturer", "").strip())
+    heap = []
+    def push(node):
+        best = tree[node]
+        if best >= 0:
+            heapq.heappush(heap, (-counts[best], best, node))
     
-    # Extract from maintenance data
-    for log in maintenance_logs:
-        entities["maintenance_types"].add(log.get("maintenance_type", "").strip())
-        entities["technicians"].add(log.get("technician", "").strip())
+    low, high = start + size, end + size
+    while low < high:
+        if low & 1:
+            push(low)
+            low += 1
+        if high & 1:
+            high -= 1
+            push(high)
+        low //= 2
+        high //= 2
+    
+    while heap:
+        _, best, node = heapq.heappop(heap)
+        if node >= size:
+            yield best
+        else:
+            push(2 * node)
+            push(2 * node + 1)
+
+def _autocomplete_counts(category: str, snapshot: DataSnapshot) -> Dict[str, int]:
+    """Return the names of a category with their frequencies."""
+    if category == "equipment_ids":
+        # Equipment is ranked by how many maintenance logs reference it
+        references = snapshot.maintenance.references
+        return {equipment_id: len(references.get(equipment_id, ())) for equipment_id in snapshot.equipment.references}
+    if category == "log_ids":
+        return Counter(log_id for refs in snapshot.maintenance.references.values() for _, log_id in refs)
+    return snapshot.entity_counts[category]
+
+def _autocomplete_index(counts: Dict[str, int]) -> Dict[str, Any]:
+    """
+    Build the autocomplete index of a category from its names and frequencies.
     
-    # Convert to sorted lists, removing empty values
-    return {key: sorted([item for item in values if item]) 
-            for key, values in entities.items()}
+    runs holds prefix indexes oldest first and counts the current frequency
+    of every name. Appends only raise frequencies, so an entry of a run is
+    current exactly when its count is the one in counts; older entries are
+    stale and skipped by readers.
+    """
+    counts = {str(name): count for name, count in counts.items() if name}
+    return {"runs": (build_prefix_index(counts),), "counts": counts, "stale": 0}
+
+def _extend_autocomplete_index(index: Dict[str, Any], changes: Dict[str, int]) -> Optional[Dict[str, Any]]:
+    """
+    Return an autocomplete index updated with the new counts of some names, leaving it as it is.
+    
+    The changed names become a run of their own, merged with the runs before
+    it while it is at least half their size; merges drop stale entries.
+    Returns None, for a rebuild on next use, once stale entries outnumber
+    half the names.
+    """
+    changes = {name: count for name, count in changes.items() if index["counts"].get(name) != count}
+    if not changes:
+        return index
+    
+    counts = layered(index["counts"], changes)
+    stale = index["stale"] + sum(1 for name in changes if name in index["counts"])
+    runs = list(index["runs"])
+    run = changes
+    while runs and 2 * len(run) >= len(runs[-1]["names"]):
+        older = runs.pop()
+        kept = {name: count for name, count in zip(older["names"], older["counts"])
+                if name not in run and counts[name] == count}
+        stale -= len(older["names"]) - len(kept)
+        kept.update(run)
+        run = kept
+    if 2 * stale > len(counts):
+        return None
+    return {"runs": (*runs, build_prefix_index(run)), "counts": counts, "stale": stale}
+
+def _autocomplete_matches(index: Dict[str, Any], prefix: str, limit: int) -> List[Tuple[str, int]]:
+    """Return up to limit current (name, count) pairs starting with prefix across the runs of an index."""
+    counts = index["counts"]
+    matches = []
+    for run in index["runs"]:
+        names, frequencies = run["names"], run["counts"]
+        current = ((names[position], frequencies[position]) for position in _prefix_positions(run, prefix)
+                   if counts[names[position]] == frequencies[position])
+        matches.extend(itertools.islice(current, limit))
+    if len(index["runs"]) == 1:
+        return matches
+    return heapq.nsmallest(limit, matches, key=lambda match: (-match[1], match[0].casefold(), match[0]))
+
+def _new_refs(refs: Sequence[Tuple[int, str]], first_new: int) -> Sequence[Tuple[int, str]]:
+    """Return the trailing (row id, log id) references of the rows from first_new on."""
+    position = len(refs)
+    while position and refs[position - 1][0] >= first_new:
+        position -= 1
+    return refs[position:]
+
+def _autocomplete_changes(category: str, index: Dict[str, Any], previous: DataSnapshot,
+                          snapshot: DataSnapshot) -> Dict[str, int]:
+    """Return the names of a category whose frequency an append to the previous snapshot changed."""
+    equipment, maintenance = snapshot.equipment, snapshot.maintenance
+    appended = "equipment" if previous.maintenance is maintenance else "maintenance"
+    if category == "equipment_ids":
+        if appended == "equipment":
+            return {str(equipment_id): len(maintenance.references.get(equipment_id, ()))
+                    for equipment_id in equipment.new_references}
+        return {str(equipment_id): len(maintenance.references[equipment_id])
+                for equipment_id in maintenance.new_references if equipment_id in equipment.references}
+    if category == "log_ids":
+        if appended == "equipment":
+            return {}
+        first_new = len(previous.maintenance.records)
+        added = Counter(str(log_id) for equipment_id in maintenance.new_references
+                        for _, log_id in _new_refs(maintenance.references[equipment_id], first_new))
+        return {log_id: index["counts"].get(log_id, 0) + count for log_id, count in added.items() if log_id}
+    if ENTITY_FIELDS[category][0] != appended:
+        return {}
+    return {str(name): count for name, count in snapshot.entity_counts[category].items()
+            if name and index["counts"].get(str(name)) != count}
+
+def _carried_autocomplete(previous: Optional[DataSnapshot], snapshot: DataSnapshot) -> Dict[str, Dict[str, Any]]:
+    """Return the autocomplete indexes of the previous snapshot carried over to a new one."""
+    carried = {}
+    if previous is None:
+        return carried
+    # Requests may build indexes of the previous snapshot meanwhile
+    for category, index in list(previous.autocomplete.items()):
+        index = _extend_autocomplete_index(index, _autocomplete_changes(category, index, previous, snapshot))
+        if index is not None:
+            carried[category] = index
+    return carried
+
+def autocomplete_ready(categories: Sequence[str], snapshot: Optional[DataSnapshot] = None) -> bool:
+    """Check whether the prefix indexes of the categories are already built for a snapshot."""
+    return all(category in (snapshot or _snapshot).autocomplete for category in categories)
+
+def autocomplete(prefix: str, categories: Optional[Sequence[str]] = None, limit: int = 10,
+                 snapshot: Optional[DataSnapshot] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Suggest names starting with a prefix in each category, most frequent first.
+    
+    The prefix index of a category is built on its first use in a snapshot,
+    from the entity counts and the integrity references kept at load time,
+    and carried across appends.
+    """
+    snapshot = snapshot or _snapshot
+    categories = categories or AUTOCOMPLETE_CATEGORIES
+    unknown = [category for category in categories if category not in AUTOCOMPLETE_CATEGORIES]
+    if unknown:
+        raise ValueError(f"Category must be one of: {', '.join(AUTOCOMPLETE_CATEGORIES)}")
+    
+    suggestions = {}
+    for category in categories:
+        index = snapshot.autocomplete.get(category)
+        if index is None:
+            index = _autocomplete_index(_autocomplete_counts(category, snapshot))
+            snapshot.autocomplete[category] = index
+        matches = _autocomplete_matches(index, prefix.lstrip(), limit)
+        INDEX_LOOKUPS.inc(index="autocomplete", result="hit" if matches else "miss")
+        suggestions[category] = [{"value": name, "count": count} for name, count in matches]
+    return suggestions
+
+def date_ordinal(value: Any) -> int:
+    """Return the proleptic day number of an ISO date or datetime value, or 0 if it has none."""
+    if isinstance(value, (date, datetime)):
+        return value.toordinal()
+    text = str(value or "").strip()
+    try:
+        return date.fromisoformat(text[:10]).toordinal() if text else 0
+    except ValueError:
+        return 0
 
-def validate_data_integrity():
-    """Perform basic data validation."""
+def extend_date_index(base: Optional[Dict[str, Dict[str, Any]]], dates: Dict[str, List[int]],
+                      first_row: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Return date indexes of a base extended by the day ordinals of new rows.
+    
+    dates maps each field to the ordinals of consecutive rows starting at
+    first_row, 0 for rows without a valid date. The base is left untouched:
+    the new rows become a sorted run of their own, merged with the runs
+    before it as it grows (logs usually arrive in date order, which makes
+    those merges concatenations).
+    """
+    index = {}
+    for field, ordinals in dates.items():
+        added = sorted((ordinal, row_id) for row_id, ordinal in enumerate(ordinals, start=first_row) if ordinal)
+        sorted_dates = array("l", [ordinal for ordinal, _ in added])
+        rows = array("l", [row_id for _, row_id in added])
+        if base:
+            index[field] = {"dates": base[field]["dates"].added(sorted_dates, rows),
+                            "by_row": append_array(base[field]["by_row"], ordinals)}
+        else:
+            index[field] = {"dates": SortedRuns(sorted_dates, rows), "by_row": array("l", ordinals)}
+    return index
+
+def _build_schedule(maintenance: DatasetState) -> Dict[str, Any]:
+    """
+    Build the schedule: the due dates of each equipment's latest log, sorted.
+    
+    entries holds (due date, row id) runs, latest the latest row of each
+    equipment and dropped the rows of entries that a later log replaced
+    since the schedule was built; readers skip those.
+    """
+    logged = maintenance.date_index["date"]["by_row"]
+    due = maintenance.date_index["next_scheduled"]["by_row"]
+    latest = {}
+    entries = []
+    for equipment_id, refs in maintenance.references.items():
+        row_id = latest[equipment_id] = max((row_id for row_id, _ in refs),
+                                            key=lambda row_id: (logged[row_id], row_id))
+        if due[row_id]:
+            entries.append((due[row_id], row_id))
+    return {
+        "entries": SortedRuns(*_schedule_run(entries)),
+        "latest": latest,
+        "dropped": {}
+    }
+
+def _schedule_run(entries: List[Tuple[int, int]]) -> Tuple[array, array]:
+    """Sort (due date, row id) entries into a run of due dates and one of row ids."""
+    entries.sort()
+    return array("l", [ordinal for ordinal, _ in entries]), array("l", [row_id for _, row_id in entries])
+
+def _extend_schedule(schedule: Dict[str, Any], base: DatasetState,
+                     maintenance: DatasetState) -> Optional[Dict[str, Any]]:
+    """
+    Return the schedule of a base state updated for the logs appended to it, leaving it as it is.
+    
+    Only the equipment the new logs reference is looked at. Returns None,
+    for a rebuild on next use, once replaced entries outnumber half the
+    current ones.
+    """
+    logged = maintenance.date_index["date"]["by_row"]
+    due = maintenance.date_index["next_scheduled"]["by_row"]
+    first_new = len(base.records)
+    latest = {}
+    dropped = {}
+    entries = []
+    for equipment_id in maintenance.new_references:
+        refs = _new_refs(maintenance.references[equipment_id], first_new)
+        row_id = max((row_id for row_id, _ in refs), key=lambda row_id: (logged[row_id], row_id))
+        current = schedule["latest"].get(equipment_id)
+        if current is not None:
+            if (logged[current], current) > (logged[row_id], row_id):
+                continue
+            if due[current]:
+                dropped[current] = None
+        latest[equipment_id] = row_id
+        if due[row_id]:
+            entries.append((due[row_id], row_id))
+    
+    latest = layered(schedule["latest"], latest)
+    dropped = layered(schedule["dropped"], dropped)
+    if 2 * len(dropped) > len(latest):
+        return None
+    return {
+        "entries": schedule["entries"].added(*_schedule_run(entries)),
+        "latest": latest,
+        "dropped": dropped
+    }
+
+def _carried_schedule(previous: Optional[DataSnapshot], maintenance: DatasetState) -> Optional[Dict[str, Any]]:
+    """Return the schedule of the previous snapshot carried over to a new one, if it was built."""
+    if previous is None or previous.schedule is None:
+        return None
+    if previous.maintenance is maintenance:
+        return previous.schedule
+    return _extend_schedule(previous.schedule, previous.maintenance, maintenance)
+
+def _current_schedule(snapshot: DataSnapshot) -> Dict[str, Any]:
+    """Return the schedule of a snapshot, building it on first use."""
+    schedule = snapshot.schedule
+    if schedule is None:
+        schedule = snapshot.schedule = _build_schedule(snapshot.maintenance)
+    return schedule
+
+def maintenance_schedule(status: str, as_of: date, days: int = 30,
+                         snapshot: Optional[DataSnapshot] = None) -> List[int]:
+    """
+    Return row ids of logs whose next_scheduled date is overdue or upcoming, earliest due first.
+    
+    Only the latest log of each piece of equipment counts, since a later
+    visit replaces the schedule set by earlier ones. Overdue logs were due
+    before as_of; upcoming ones are due from as_of through as_of + days.
+    The sorted schedule is built once and then carried across appends,
+    which add only their own logs; each query is a binary search per run.
+    """
+    if status not in SCHEDULE_STATUSES:
+        raise ValueError(f"Status must be one of: {', '.join(SCHEDULE_STATUSES)}")
+    
+    schedule = _current_schedule(snapshot or _snapshot)
+    ordinal = as_of.toordinal()
+    low, high = (None, ordinal) if status == "overdue" else (ordinal, ordinal + days + 1)
+    row_ids = schedule["entries"].values_between(low, high)
+    dropped = schedule["dropped"]
+    return [row_id for row_id in row_ids if row_id not in dropped] if dropped else row_ids
+
+def track_references(references: Dict[Any, Any], dataset: str, row_id: int, record: Dict[str, Any],
+                     bases: Optional[Dict[int, dict]] = None):
+    """Record the equipment id a record defines (equipment) or references (maintenance)."""
+    if dataset == "equipment":
+        references[record.get("equipment_id")] = None
+    else:
+        _append_owned(references, record.get("equipment_id"), (row_id, record.get("log_id")), bases)
+
+def validate_data_integrity(snapshot: Optional[DataSnapshot] = None):
+    """
+    Perform basic data validation.
+    
+    Orphaned maintenance records are tracked as data is loaded, so this only
+    formats the issue list, once per snapshot as it is published.
+    """
+    snapshot = snapshot or _snapshot
+    if snapshot.integrity_issues is not None:
+        return snapshot.integrity_issues
+    
     issues = []
     
-    if not equipment_data:
+    if not snapshot.equipment.records:
         issues.append("No equipment data loaded")
-    if not maintenance_logs:
+    if not snapshot.maintenance.records:
         issues.append("No maintenance data loaded")
     
-    # Check for orphaned maintenance records
-    equipment_ids = {eq.get("equipment_id") for eq in equipment_data}
-    for log in maintenance_logs:
-        if log.get("equipment_id") not in equipment_ids:
-            issues.append(f"Maintenance record {log.get('log_id')} references unknown equipment")
+    # Report orphaned maintenance records in load order
+    orphans = sorted(ref for refs in snapshot.orphaned_references.values() for ref in refs)
+    for _, log_id in orphans:
+        issues.append(f"Maintenance record {log_id} references unknown equipment")
     
+    snapshot.integrity_issues = issues
     return issues
 
-def build_equipment_relationships(equipment_id: str) -> Dict[str, Any]:
-    """Build relationships for specific equipment."""
+def _adjacent_rows(state: DatasetState, field: str, value: Any) -> List[int]:
+    """Return the row ids linked to an entity value through the graph indexes."""
+    return state.filter_index[field].get(_fold(value), [])
+
+def _equipment_rows(equipment_id: str, snapshot: DataSnapshot) -> List[int]:
+    """Return the equipment rows with exactly this id."""
+    records = snapshot.equipment.records
+    return [row_id for row_id in _adjacent_rows(snapshot.equipment, "equipment_id", equipment_id)
+            if records[row_id].get("equipment_id") == equipment_id]
+
+def build_equipment_relationships(equipment_id: str, snapshot: Optional[DataSnapshot] = None) -> Dict[str, Any]:
+    """
+    Build relationships for specific equipment.
+    
+    Walks the graph from the equipment node: its maintenance logs, the
+    technicians on them and the other equipment sharing its location or
+    manufacturer. The cost depends on the size of that neighborhood only.
+    """
+    snapshot = snapshot or _snapshot
+    equipment_records = snapshot.equipment.records
+    maintenance_logs = snapshot.maintenance.records
+    
     # Find equipment details
-    equipment = next((eq for eq in equipment_data if eq.get("equipment_id") == equipment_id), None)
-    if not equipment:
+    equipment_rows = _equipment_rows(equipment_id, snapshot)
+    if not equipment_rows:
         return None
+    equipment = equipment_records[equipment_rows[0]]
     
     # Find related maintenance
-    related_maintenance = [log for log in maintenance_logs if log.get("equipment_id") == equipment_id]
+    related_ids = [row_id for row_id, _ in snapshot.maintenance.references.get(equipment_id, ())]
+    related_maintenance = get_records("maintenance", related_ids, snapshot=snapshot)
     
     # Build relationship data
-    technicians = list(set(log.get("technician", "") for log in related_maintenance if log.get("technician")))
-    maintenance_types = list(set(log.get("maintenance_type", "") for log in related_maintenance if log.get("maintenance_type")))
-    total_cost = sum(log.get("cost", 0) for log in related_maintenance)
+    if hasattr(maintenance_logs, "frames"):
+        # Columnar engine: aggregate over the typed cost column
+        from src.columnar_store import cost_summary
+        total_cost = cost_summary(maintenance_logs, related_ids)["total_cost"]
+    else:
+        total_cost = sum(log.get("cost", 0) for log in related_maintenance)
+    technicians = list(dict.fromkeys(log.get("technician") for log in related_maintenance if log.get("technician")))
+    maintenance_types = list(dict.fromkeys(log.get("maintenance_type") for log in related_maintenance
+                                           if log.get("maintenance_type")))
+    
+    # Other equipment one hop away through a shared location or manufacturer
+    related_equipment = {}
+    for field in ("location", "manufacturer"):
+        neighbors = _adjacent_rows(snapshot.equipment, field, equipment.get(field)) if equipment.get(field) else []
+        related_equipment[field] = list(dict.fromkeys(
+            equipment_records[row_id].get("equipment_id") for row_id in neighbors
+            if equipment_records[row_id].get("equipment_id") != equipment_id
+        ))
     
     return {
         "equipment": equipment,
         "maintenance_history": related_maintenance,
+        "related_equipment": related_equipment,
         "summary": {
             "maintenance_count": len(related_maintenance),
             "total_cost": total_cost,
@@ -121,10 +1695,209 @@ def build_equipment_relationships(equipment_id: str) -> Dict[str, Any]:
         }
     }
 
-def get_equipment_data():
+def find_related(target: str, filters: Dict[str, Any], snapshot: Optional[DataSnapshot] = None) -> Dict[str, Any]:
+    """
+    Answer a multi-hop relationship query over the equipment-maintenance graph.
+    
+    Filters on equipment attributes select equipment nodes and a technician
+    filter selects the equipment that technician worked on; the selections
+    are intersected, then the target entities linked to the remaining
+    equipment (through their maintenance logs where needed) are counted.
+    For example, target "technicians" with equipment_type "transformer" and
+    location "Substation Alpha" lists who worked on those transformers.
+    Only the adjacency lists of the matched nodes are visited.
+    """
+    snapshot = snapshot or _snapshot
+    if target not in RELATIONSHIP_TARGETS:
+        raise ValueError(f"Target must be one of: {', '.join(RELATIONSHIP_TARGETS)}")
+    
+    active = {field: value for field, value in filters.items() if value is not None}
+    relation_fields = set(RELATION_FIELDS["equipment"]) | set(RELATION_FIELDS["maintenance"])
+    unknown = [field for field in active if field not in relation_fields]
+    if unknown:
+        raise ValueError(f"Field '{unknown[0]}' cannot be used in a relationship query")
+    if not active:
+        raise ValueError("At least one filter is required")
+    
+    equipment_records = snapshot.equipment.records
+    maintenance_logs = snapshot.maintenance.records
+    
+    # Equipment selected by its own attributes: intersect adjacency lists, smallest first
+    selections = []
+    buckets = sorted((_adjacent_rows(snapshot.equipment, field, value) for field, value in active.items()
+                      if field in ("equipment_type", "location", "manufacturer")), key=len)
+    if buckets:
+        rows = set(buckets[0])
+        for bucket in buckets[1:]:
+            rows.intersection_update(bucket)
+        selections.append({equipment_records[row_id].get("equipment_id") for row_id in rows})
+    if "equipment_id" in active:
+        # Case-folded like every other filter
+        selections.append({equipment_records[row_id].get("equipment_id")
+                           for row_id in _adjacent_rows(snapshot.equipment, "equipment_id", active["equipment_id"])})
+    
+    # Equipment reached through a technician's maintenance logs
+    technician_logs = None
+    if "technician" in active:
+        technician_logs = set(_adjacent_rows(snapshot.maintenance, "technician", active["technician"]))
+        selections.append({maintenance_logs[row_id].get("equipment_id") for row_id in technician_logs
+                           if maintenance_logs[row_id].get("equipment_id") is not None})
+    
+    selections.sort(key=len)
+    # Only equipment that exists is a node; logs may reference unknown equipment ids
+    equipment_ids = set(selections[0]).intersection(*selections[1:], snapshot.equipment.references)
+    
+    def related_logs(equipment_id):
+        for row_id, _ in snapshot.maintenance.references.get(equipment_id, ()):
+            if technician_logs is None or row_id in technician_logs:
+                yield row_id
+    
+    groups = {}
+    
+    def add(value, equipment_id, count=1):
+        group = groups.setdefault(value, {"count": 0, "equipment": set()})
+        group["count"] += count
+        group["equipment"].add(equipment_id)
+    
+    if target == "equipment":
+        # The selected equipment nodes with the number of matching logs on each
+        for equipment_id in equipment_ids:
+            add(equipment_id, equipment_id, sum(1 for _ in related_logs(equipment_id)))
+    elif ENTITY_FIELDS[target][0] == "equipment":
+        # Attributes of the selected equipment nodes
+        field = ENTITY_FIELDS[target][1]
+        for equipment_id in equipment_ids:
+            for row_id in _equipment_rows(equipment_id, snapshot):
+                if equipment_records[row_id].get(field):
+                    add(equipment_records[row_id][field], equipment_id)
+    else:
+        # One more hop: the maintenance logs of the selected equipment
+        field = ENTITY_FIELDS[target][1]
+        for equipment_id in equipment_ids:
+            for row_id in related_logs(equipment_id):
+                if maintenance_logs[row_id].get(field):
+                    add(maintenance_logs[row_id][field], equipment_id)
+    
+    results = [{"name": name, "count": group["count"], "equipment": sorted(group["equipment"], key=str)}
+               for name, group in groups.items()]
+    results.sort(key=lambda result: (-result["count"], str(result["name"])))
+    
+    return {
+        "target": target,
+        "filters": active,
+        "count": len(results),
+        "results": results
+    }
+
+def _empty_aggregates(dataset: str) -> Dict[str, Dict[Any, list]]:
+    return {grouping: {} for grouping in _LOG_AGGREGATES} if dataset == "maintenance" else {}
+
+def _merge_cost(stat: Optional[list], count: int, costed: int, total: float,
+                minimum: Optional[float], maximum: Optional[float]) -> list:
+    """Fold counts and cost extremes into a [count, costed, sum, min, max] aggregate."""
+    if stat is None:
+        return [count, costed, total, minimum, maximum]
+    stat[0] += count
+    stat[1] += costed
+    stat[2] += total
+    if minimum is not None:
+        stat[3] = minimum if stat[3] is None else min(stat[3], minimum)
+        stat[4] = maximum if stat[4] is None else max(stat[4], maximum)
+    return stat
+
+def aggregate_cost(aggregates: Dict[str, Dict[Any, list]], record: Dict[str, Any],
+                   bases: Optional[Dict[int, Dict[Any, list]]] = None):
+    """Add one maintenance log to the materialized cost aggregates."""
+    cost = record.get("cost")
+    cost = float(cost) if cost is not None and cost != "" else None
+    if cost is not None and not math.isfinite(cost):
+        cost = None
+    
+    date = str(record.get("date") or "").strip()
+    keys = {
+        "total": "all",
+        "equipment_id": record.get("equipment_id"),
+        "technician": record.get("technician"),
+        "month": date[:7] if _MONTH_PATTERN.match(date) else None
+    }
+    
+    for grouping, key in keys.items():
+        if key is None:
+            continue
+        groups = aggregates[grouping]
+        stat = groups.get(key)
+        if stat is None and bases is not None:
+            # Stats shared with an older snapshot are copied before their first update
+            stat = bases[id(groups)].get(key)
+            stat = list(stat) if stat is not None else None
+        groups[key] = _merge_cost(stat, 1, 0 if cost is None else 1, cost or 0.0, cost, cost)
+
+def cost_rollup(dimension: str, snapshot: Optional[DataSnapshot] = None) -> Dict[Any, list]:
+    """
+    Return maintenance cost aggregates grouped by a dimension.
+    
+    Technician and month groups are materialized as logs are loaded. Groups
+    by an equipment attribute are rolled up from the per-equipment aggregates
+    once per snapshot, which costs the number of distinct equipment ids
+    rather than the number of logs. Logs of unknown equipment are left out
+    of equipment attribute groups.
+    """
+    snapshot = snapshot or _snapshot
+    if dimension not in COST_DIMENSIONS:
+        raise ValueError(f"Dimension must be one of: {', '.join(COST_DIMENSIONS)}")
+    
+    aggregates = snapshot.maintenance.aggregates
+    if dimension in aggregates:
+        return aggregates[dimension]
+    
+    rollup = snapshot.cost_rollups.get(dimension)
+    if rollup is None:
+        rollup = {}
+        records = snapshot.equipment.records
+        for equipment_id, stat in aggregates["equipment_id"].items():
+            rows = _equipment_rows(equipment_id, snapshot)
+            key = records[rows[0]].get(dimension) if rows else None
+            if key is None:
+                continue
+            if key in rollup:
+                _merge_cost(rollup[key], *stat)
+            else:
+                rollup[key] = list(stat)
+        snapshot.cost_rollups[dimension] = rollup
+    return rollup
+
+def format_cost_stats(stat: list) -> Dict[str, Any]:
+    """Present a [count, costed, sum, min, max] aggregate with its mean."""
+    count, costed, total, minimum, maximum = stat
+    return {
+        "count": count,
+        "sum": round(total, 2),
+        "mean": round(total / costed, 2) if costed else None,
+        "min": minimum,
+        "max": maximum
+    }
+
+def get_equipment_data(snapshot: Optional[DataSnapshot] = None):
     """Get the current equipment data."""
-    return equipment_data
+    return (snapshot or _snapshot).equipment.records
 
-def get_maintenance_logs():
+def get_maintenance_logs(snapshot: Optional[DataSnapshot] = None):
     """Get the current maintenance logs."""
-    return maintenance_logs
\ No newline at end of file
+    return (snapshot or _snapshot).maintenance.records
+
+# Currently published snapshot; replaced wholesale, never modified in place
+_snapshot = DataSnapshot(_empty_dataset("equipment"), _empty_dataset("maintenance"), 0)
+_publish_lock = threading.Lock()
+_write_lock = threading.Lock()
+
+# Aliases of the published records, kept for callers that import them directly
+equipment_data = _snapshot.equipment.records
+maintenance_logs = _snapshot.maintenance.records
+
+# Data layer gauges, read from the published snapshot when metrics are scraped
+register_callback(Gauge, "data_records", "Records in the published snapshot", ("dataset",),
+                  lambda: {(name,): len(_snapshot.dataset(name).records) for name in FILTER_FIELDS})
+register_callback(Gauge, "data_rejected_records", "Invalid records skipped by the last load", ("dataset",),
+                  lambda: {(name,): _snapshot.dataset(name).stats["rejected"] for name in FILTER_FIELDS})
+register_callback(Gauge, "data_version", "Version of the published snapshot", (),
+                  lambda: {(): _snapshot.version})
@@ -0,0 +1,219 @@
+"""
+Streaming record readers for the Utility Infrastructure API.
+
+Parses JSON arrays, NDJSON and CSV incrementally so large exports can be
+loaded with memory bounded by the batch size rather than the file size.
+"""
+
+import csv
+import glob
+import json
+import re
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+CHUNK_SIZE = 1 << 16
+BATCH_SIZE = 10_000
+PROGRESS_INTERVAL = 100_000
+
+# Characters that may continue a JSON number up to the end of the buffer
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*\Z")
+
+# Field that uniquely identifies a record in each dataset
+ID_FIELDS = {
+    "equipment": "equipment_id",
+    "maintenance": "log_id"
+}
+
+# Suffixes of shard files and the format each one is parsed as
+SHARD_FORMATS = {
+    ".csv": "csv",
+    ".json": "json",
+    ".ndjson": "json",
+    ".jsonl": "json"
+}
+
+def iter_json_records(f: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """
+    Yield the records of a JSON array or NDJSON stream one at a time.
+
+    The format is detected from the first non-whitespace character: '['
+    starts a JSON array, anything else is treated as newline-delimited JSON.
+    """
+    first = f.read(chunk_size)
+    # Leading whitespace may fill whole chunks; the format is decided by the first other character
+    while first.isspace():
+        first = f.read(chunk_size)
+    stripped = first.lstrip()
+
+    if not stripped.startswith("["):
+        yield from _iter_ndjson(first, f)
+        return
+
+    decoder = json.JSONDecoder()
+    buffer = stripped[1:]
+    pos = 0
+    eof = False
+    expect_value = True
+    seen_value = False
+
+    while True:
+        # Skip whitespace between tokens
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+
+        if pos >= len(buffer):
+            buffer = f.read(chunk_size)
+            pos = 0
+            if not buffer:
+                raise ValueError("Unexpected end of JSON array")
+            continue
+
+        if buffer[pos] == "]" and not (expect_value and seen_value):
+            return
+
+        if not expect_value:
+            if buffer[pos] != ",":
+                raise ValueError(f"Expected ',' or ']' in JSON array near offset {pos}")
+            expect_value = True
+            pos += 1
+            continue
+
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            record, end = None, None
+
+        # Incomplete value at the end of the buffer: read more and retry. A number cut
+        # at a chunk boundary decodes as its prefix ("2." as 2), so also retry when the
+        # rest of the buffer could still continue the number.
+        truncated_number = (isinstance(record, (int, float)) and not isinstance(record, bool)
+                            and _NUMBER_TAIL.match(buffer, end))
+        if end is None or ((end == len(buffer) or truncated_number) and not eof):
+            chunk = f.read(chunk_size)
+            if not chunk:
+                if end is None:
+                    raise ValueError(f"Malformed JSON near offset {pos}")
+                eof = True
+                continue
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+
+        yield record
+        pos = end
+        expect_value = False
+        seen_value = True
+
+        # Drop consumed text so the buffer stays bounded
+        if pos > chunk_size:
+            buffer = buffer[pos:]
+            pos = 0
+
+def _iter_ndjson(head: str, f: TextIO) -> Iterator[Any]:
+    """Yield one record per non-empty line of an NDJSON stream."""
+    pending = head
+    while True:
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        pending += chunk
+
+    if pending.strip():
+        yield json.loads(pending)
+
+def iter_csv_records(f: TextIO) -> Iterator[Dict[str, str]]:
+    """Yield CSV rows as dicts without reading the whole file."""
+    yield from csv.DictReader(f)
+
+def is_sharded(source: Path) -> bool:
+    """Check whether a data source names a directory or glob of shards rather than one file."""
+    return Path(source).is_dir() or any(char in str(source) for char in "*?[")
+
+def resolve_shards(source: Path) -> List[Path]:
+    """Return the CSV, JSON and NDJSON files of a directory or glob source in name order."""
+    source = Path(source)
+    candidates = source.iterdir() if source.is_dir() else map(Path, glob.glob(str(source)))
+    shards = sorted(path for path in candidates if path.is_file() and path.suffix.lower() in SHARD_FORMATS)
+    if not shards:
+        raise FileNotFoundError(f"No CSV, JSON or NDJSON shards found at {source}")
+    return shards
+
+def iter_shard_records(path: Path) -> Iterator[Any]:
+    """Yield the records of a shard file, parsed according to its suffix."""
+    with Path(path).open("r", encoding="utf-8", newline="") as f:
+        if SHARD_FORMATS[Path(path).suffix.lower()] == "csv":
+            yield from iter_csv_records(f)
+        else:
+            yield from iter_json_records(f)
+
+def iter_batches(records: Iterable[Any], batch_size: int = BATCH_SIZE) -> Iterator[List[Any]]:
+    """Group a record stream into lists of at most batch_size records."""
+    iterator = iter(records)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def validate_record(dataset: str, record: Any) -> Optional[str]:
+    """Return a description of what is wrong with a record, or None if it is valid."""
+    if not isinstance(record, dict):
+        return "record is not an object"
+
+    id_field = ID_FIELDS[dataset]
+    if not str(record.get(id_field) or "").strip():
+        return f"missing {id_field}"
+
+    if "cost" in record and record["cost"] is not None:
+        try:
+            float(record["cost"])
+        except (TypeError, ValueError):
+            return "cost is not numeric"
+
+    return None
+
+class LoadProgress:
+    """Track and report record counts and throughput while a dataset loads."""
+
+    def __init__(self, dataset: str, interval: int = PROGRESS_INTERVAL):
+        self.dataset = dataset
+        self.interval = interval
+        self.loaded = 0
+        self.rejected = 0
+        self.started = time.perf_counter()
+        self._next_report = interval
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def records_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.loaded / elapsed if elapsed > 0 else 0.0
+
+    def update(self, loaded: int, rejected: int = 0):
+        """Record a processed batch, printing progress at each interval."""
+        self.loaded += loaded
+        self.rejected += rejected
+        if self.loaded >= self._next_report:
+            print(f"  ... {self.loaded} {self.dataset} records ({self.records_per_second:,.0f} records/s)")
+            self._next_report = (self.loaded // self.interval + 1) * self.interval
+
+    def summary(self) -> Dict[str, Any]:
+        """Return the final load statistics."""
+        return {
+            "records": self.loaded,
+            "rejected": self.rejected,
+            "seconds": round(self.elapsed, 3),
+            "records_per_second": round(self.records_per_second, 1)
+        }
@@ -0,0 +1,328 @@
+"""
+Metrics and request profiling for the Utility Infrastructure API.
+
+A small, dependency-free registry of counters, gauges and histograms that
+renders the Prometheus text exposition format, the ASGI middleware that
+times every request, and an opt-in profiler that keeps cProfile reports of
+sampled requests that turned out to be slow.
+"""
+
+import cProfile
+import io
+import math
+import os
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.routing import Match
+
+# Latency buckets in seconds and response size buckets in bytes
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+LOAD_BUCKETS = (0.01, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Requests slower than this many seconds keep their profile; 0 disables profiling
+PROFILE_SLOW_SECONDS = float(os.environ.get("PROFILE_SLOW_SECONDS", "0"))
+# Fraction of requests that run under the profiler while profiling is enabled
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0.01"))
+MAX_PROFILES = 20
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    """Base class of a named metric family with a fixed set of label names."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Reads the current values at render time instead of tracking them here
+        self.callback = callback
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[str]:
+        values = self.callback() if self.callback else self._values
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}"
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+class Gauge(Metric):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+class Histogram(Metric):
+    """Distribution of observations over cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            # Counts are stored per bucket and accumulated when rendered
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += 1
+            state[2] += value
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[1] if state else 0
+
+    def samples(self):
+        for key, (counts, total, value_sum) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {total}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(value_sum)}"
+
+class Registry:
+    """Collection of metric families rendered together."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+registry = Registry()
+
+# HTTP layer
+REQUESTS = registry.register(Counter(
+    "http_requests_total", "Requests handled, by route and status code", ("method", "route", "status")))
+REQUEST_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "Request latency in seconds", ("method", "route")))
+RESPONSE_SIZE = registry.register(Histogram(
+    "http_response_size_bytes", "Response body size in bytes", ("method", "route"), SIZE_BUCKETS))
+IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "Requests currently being handled"))
+IN_FLIGHT.set(0)
+ERRORS = registry.register(Counter(
+    "http_request_errors_total", "Requests that failed with a server error", ("method", "route")))
+
+# Data layer
+LOAD_DURATION = registry.register(Histogram(
+    "data_load_duration_seconds", "Time to build a dataset state", ("dataset", "source"), LOAD_BUCKETS))
+INDEX_LOOKUPS = registry.register(Counter(
+    "data_index_lookups_total", "Secondary and search index lookups, by whether they matched",
+    ("index", "result")))
+
+class RequestProfiler:
+    """
+    Profile a random sample of requests and keep the reports of slow ones.
+
+    Only one request is profiled at a time, since cProfile hooks the whole
+    interpreter thread. The middleware pauses the profile whenever the
+    request awaits, so the report covers only the request's own steps on
+    the event loop and not the coroutines of other requests that run in the
+    meantime. Work a handler moves to a thread pool is not seen.
+    """
+
+    def __init__(self, slow_seconds: float = PROFILE_SLOW_SECONDS, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 max_profiles: int = MAX_PROFILES):
+        self.slow_seconds = slow_seconds
+        self.sample_rate = sample_rate
+        self.profiles = deque(maxlen=max_profiles)
+        self._active = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.slow_seconds > 0 and self.sample_rate > 0
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """Start profiling this request if it is sampled and no other request is being profiled."""
+        if not self.enabled or random.random() >= self.sample_rate or not self._active.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile: cProfile.Profile, method: str, path: str, seconds: float):
+        """Stop profiling and keep the report if the request was slow."""
+        profile.disable()
+        self._active.release()
+        if seconds < self.slow_seconds:
+            return
+
+        report = io.StringIO()
+        pstats.Stats(profile, stream=report).sort_stats("cumulative").print_stats(30)
+        self.profiles.append({
+            "method": method,
+            "path": path,
+            "seconds": round(seconds, 4),
+            "recorded_at": time.time(),
+            "report": report.getvalue()
+        })
+        print(f" Slow request profiled: {method} {path} took {seconds:.3f}s")
+
+profiler = RequestProfiler()
+
+class _ProfiledSteps:
+    """Await a coroutine with the profile enabled only while the coroutine itself runs."""
+
+    def __init__(self, coroutine, profile: cProfile.Profile):
+        self.coroutine = coroutine
+        self.profile = profile
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            self.profile.enable()
+            try:
+                if error is None:
+                    awaited = self.coroutine.send(value)
+                else:
+                    awaited = self.coroutine.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.profile.disable()
+            # Suspended: other tasks run unprofiled until the event loop resumes us
+            try:
+                value, error = (yield awaited), None
+            except BaseException as e:
+                value, error = None, e
+
+class MetricsMiddleware:
+    """ASGI middleware that records latency, size, status and in-flight counts per route."""
+
+    def __init__(self, app, request_profiler: Optional[RequestProfiler] = None):
+        self.app = app
+        self.profiler = request_profiler or profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        IN_FLIGHT.inc()
+        profile = self.profiler.start()
+        started = time.perf_counter()
+        try:
+            if profile is None:
+                await self.app(scope, receive, send_wrapper)
+            else:
+                await _ProfiledSteps(self.app(scope, receive, send_wrapper), profile)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec()
+            if profile is not None:
+                self.profiler.finish(profile, method, scope["path"], elapsed)
+
+            route = _route_label(scope, status)
+            REQUESTS.inc(method=method, route=route, status=str(status))
+            REQUEST_LATENCY.observe(elapsed, method=method, route=route)
+            RESPONSE_SIZE.observe(size, method=method, route=route)
+            if status >= 500:
+                ERRORS.inc(method=method, route=route)
+
+def _route_label(scope, status: int) -> str:
+    """Label requests by route template to keep label cardinality bounded."""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Served by a middleware (e.g. a cache hit) before routing; match the template ourselves
+    app = scope.get("app")
+    for candidate in getattr(getattr(app, "router", None), "routes", ()):
+        if candidate.matches(scope)[0] == Match.FULL:
+            return candidate.path
+    return "unmatched"
+
+def register_callback(kind: type, name: str, documentation: str, labelnames: Sequence[str],
+                      callback: Callable[[], Dict[Tuple[str, ...], float]]) -> Metric:
+    """Register a counter or gauge whose values are read from a callback when metrics are rendered."""
+    return registry.register(kind(name, documentation, labelnames, callback))
+
+def render_metrics() -> str:
+    """Render every registered metric in the Prometheus text format."""
+    return registry.render()
+
+def recent_profiles() -> List[Dict]:
+    """Return the kept slow-request profiles, newest first."""
+    return list(reversed(profiler.profiles))
@@ -0,0 +1,123 @@
+"""
+Bounded execution of CPU-heavy queries for the Utility Infrastructure API.
+
+Handlers are coroutines on the uvicorn event loop, so a scan or sort run
+inline stalls every other request, health probes included. Heavy queries
+are handed to a fixed pool of worker threads instead:
+
+- admission control: at most QUERY_WORKERS queries run and QUERY_QUEUE_LIMIT
+  wait; a request beyond that is turned away at once instead of queuing
+  without bound,
+- timeouts: a caller that waited QUERY_TIMEOUT seconds gets an error. Python
+  threads cannot be interrupted, so a query that already started finishes
+  in the background and keeps its slot until then; admission therefore also
+  bounds abandoned work. Queries still waiting when they time out never run.
+
+Threads rather than processes: queries read the in-memory snapshot, which a
+process pool would have to pickle for every call. Pure Python work still
+holds the GIL, but it is handed over every few milliseconds, so the event
+loop keeps accepting connections and answering cheap requests meanwhile.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from src.metrics import Counter, Gauge, Histogram, register_callback, registry
+
+# Queries run at the same time
+QUERY_WORKERS = int(os.environ.get("QUERY_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Queries waiting for a worker before new ones are rejected
+QUERY_QUEUE_LIMIT = int(os.environ.get("QUERY_QUEUE_LIMIT", "32"))
+# Seconds a request waits for its query, queueing included; 0 waits indefinitely
+QUERY_TIMEOUT = float(os.environ.get("QUERY_TIMEOUT", "10"))
+
+QUERIES = registry.register(Counter(
+    "query_pool_queries_total", "Queries submitted to the pool, by outcome", ("result",)))
+QUEUE_WAIT = registry.register(Histogram(
+    "query_pool_wait_seconds", "Time queries spent waiting for a worker"))
+
+class QueryRejected(Exception):
+    """The pool is running and queuing as many queries as it admits."""
+
+class QueryTimeout(Exception):
+    """A query did not finish within its timeout."""
+
+class QueryPool:
+    """Thread pool for heavy queries with a bounded queue and per-request timeouts."""
+
+    def __init__(self, workers: int = QUERY_WORKERS, queue_limit: int = QUERY_QUEUE_LIMIT,
+                 timeout: float = QUERY_TIMEOUT):
+        self.workers = max(1, workers)
+        self.queue_limit = max(0, queue_limit)
+        self.timeout = timeout
+        # Submitted queries that have not finished, whether running or waiting
+        self.admitted = 0
+        self.running = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def queued(self) -> int:
+        return self.admitted - self.running
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="query")
+            return self._executor
+
+    def _call(self, submitted: float, func: Callable, args: tuple) -> Any:
+        with self._lock:
+            self.running += 1
+        QUEUE_WAIT.observe(time.perf_counter() - submitted)
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def _release(self, future):
+        with self._lock:
+            self.admitted -= 1
+
+    async def run(self, func: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """Run func(*args) on a worker thread and return its result."""
+        with self._lock:
+            if self.admitted >= self.workers + self.queue_limit:
+                QUERIES.inc(result="rejected")
+                raise QueryRejected(f"{self.admitted} queries already running or waiting")
+            self.admitted += 1
+
+        future = self._pool().submit(self._call, time.perf_counter(), func, args)
+        future.add_done_callback(self._release)
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            # On timeout the future is cancelled, which only stops queries that have not started
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout or None)
+        except asyncio.TimeoutError:
+            QUERIES.inc(result="timeout")
+            raise QueryTimeout(f"Query did not finish within {timeout:g}s")
+        except Exception:
+            QUERIES.inc(result="error")
+            raise
+        QUERIES.inc(result="completed")
+        return result
+
+    def shutdown(self):
+        """Stop the worker threads once the queries in flight are done."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+# Pool shared by all request handlers
+query_pool = QueryPool()
+
+register_callback(Gauge, "query_pool_running", "Queries running on a worker", (),
+                  lambda: {(): query_pool.running})
+register_callback(Gauge, "query_pool_queued", "Queries waiting for a worker", (),
+                  lambda: {(): query_pool.queued})
@@ -0,0 +1,86 @@
+"""
+Hot reload of data files for the Utility Infrastructure API.
+
+Polls the data files (or shard directories) in a background thread and, when they change, builds a
+new data snapshot and swaps it in without interrupting requests.
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Tuple
+
+from src.data_processor import EQUIPMENT_FILE, MAINTENANCE_FILE, reload_data
+from src.ingestion import is_sharded, resolve_shards
+
+# Seconds between checks of the data files; 0 disables the watcher
+RELOAD_INTERVAL = float(os.environ.get("DATA_RELOAD_INTERVAL", "0"))
+
+def file_signature(paths: Iterable[Path]) -> Tuple:
+    """
+    Return a (mtime, size) fingerprint of the given files; missing files count as None.
+
+    A directory or glob source contributes the name, mtime and size of each
+    of its shards, so adding, removing or editing a shard changes it.
+    """
+    signature = []
+    for path in paths:
+        try:
+            if is_sharded(path):
+                signature.append(tuple((str(shard), *_stat(shard)) for shard in resolve_shards(path)))
+            else:
+                signature.append(_stat(path))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+def _stat(path: Path) -> Tuple[int, int]:
+    stat = Path(path).stat()
+    return stat.st_mtime_ns, stat.st_size
+
+class DataFileWatcher:
+    """Reload the data snapshot whenever the watched files change."""
+
+    def __init__(self, paths: Iterable[Path] = (EQUIPMENT_FILE, MAINTENANCE_FILE),
+                 interval: float = RELOAD_INTERVAL, on_change: Optional[Callable[[], object]] = None):
+        self.paths = [Path(path) for path in paths]
+        self.interval = interval
+        self.on_change = on_change or reload_data
+        self._signature = file_signature(self.paths)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self) -> bool:
+        """Reload if the files changed since the last check; returns whether a reload ran."""
+        signature = file_signature(self.paths)
+        if signature == self._signature:
+            return False
+
+        # A file that is still being written will change again; wait for it to settle
+        self._stop.wait(min(self.interval, 1.0))
+        if file_signature(self.paths) != signature:
+            return False
+
+        self._signature = signature
+        self.on_change()
+        return True
+
+    def start(self):
+        """Start polling in a daemon thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="data-file-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop polling and wait for the thread to exit."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f" Data file watcher error: {e}")
@@ -0,0 +1,191 @@
+"""
+Dataset-versioned response cache for the Utility Infrastructure API.
+
+Caches the serialized bodies of successful GET responses keyed by path,
+normalized query parameters and the versions of the datasets the endpoint
+reads. Publishing a new snapshot changes the key, so stale entries are never
+served; they simply age out of the LRU. Every cached response carries a
+strong ETag, and matching If-None-Match requests are answered with 304.
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from src.data_processor import RELATIONSHIP_TARGETS, get_snapshot
+from src.metrics import Counter, Gauge, register_callback
+
+CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_ENTRIES", "1024"))
+CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+# Bodies larger than this are hashed for their ETag on a thread rather than the event loop
+INLINE_ETAG_BYTES = 64 * 1024
+
+# Cached paths and the datasets whose versions their responses depend on
+CACHED_ROUTES = {
+    "/api/equipment": ("equipment",),
+    "/api/maintenance": ("maintenance",),
+    "/api/entities": ("equipment", "maintenance"),
+    "/api/search": ("equipment", "maintenance"),
+    "/api/analytics/costs": ("equipment", "maintenance"),
+    **{f"/api/relationships/{target}": ("equipment", "maintenance") for target in RELATIONSHIP_TARGETS}
+}
+
+class CachedResponse:
+    """Serialized response body and headers stored in the cache."""
+
+    __slots__ = ("etag", "body", "headers")
+
+    def __init__(self, etag: bytes, body: bytes, headers: List[Tuple[bytes, bytes]]):
+        self.etag = etag
+        self.body = body
+        self.headers = headers
+
+class ResponseCache:
+    """Thread-safe LRU cache bounded by entry count and total body size."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key) -> Optional[CachedResponse]:
+        """Return a cached response and mark it as recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry: CachedResponse):
+        """Store a response, evicting least recently used entries to stay within bounds."""
+        # A single response may use at most a quarter of the budget
+        if len(entry.body) > self.max_bytes // 4:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous.body)
+            self._entries[key] = entry
+            self.size += len(entry.body)
+
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.body)
+
+    def clear(self):
+        """Drop all cached responses."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+def make_etag(body: bytes) -> bytes:
+    """Compute a strong entity tag from the response body."""
+    return b'"' + hashlib.sha1(body).hexdigest().encode("ascii") + b'"'
+
+def etag_matches(if_none_match: bytes, etag: bytes) -> bool:
+    """Check an If-None-Match header against an entity tag (weak comparison, RFC 9110)."""
+    for candidate in if_none_match.split(b","):
+        candidate = candidate.strip()
+        if candidate == b"*":
+            return True
+        if candidate.startswith(b"W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def cache_key(path: str, query_string: bytes, datasets: Iterable[str]):
+    """Build a cache key from the path, sorted query parameters and dataset versions."""
+    params = tuple(sorted(parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)))
+    snapshot = get_snapshot()
+    versions = tuple(snapshot.dataset(name).version for name in datasets)
+    return path, params, versions
+
+class ResponseCacheMiddleware:
+    """ASGI middleware that serves cached GET responses and handles conditional requests."""
+
+    def __init__(self, app, cache: Optional[ResponseCache] = None, routes: Dict[str, Tuple[str, ...]] = None):
+        self.app = app
+        self.cache = cache or response_cache
+        self.routes = CACHED_ROUTES if routes is None else routes
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] != "GET"
+                or scope["path"] not in self.routes or not self.cache.enabled):
+            await self.app(scope, receive, send)
+            return
+
+        key = cache_key(scope["path"], scope.get("query_string", b""), self.routes[scope["path"]])
+        if_none_match = dict(scope["headers"]).get(b"if-none-match")
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            await self._send_entry(send, entry, if_none_match, b"HIT")
+            return
+
+        # Run the handler and buffer its response so it can be tagged and stored
+        start = {}
+        chunks = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        body = b"".join(chunks)
+
+        if start.get("status") != 200:
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        headers = [(name, value) for name, value in start.get("headers", [])
+                   if name.lower() not in (b"etag", b"cache-control")]
+        etag = make_etag(body) if len(body) <= INLINE_ETAG_BYTES else await asyncio.to_thread(make_etag, body)
+        entry = CachedResponse(etag, body, headers)
+        self.cache.put(key, entry)
+        await self._send_entry(send, entry, if_none_match, b"MISS")
+
+    async def _send_entry(self, send, entry: CachedResponse, if_none_match: Optional[bytes], cache_status: bytes):
+        """Send a cached response, or 304 when the client already has it."""
+        validators = [(b"etag", entry.etag), (b"cache-control", b"no-cache"), (b"x-cache", cache_status)]
+
+        if if_none_match is not None and etag_matches(if_none_match, entry.etag):
+            await send({"type": "http.response.start", "status": 304, "headers": validators})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        await send({"type": "http.response.start", "status": 200, "headers": entry.headers + validators})
+        await send({"type": "http.response.body", "body": entry.body})
+
+# Process-wide cache used by the application
+response_cache = ResponseCache()
+
+register_callback(Counter, "response_cache_lookups_total", "Response cache lookups, by result", ("result",),
+                  lambda: {("hit",): response_cache.hits, ("miss",): response_cache.misses})
+register_callback(Gauge, "response_cache_entries", "Responses held in the cache", (),
+                  lambda: {(): len(response_cache)})
+register_callback(Gauge, "response_cache_bytes", "Total size of cached response bodies", (),
+                  lambda: {(): response_cache.size})
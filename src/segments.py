@@ -0,0 +1,343 @@
+"""
+Append-friendly containers shared between dataset snapshots.
+
+Appending records publishes a new snapshot while the previous one stays in
+use by the requests reading it, so an append may neither change what the
+previous snapshot holds nor afford to copy it. Each container here lets a
+new version share the storage of the version it extends and pay only for
+the items added:
+
+- SegmentedList stores a list in fixed-size segments; a new version shares
+  every segment and fills the last one past the end of the older version.
+- LayeredDict stores a mapping as layers of changed keys over a base dict.
+- SortedRuns stores a sorted sequence as a few sorted runs.
+- append_array extends a numeric array inside a buffer with spare room and
+  returns a view of it, so reads stay as fast as on a plain array.
+
+Layers and runs are merged while the newest one is at least half the size
+of the one before it, so each item is copied O(log n) times in total and a
+lookup visits O(log n) layers or runs however small the appended batches.
+LayeredDict and SortedRuns pickle merged into a single layer or run;
+memoryviews cannot be pickled, so holders of views save them with
+plain_array().
+"""
+
+import heapq
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+from itertools import chain, islice
+from typing import Any, Iterable, Iterator, Optional, Union
+
+# Items per segment of a SegmentedList; lists shorter than this are copied instead
+SEGMENT_SIZE = 1024
+
+_SHIFT = SEGMENT_SIZE.bit_length() - 1
+_MASK = SEGMENT_SIZE - 1
+
+_MISSING = object()
+
+class SegmentedList(Sequence):
+    """
+    Append-only list stored in segments of SEGMENT_SIZE items.
+
+    fork() returns a version sharing every segment, after which either
+    version can be appended to without changing what the other shows. An
+    append fills the last segment in place unless another version has
+    already appended to it, in which case that segment is copied first.
+    """
+
+    __slots__ = ("segments", "length")
+
+    def __init__(self, items: Iterable[Any] = ()):
+        self.segments = []
+        self.length = 0
+        self.extend(items)
+
+    def fork(self) -> "SegmentedList":
+        """Return a version with the same items that is appended to independently."""
+        forked = SegmentedList()
+        forked.segments = list(self.segments)
+        forked.length = self.length
+        return forked
+
+    def _last_segment(self, fill: int) -> list:
+        segment = self.segments[-1]
+        if len(segment) != fill:
+            # Another version has appended past our end; keep our items only
+            segment = self.segments[-1] = segment[:fill]
+        return segment
+
+    def append(self, item: Any):
+        fill = self.length & _MASK
+        if fill:
+            self._last_segment(fill).append(item)
+        else:
+            self.segments.append([item])
+        self.length += 1
+
+    def extend(self, items: Iterable[Any]):
+        items = items if isinstance(items, list) else list(items)
+        start = 0
+        while start < len(items):
+            fill = self.length & _MASK
+            chunk = items[start:start + SEGMENT_SIZE - fill]
+            if fill:
+                self._last_segment(fill).extend(chunk)
+            else:
+                self.segments.append(chunk)
+            start += len(chunk)
+            self.length += len(chunk)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[Any]:
+        return islice(chain.from_iterable(self.segments), self.length)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.length)
+            if step != 1:
+                return [self[position] for position in range(start, stop, step)]
+            items = []
+            while start < stop:
+                offset = start & _MASK
+                chunk = self.segments[start >> _SHIFT][offset:min(SEGMENT_SIZE, offset + stop - start)]
+                items.extend(chunk)
+                start += len(chunk)
+            return items
+
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("list index out of range")
+        return self.segments[index >> _SHIFT][index & _MASK]
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, SegmentedList)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"SegmentedList({list(self)!r})"
+
+    def __reduce__(self):
+        return SegmentedList, (list(self),)
+
+def segmented(items: list) -> Union[list, SegmentedList]:
+    """Return a list that appends can fork: long lists as SegmentedLists, short ones as they are."""
+    return SegmentedList(items) if len(items) >= SEGMENT_SIZE else items
+
+def appendable(items: Sequence) -> Union[list, SegmentedList]:
+    """
+    Return a copy of a list to append to, leaving the list as it is.
+
+    Short lists are copied. Longer ones become (or already are) segmented
+    lists and are forked, which copies at most their last segment.
+    """
+    if isinstance(items, SegmentedList):
+        return items.fork()
+    if len(items) < SEGMENT_SIZE:
+        return list(items)
+    return SegmentedList(items)
+
+def _merge_layers(older: dict, newer: dict) -> dict:
+    merged = dict(older)
+    merged.update(newer)
+    return merged
+
+class LayeredDict(Mapping):
+    """
+    Read-only mapping made of layers of changed keys over a base dict.
+
+    Layers are ordered newest first and a key takes its value from the
+    newest layer holding it. Build new versions with layered().
+    """
+
+    __slots__ = ("layers", "length")
+
+    def __init__(self, layers: tuple, length: int):
+        self.layers = layers
+        self.length = length
+
+    def __getitem__(self, key):
+        for layer in self.layers:
+            value = layer.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        for layer in self.layers:
+            value = layer.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+        return default
+
+    def __contains__(self, key) -> bool:
+        for layer in self.layers:
+            if key in layer:
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[Any]:
+        # Oldest layer first, each key where it was first added, like a dict's insertion order
+        older = []
+        for layer in reversed(self.layers):
+            for key in layer:
+                if not any(key in previous for previous in older):
+                    yield key
+            older.append(layer)
+
+    def __repr__(self) -> str:
+        return f"LayeredDict({dict(self.items())!r})"
+
+    def __reduce__(self):
+        return dict, (dict(self.items()),)
+
+def layered(base: Mapping, changes: dict) -> Mapping:
+    """
+    Return base updated with changes, leaving base as it is.
+
+    changes becomes the newest layer on top of the layers of base (or of
+    base itself, a plain dict that must not be modified afterwards) and is
+    merged into the layers below while it is at least half their size.
+    """
+    if not changes:
+        return base
+
+    length = len(base) + sum(1 for key in changes if key not in base)
+    layers = list(base.layers) if isinstance(base, LayeredDict) else [base] if base else []
+    newest = changes
+    while layers and 2 * len(newest) >= len(layers[0]):
+        newest = _merge_layers(layers.pop(0), newest)
+    return LayeredDict((newest, *layers), length)
+
+def _like(keys: Sequence, items: Iterable) -> Sequence:
+    return array(keys.typecode, items) if isinstance(keys, array) else list(items)
+
+def _merge_runs(older: tuple, newer: tuple) -> tuple:
+    (keys, values), (new_keys, new_values) = older, newer
+    if keys[-1] <= new_keys[0]:
+        return keys + new_keys, values + new_values if values is not None else None
+    if values is None:
+        return _like(keys, heapq.merge(keys, new_keys)), None
+    merged = list(heapq.merge(zip(keys, values), zip(new_keys, new_values)))
+    return _like(keys, (key for key, _ in merged)), _like(values, (value for _, value in merged))
+
+class SortedRuns:
+    """
+    Sorted keys, optionally each with a value, kept as a few sorted runs.
+
+    runs holds (keys, values) pairs oldest first, values being None for
+    runs of bare keys; readers search every run. Pairs are ordered by key
+    and then by value, and values added later must not sort before earlier
+    ones with an equal key. Build new versions with added().
+    """
+
+    __slots__ = ("runs",)
+
+    def __init__(self, keys: Sequence = (), values: Optional[Sequence] = None):
+        self.runs = ((keys, values),) if len(keys) else ()
+
+    def added(self, keys: Sequence, values: Optional[Sequence] = None) -> "SortedRuns":
+        """Return a version that also holds the sorted keys (and values) of a batch."""
+        if not len(keys):
+            return self
+        runs = list(self.runs)
+        run = (keys, values)
+        while runs and len(runs[-1][0]) <= 2 * len(run[0]):
+            run = _merge_runs(runs.pop(), run)
+        extended = SortedRuns()
+        extended.runs = (*runs, run)
+        return extended
+
+    def merged(self) -> tuple:
+        """Return all keys and values as a single run."""
+        if not self.runs:
+            return [], None
+        run = self.runs[0]
+        for newer in self.runs[1:]:
+            run = _merge_runs(run, newer)
+        return run
+
+    def values_between(self, low: Any = None, high: Any = None) -> list:
+        """Return the values of the keys from low up to but excluding high (None: unbounded), in order."""
+        slices = []
+        for keys, values in self.runs:
+            start = 0 if low is None else bisect_left(keys, low)
+            end = len(keys) if high is None else bisect_left(keys, high)
+            if start < end:
+                slices.append((keys[start:end], values[start:end]))
+        if len(slices) == 1:
+            return list(slices[0][1])
+        return [value for _, value in heapq.merge(*(zip(keys, values) for keys, values in slices))]
+
+    def __len__(self) -> int:
+        return sum(len(keys) for keys, _ in self.runs)
+
+    def __iter__(self) -> Iterator[Any]:
+        return heapq.merge(*(keys for keys, _ in self.runs))
+
+    def __contains__(self, key) -> bool:
+        for keys, _ in self.runs:
+            position = bisect_left(keys, key)
+            if position < len(keys) and keys[position] == key:
+                return True
+        return False
+
+    def __eq__(self, other):
+        if not isinstance(other, SortedRuns):
+            return NotImplemented
+        (keys, values), (other_keys, other_values) = self.merged(), other.merged()
+        return list(keys) == list(other_keys) and (values is None) == (other_values is None) and (
+            values is None or list(values) == list(other_values))
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"SortedRuns({self.runs!r})"
+
+    def __reduce__(self):
+        return SortedRuns, self.merged()
+
+class _Buffer(array):
+    """Array with spare room at its end; used counts the items of the newest view."""
+
+def append_array(base: Sequence[int], values: Sequence[int], typecode: str = "l") -> memoryview:
+    """
+    Return a read-only view of the items of base followed by values, leaving base as it is.
+
+    When base is the newest view of its buffer and the values fit, they are
+    written past its end in place. Otherwise the items move to a new buffer
+    twice their size, so appends cost O(len(values)) amortized.
+    """
+    count = len(base)
+    end = count + len(values)
+    buffer = base.obj if isinstance(base, memoryview) else None
+    if isinstance(buffer, _Buffer) and buffer.used == count and len(buffer) >= end:
+        memoryview(buffer)[count:end] = array(typecode, values)
+    else:
+        buffer = _Buffer(typecode)
+        if isinstance(base, memoryview):
+            buffer.frombytes(base.cast("B"))
+        else:
+            buffer.extend(base)
+        buffer.extend(values)
+        buffer.frombytes(bytes(buffer.itemsize * max(end, SEGMENT_SIZE)))
+    buffer.used = end
+    return memoryview(buffer)[:end].toreadonly()
+
+def plain_array(items: Sequence[int], typecode: str = "l") -> array:
+    """Return the items of a view (or any sequence of numbers) as a plain array."""
+    if isinstance(items, memoryview):
+        plain = array(items.format)
+        plain.frombytes(items.cast("B"))
+        return plain
+    return items if isinstance(items, array) else array(typecode, items)
@@ -0,0 +1,62 @@
+"""
+Fast-path JSON serialization for the Utility Infrastructure API.
+
+Records are immutable once loaded, so each one is encoded to JSON bytes a
+single time when it is ingested. Handlers assemble responses by joining those
+pre-encoded fragments inside a small envelope and return the bytes directly,
+skipping jsonable_encoder and the per-request re-encoding of every record.
+The columnar engine keeps no such bytes, to stay small; it encodes only the
+rows of each response from its frames.
+orjson is used when it is installed; otherwise the stdlib encoder produces the
+same compact output FastAPI's JSONResponse would.
+"""
+
+import json
+from typing import Any, Dict, Iterable, List
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class RawJSON(bytes):
+    """Already encoded JSON that is embedded into a response as-is."""
+
+def _default(value: Any):
+    """Encode numpy scalars, dates and other objects with a plain JSON form."""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(value: Any) -> bytes:
+        """Encode a value as compact UTF-8 JSON."""
+        return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS)
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default)
+
+    def dumps(value: Any) -> bytes:
+        """Encode a value as compact UTF-8 JSON."""
+        return _encoder.encode(value).encode("utf-8")
+
+def encode_records(records: Iterable[Dict[str, Any]]) -> List[bytes]:
+    """Encode each record to its own JSON fragment."""
+    return [dumps(record) for record in records]
+
+def join_array(fragments: Iterable[bytes]) -> RawJSON:
+    """Join encoded values into a JSON array."""
+    return RawJSON(b"[" + b",".join(fragments) + b"]")
+
+def encode_json(value: Any) -> bytes:
+    """Encode a response, embedding RawJSON values without re-encoding them."""
+    if isinstance(value, RawJSON):
+        return bytes(value)
+    if isinstance(value, dict):
+        return b"{" + b",".join(dumps(str(key)) + b":" + encode_json(item) for key, item in value.items()) + b"}"
+    if isinstance(value, list) and any(isinstance(item, (RawJSON, dict)) for item in value):
+        return join_array(encode_json(item) for item in value)
+    return dumps(value)
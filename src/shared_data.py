@@ -0,0 +1,178 @@
+"""
+Multi-worker data loading for the Utility Infrastructure API.
+
+With API_WORKERS above 1, a supervisor process loads the data files once,
+writes both dataset states as snapshot files into a generation directory and
+then starts the uvicorn workers. Each worker restores the current generation
+from those files instead of parsing the sources itself, and watches the
+manifest to switch to newer generations.
+
+Anything that changes the data (a file change seen by the supervisor, an
+admin reload or an ingestion request in any worker) publishes a new
+generation under an exclusive file lock, so every worker moves to the same
+version. Old generations are unlinked; workers still mapping them keep
+their pages until they switch.
+
+This mode saves parsing time only, not memory: every worker unpickles its
+own copy of the records and indexes, so memory use grows with the number of
+workers as it would with separate processes. Only the fixed-width columns of
+columnar frames (category codes and floats) stay backed by the mapped file.
+"""
+
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import uvicorn
+
+from src import data_processor
+from src.data_processor import (
+    EQUIPMENT_FILE,
+    MAINTENANCE_FILE,
+    get_snapshot,
+    install_datasets,
+    load_datasets
+)
+from src.reloader import DataFileWatcher
+from src.snapshot_file import read_snapshot, write_snapshot
+
+# Number of uvicorn worker processes; above 1 the data files are parsed once for all of them
+WORKERS = int(os.environ.get("API_WORKERS", "1"))
+
+# Directory holding the published generations; set for workers by the supervisor
+SHARED_DATA_DIR = os.environ.get("SHARED_DATA_DIR")
+
+# Seconds between worker checks for a new generation
+SHARED_POLL_INTERVAL = float(os.environ.get("SHARED_DATA_POLL_INTERVAL", "1.0"))
+
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".lock"
+
+class SharedDataStore:
+    """Generations of dataset snapshot files published for all worker processes."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.directory / MANIFEST_FILE
+        # Generation this process is serving
+        self.generation = 0
+
+    @contextmanager
+    def _locked(self):
+        """Hold the exclusive lock that serializes publishing across processes."""
+        with open(self.directory / LOCK_FILE, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def read_manifest(self) -> Optional[Dict[str, Any]]:
+        """Return the manifest of the current generation, or None before the first publish."""
+        try:
+            return json.loads(self.manifest_path.read_text())
+        except FileNotFoundError:
+            return None
+
+    def _publish(self, equipment, maintenance) -> int:
+        """Write dataset states as the next generation; the lock must be held."""
+        manifest = self.read_manifest()
+        generation = (manifest["generation"] if manifest else 0) + 1
+        engine = data_processor.STORAGE_ENGINE
+        generation_dir = self.directory / f"generation-{generation}"
+        generation_dir.mkdir(exist_ok=True)
+
+        files = {}
+        for state in (equipment, maintenance):
+            files[state.name] = f"{generation_dir.name}/{state.name}.{engine}.snapshot"
+            write_snapshot(self.directory / files[state.name], state, state.name, engine, {})
+
+        # Replacing the manifest is what announces the generation to the workers
+        fd, temp_name = tempfile.mkstemp(dir=self.directory, prefix=MANIFEST_FILE, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"generation": generation, "engine": engine, "files": files}, f)
+        os.replace(temp_name, self.manifest_path)
+
+        for path in self.directory.glob("generation-*"):
+            if path != generation_dir:
+                shutil.rmtree(path, ignore_errors=True)
+
+        print(f" Published shared data generation {generation}")
+        return generation
+
+    def load_and_publish(self, equipment_path: Path = EQUIPMENT_FILE,
+                         maintenance_path: Path = MAINTENANCE_FILE) -> Optional[int]:
+        """Parse the data files and publish them as a new generation without keeping them in memory."""
+        with self._locked():
+            try:
+                equipment, maintenance = load_datasets(equipment_path, maintenance_path)
+            except Exception as e:
+                print(f" Loading shared data failed, workers keep generation {self.generation}: {e}")
+                return None
+            return self._publish(equipment, maintenance)
+
+    def attach(self) -> bool:
+        """Restore a private copy of the latest published generation; returns whether it switched."""
+        manifest = self.read_manifest()
+        if manifest is None or manifest["generation"] == self.generation:
+            return False
+
+        states = {}
+        for dataset, name in manifest["files"].items():
+            states[dataset] = read_snapshot(self.directory / name, dataset, manifest["engine"])
+            if states[dataset] is None:
+                # Superseded and removed while we were reading; the next check picks up its successor
+                return False
+
+        snapshot = install_datasets(states["equipment"], states["maintenance"])
+        self.generation = manifest["generation"]
+        print(f" Attached shared data generation {self.generation} as version {snapshot.version}")
+        return True
+
+    def write(self, change: Callable[[], Any]) -> Any:
+        """Apply a change to the latest generation and publish the result to all workers."""
+        with self._locked():
+            self.attach()
+            current = get_snapshot()
+            result = change()
+            snapshot = get_snapshot()
+            if snapshot is current:
+                return result
+            self.generation = self._publish(snapshot.equipment, snapshot.maintenance)
+            return result
+
+    def reload(self, equipment_path: Path = EQUIPMENT_FILE, maintenance_path: Path = MAINTENANCE_FILE):
+        """Reload the data files for every worker and switch this one immediately."""
+        if self.load_and_publish(equipment_path, maintenance_path) is None:
+            return None
+        self.attach()
+        return get_snapshot()
+
+# Store of the generations this worker serves, when started by a supervisor
+shared_store = SharedDataStore(SHARED_DATA_DIR) if SHARED_DATA_DIR else None
+
+def serve_workers(app: str = "main:app", host: str = "0.0.0.0", port: int = 8000, workers: int = WORKERS,
+                  reload_interval: float = 0):
+    """Load the data once, then run uvicorn workers that attach to it."""
+    directory = SHARED_DATA_DIR or tempfile.mkdtemp(prefix="utility-api-data-")
+    os.environ["SHARED_DATA_DIR"] = directory
+    store = SharedDataStore(directory)
+    store.load_and_publish()
+
+    # The supervisor watches the source files and republishes for all workers
+    watcher = None
+    if reload_interval > 0:
+        watcher = DataFileWatcher(interval=reload_interval, on_change=store.load_and_publish)
+        watcher.start()
+
+    try:
+        uvicorn.run(app, host=host, port=port, workers=workers)
+    finally:
+        if watcher:
+            watcher.stop()
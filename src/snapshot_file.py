@@ -0,0 +1,175 @@
+"""
+On-disk dataset snapshots for the Utility Infrastructure API.
+
+After a data file is parsed, the resulting dataset state (records, encoded
+records, search and filter indexes, entity counts, references and cost
+aggregates) is written next to a fingerprint of the source file. On the next
+start a matching snapshot is memory-mapped and restored instead of parsing
+the source again.
+
+File layout:
+
+    MAGIC | header length (uint32) | JSON header | pickle | aligned buffers
+
+The state is pickled with protocol 5 and large binary buffers (the numpy
+arrays of the columnar engine) are stored out of band. They are handed back
+as read-only views of the mapping, so columnar frames are served straight
+from the page cache without being copied.
+
+Snapshots are trusted local files written by this process; do not point the
+snapshot directory at data from elsewhere.
+"""
+
+import gc
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+MAGIC = b"UIASNAP\x01"
+FORMAT_VERSION = 4
+BUFFER_ALIGNMENT = 64
+
+# Directory for snapshot files; unset disables snapshots
+SNAPSHOT_DIR = os.environ.get("DATA_SNAPSHOT_DIR")
+
+_HEADER_LENGTH = struct.Struct("<I")
+
+def source_fingerprint(source: Union[Path, List[Path]], digest: bool = True) -> Dict[str, Any]:
+    """Return the size, modification time and (optionally) SHA-256 of a source file or of each shard file."""
+    if isinstance(source, list):
+        return {"shards": [{"path": str(shard), **source_fingerprint(shard, digest)} for shard in source]}
+    stat = Path(source).stat()
+    fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if digest:
+        sha256 = hashlib.sha256()
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha256.update(chunk)
+        fingerprint["sha256"] = sha256.hexdigest()
+    return fingerprint
+
+def snapshot_path(dataset: str, engine: str, directory: Path) -> Path:
+    """Return where the snapshot of a dataset built by an engine is stored."""
+    return Path(directory) / f"{dataset}.{engine}.snapshot"
+
+def _aligned(offset: int) -> int:
+    return -(-offset // BUFFER_ALIGNMENT) * BUFFER_ALIGNMENT
+
+def write_snapshot(path: Path, state: Any, dataset: str, engine: str, fingerprint: Dict[str, Any]):
+    """
+    Write a dataset state and the fingerprint of its source to a snapshot file.
+
+    The file is written under a temporary name and renamed into place, so a
+    reader never sees a partial snapshot.
+    """
+    buffers = []
+    payload = pickle.dumps(state, protocol=5, buffer_callback=buffers.append)
+
+    layout = []
+    offset = 0
+    for buffer in buffers:
+        offset = _aligned(offset)
+        length = buffer.raw().nbytes
+        layout.append([offset, length])
+        offset += length
+
+    header = json.dumps({
+        "format": FORMAT_VERSION,
+        "dataset": dataset,
+        "engine": engine,
+        "source": fingerprint,
+        "pickle_length": len(payload),
+        "buffers": layout
+    }).encode("utf-8")
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(_HEADER_LENGTH.pack(len(header)))
+            f.write(header)
+            f.write(payload)
+
+            # Buffer offsets are relative to an aligned base after the pickle
+            base = _aligned(f.tell())
+            f.write(b"\0" * (base - f.tell()))
+            for (offset, _), buffer in zip(layout, buffers):
+                f.write(b"\0" * (base + offset - f.tell()))
+                f.write(buffer.raw())
+        os.replace(temp_name, path)
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+
+def _source_unchanged(recorded: Dict[str, Any], source: Union[Path, List[Path]]) -> bool:
+    if isinstance(source, list):
+        shards = recorded.get("shards")
+        return (shards is not None and [shard["path"] for shard in shards] == [str(path) for path in source]
+                and all(_source_unchanged(shard, path) for shard, path in zip(shards, source)))
+    if "shards" in recorded:
+        return False
+
+    current = source_fingerprint(source, digest=False)
+    if (current["size"], current["mtime_ns"]) == (recorded["size"], recorded["mtime_ns"]):
+        return True
+    return current["size"] == recorded["size"] and source_fingerprint(source)["sha256"] == recorded["sha256"]
+
+def read_snapshot(path: Path, dataset: str, engine: str,
+                  source: Optional[Union[Path, List[Path]]] = None) -> Optional[Any]:
+    """
+    Restore a dataset state from a snapshot if it is still valid for its source.
+
+    A snapshot is valid when the source has the recorded size and
+    modification time, or failing that the recorded SHA-256 (a touched but
+    unchanged file). A sharded source is valid when the same shard files
+    are present and each of them is. Without a source the snapshot is taken
+    as is. Returns None when there is no usable snapshot.
+    """
+    try:
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    view = memoryview(mapped)
+    try:
+        if view[:len(MAGIC)] != MAGIC:
+            return None
+        start = len(MAGIC) + _HEADER_LENGTH.size
+        (header_length,) = _HEADER_LENGTH.unpack(view[len(MAGIC):start])
+        header = json.loads(bytes(view[start:start + header_length]))
+
+        if (header.get("format") != FORMAT_VERSION or header.get("dataset") != dataset
+                or header.get("engine") != engine):
+            return None
+
+        if source is not None and not _source_unchanged(header["source"], source):
+            return None
+
+        payload_start = start + header_length
+        payload_end = payload_start + header["pickle_length"]
+        base = _aligned(payload_end)
+        buffers = [view[base + offset:base + offset + length] for offset, length in header["buffers"]]
+        if buffers and base + header["buffers"][-1][0] + header["buffers"][-1][1] > len(view):
+            return None
+
+        # The out-of-band buffers stay views of the mapping, which lives as long as they do.
+        # Millions of fresh containers would trigger cyclic GC passes over and over; none are garbage yet.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return pickle.loads(view[payload_start:payload_end], buffers=buffers)
+        finally:
+            if gc_enabled:
+                gc.enable()
+    except (ValueError, KeyError, TypeError, struct.error, pickle.UnpicklingError, EOFError) as e:
+        print(f" Ignoring unreadable snapshot {path}: {e}")
+        return None
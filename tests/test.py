@@ -5,11 +5,46 @@ Following the structure provided in the example test file.
 Tests both data processing functionality and API endpoints.
 """
 
+import csv
+import io
+import json
+import os
+import shutil
 import pytest
 from fastapi.testclient import TestClient
 from main import app
+from src import data_processor
 from src.data_processor import extract_entities, equipment_data, maintenance_logs
 from src.data_processor import load_equipment_data, load_maintenance_logs
+from src.data_processor import search_row_ids
+from src.data_processor import build_filter_index, filter_row_ids, build_equipment_relationships
+from src.data_processor import encode_cursor, decode_cursor, page_row_ids
+from src.data_processor import set_storage_engine, get_encoded_records
+from src.columnar_store import FrameRecords, build_frame
+from src.ingestion import iter_json_records, iter_batches, validate_record
+from src.data_processor import get_entity_catalog, top_entities, validate_data_integrity
+from src.data_processor import get_snapshot, get_equipment_data, get_maintenance_logs, reload_data
+from src.reloader import DataFileWatcher, file_signature
+from src.data_processor import append_records
+from src.response_cache import ResponseCache, CachedResponse, etag_matches
+from src.data_processor import find_related, cost_rollup, format_cost_stats
+from src.data_processor import date_ordinal, maintenance_schedule, QueryLookups
+from src.data_processor import build_prefix_index, prefix_matches, autocomplete, AUTOCOMPLETE_CATEGORIES
+from datetime import date
+from src.snapshot_file import snapshot_path
+from src.shared_data import SharedDataStore
+from benchmarks.synthetic_data import generate_dataset
+from benchmarks.run_benchmarks import compare, percentile
+from src.serialization import RawJSON, dumps, encode_json, join_array
+from src.metrics import Counter, Histogram, MetricsMiddleware, RequestProfiler, INDEX_LOOKUPS, REQUESTS, REQUEST_LATENCY
+from src.query_pool import QueryPool, QueryRejected, QueryTimeout
+from src import api as api_module
+from src import response_cache as response_cache_module
+import asyncio
+import pickle
+from array import array
+from src.segments import SEGMENT_SIZE, SegmentedList, SortedRuns, append_array, layered, plain_array
+import threading
 
 # Add this before the test classes:
 #def setup_module():
@@ -20,6 +55,18 @@ from src.data_processor import load_equipment_data, load_maintenance_logs
 # Create test client for API testing
 client = TestClient(app)
 
+ADMIN_HEADERS = {"X-Admin-Token": "test-admin-token"}
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    """Configure the admin token sent in ADMIN_HEADERS."""
+    monkeypatch.setattr(api_module, "ADMIN_TOKEN", ADMIN_HEADERS["X-Admin-Token"])
+
+@pytest.fixture(autouse=True)
+def ingest_log_dir(tmp_path, monkeypatch):
+    """Keep the records each test ingests in ingest logs of its own."""
+    monkeypatch.setattr(data_processor, "INGEST_LOG_DIR", tmp_path / "ingest")
+
 class TestDataProcessor:
     """Test class for data processing functionality."""
     
@@ -193,6 +240,1606 @@ class TestAPI:
         assert "data_summary" in data
 
 
+class TestSearchIndex:
+    """Test class for the inverted search index."""
+    
+    @classmethod
+    def setup_class(cls):
+        """Load real data so the indexes are built."""
+        load_equipment_data()
+        load_maintenance_logs()
+    
+    def test_search_index_postings(self):
+        """Test posting lists are built per token as records are loaded."""
+        records = [
+            {"equipment_id": "EQ1", "equipment_type": "Transformer", "location": "Substation Alpha"},
+            {"equipment_id": "EQ2", "equipment_type": "Generator", "location": "Substation Beta"}
+        ]
+        index = data_processor._ingest_stream("equipment", iter(records)).search_index
+        
+        assert index["postings"]["substation"] == [0, 1]
+        assert index["postings"]["transformer"] == [0]
+        assert list(index["vocabulary"]) == sorted(index["postings"])
+        assert index["texts"][1].split() == ["eq2", "generator", "substation", "beta"]
+    
+    def test_search_modes(self):
+        """Test token, prefix and substring search modes."""
+        token_hits = search_row_ids("equipment", "transformer")
+        substring_hits = search_row_ids("equipment", "transformer", mode="substring")
+        assert token_hits
+        assert token_hits == substring_hits
+        
+        # Partial words only match in prefix and substring mode
+        assert search_row_ids("equipment", "transf") == []
+        assert search_row_ids("equipment", "transf", mode="prefix") == token_hits
+        assert search_row_ids("equipment", "ransf", mode="substring") == token_hits
+    
+    def test_search_intersects_tokens(self):
+        """Test multi-token queries require every token."""
+        both = search_row_ids("equipment", "transformer alpha")
+        assert set(both) <= set(search_row_ids("equipment", "transformer"))
+        assert set(both) <= set(search_row_ids("equipment", "alpha"))
+        assert search_row_ids("equipment", "transformer nonexistenttoken") == []
+    
+    def test_ranked_search(self):
+        """Test BM25 ranking favours rare tokens and boosted fields, and returns only the top k."""
+        records = [
+            {"log_id": "L1", "technician": "Oil Smith", "description": "routine check"},
+            {"log_id": "L2", "technician": "Ann", "description": "oil leak on transformer, oil topped up"},
+            {"log_id": "L3", "technician": "Ann", "description": "routine check of transformer"},
+            {"log_id": "L4", "technician": "Bob", "description": "routine check"}
+        ]
+        data_processor.install_datasets(data_processor._empty_dataset("equipment"),
+                                        data_processor._ingest_stream("maintenance", iter(records)))
+        try:
+            index = get_snapshot().maintenance.search_index
+            assert index["frequencies"]["oil"] == [2, 2]
+            assert index["lengths"][0] == 3 + 2 * 2 + 2
+            
+            ranked = data_processor.ranked_search("maintenance", "oil leak transformer", 10)
+            assert [row_id for row_id, _ in ranked] == [1, 0, 2]
+            assert ranked[0][1] > ranked[1][1] > ranked[2][1] > 0
+            assert data_processor.ranked_search("maintenance", "oil leak transformer", 1) == ranked[:1]
+            assert data_processor.ranked_search("maintenance", "nothing", 10) == []
+            assert search_row_ids("maintenance", "leak smith", mode="ranked") == [0, 1]
+            
+            response = client.get("/api/search?query=oil%20leak&mode=ranked&limit=2&fields=log_id")
+            assert response.status_code == 200
+            data = response.json()
+            assert [hit["record"] for hit in data["results"]] == [{"log_id": "L2"}, {"log_id": "L1"}]
+            assert data["results"][0]["dataset"] == "maintenance" and data["total_results"] == 2
+            assert client.get("/api/search?query=oil&mode=ranked&cursor=abc").status_code == 400
+        finally:
+            load_equipment_data()
+            load_maintenance_logs()
+    
+    def test_ranked_search_pruning_is_exact(self):
+        """Test pruned top-k retrieval matches scoring every matching record."""
+        records = [{"log_id": f"L{i}", "description": " ".join(["pump"] * (1 + i % 3) + ["valve"] * (i % 5 == 0)
+                                                               + ["seal"] * (i % 97 == 0) + ["filler"] * (i % 7))}
+                   for i in range(2000)]
+        state = data_processor._ingest_stream("maintenance", iter(records))
+        data_processor.install_datasets(data_processor._empty_dataset("equipment"), state)
+        try:
+            top = data_processor.ranked_search("maintenance", "seal valve pump", 5)
+            everything = data_processor.ranked_search("maintenance", "seal valve pump", len(records))
+            assert len(everything) == len(records)
+            assert [row_id for row_id, _ in top] == [row_id for row_id, _ in everything[:5]]
+            assert all(row_id % 97 == 0 for row_id, _ in top)
+        finally:
+            load_equipment_data()
+            load_maintenance_logs()
+    
+    def test_search_endpoint_invalid_mode(self):
+        """Test search endpoint rejects unknown modes."""
+        response = client.get("/api/search?query=transformer&mode=fuzzy")
+        assert response.status_code == 400
+
+
+class TestFilterIndex:
+    """Test class for the secondary filter indexes."""
+    
+    @classmethod
+    def setup_class(cls):
+        """Load real data so the indexes are built."""
+        load_equipment_data()
+        load_maintenance_logs()
+    
+    def test_build_filter_index_case_folds(self):
+        """Test index buckets are keyed by case-folded values."""
+        records = [
+            {"equipment_id": "EQ1", "status": "Active"},
+            {"equipment_id": "EQ2", "status": "ACTIVE "},
+            {"equipment_id": "EQ3"}
+        ]
+        index = build_filter_index(records, ["equipment_id", "status"])
+        
+        assert index["status"] == {"active": [0, 1]}
+        assert index["equipment_id"]["eq3"] == [2]
+    
+    def test_filter_row_ids_intersects(self):
+        """Test multiple filters intersect their buckets."""
+        transformers = set(filter_row_ids("equipment", {"equipment_type": "transformer"}))
+        active = set(filter_row_ids("equipment", {"status": "ACTIVE"}))
+        both = filter_row_ids("equipment", {"equipment_type": "Transformer", "status": "active"})
+        
+        assert transformers
+        assert set(both) == transformers & active
+        assert filter_row_ids("equipment", {"status": None}) == range(len(get_equipment_data()))
+        assert filter_row_ids("equipment", {"location": "Nowhere"}) == []
+    
+    def test_build_equipment_relationships(self):
+        """Test relationship lookup through the indexes."""
+        relationships = build_equipment_relationships("EQ001")
+        assert relationships["equipment"]["equipment_id"] == "EQ001"
+        assert all(log["equipment_id"] == "EQ001" for log in relationships["maintenance_history"])
+        assert build_equipment_relationships("UNKNOWN") is None
+    
+    def test_maintenance_technician_filter(self):
+        """Test maintenance endpoint filters by technician."""
+        with TestClient(app) as loaded_client:
+            response = loaded_client.get("/api/maintenance?technician=john smith")
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert data["count"] > 0
+        assert all(log["technician"] == "John Smith" for log in data["maintenance"])
+
+
+class TestPagination:
+    """Test class for cursor pagination and field projection."""
+    
+    def test_cursor_round_trip(self):
+        """Test cursors decode to the dataset and row they encode."""
+        assert decode_cursor(encode_cursor("maintenance", 42)) == ("maintenance", 42)
+        with pytest.raises(ValueError):
+            decode_cursor("not-a-cursor")
+    
+    def test_page_row_ids(self):
+        """Test pages continue after the cursor row."""
+        page, has_more = page_row_ids(range(10), 4)
+        assert list(page) == [0, 1, 2, 3] and has_more
+        
+        page, has_more = page_row_ids([1, 5, 9], 2, after=1)
+        assert list(page) == [5, 9] and not has_more
+    
+    def test_equipment_pages_cover_all_records(self):
+        """Test following cursors returns every record exactly once."""
+        with TestClient(app) as loaded_client:
+            total = loaded_client.get("/api/equipment").json()["count"]
+            seen = []
+            cursor = None
+            while True:
+                url = "/api/equipment?limit=3&fields=equipment_id"
+                if cursor:
+                    url += f"&cursor={cursor}"
+                data = loaded_client.get(url).json()
+                assert data["count"] == total
+                assert all(set(record) == {"equipment_id"} for record in data["equipment"])
+                seen.extend(record["equipment_id"] for record in data["equipment"])
+                cursor = data["next_cursor"]
+                if not cursor:
+                    break
+        
+        assert len(seen) == total == len(set(seen))
+    
+    def test_search_pagination_spans_datasets(self):
+        """Test search pages continue from equipment into maintenance."""
+        with TestClient(app) as loaded_client:
+            full = loaded_client.get("/api/search?query=a&mode=substring").json()
+            first = loaded_client.get("/api/search?query=a&mode=substring&limit=2").json()
+            rest = loaded_client.get(
+                f"/api/search?query=a&mode=substring&cursor={first['next_cursor']}").json()
+        
+        paged = first["results"]["equipment"] + rest["results"]["equipment"]
+        assert paged == full["results"]["equipment"]
+        assert rest["results"]["maintenance"] == full["results"]["maintenance"]
+        assert rest["next_cursor"] is None
+    
+    def test_cursor_from_other_endpoint_rejected(self):
+        """Test a maintenance cursor cannot page equipment."""
+        with TestClient(app) as loaded_client:
+            response = loaded_client.get(f"/api/equipment?cursor={encode_cursor('maintenance', 0)}")
+        assert response.status_code == 400
+
+
+class TestColumnarStore:
+    """Test class for the columnar storage engine."""
+    
+    def test_build_frame_types_columns(self):
+        """Test strings are dictionary-encoded, costs float and dates datetime64."""
+        frame = build_frame([
+            {"log_id": "L1", "technician": "Ann", "date": "2024-01-10", "cost": 250},
+            {"log_id": "L2", "technician": "Ann", "date": "2024-02-01", "cost": 99.5}
+        ])
+        
+        assert str(frame["technician"].dtype) == "category"
+        assert str(frame["cost"].dtype) == "float64"
+        assert str(frame["date"].dtype).startswith("datetime64")
+    
+    def test_frame_records_round_trip(self):
+        """Test records read back from the frame match the originals."""
+        records = [
+            {"log_id": "L1", "technician": "Ann", "date": "2024-01-10", "cost": 250.0, "parts_used": []},
+            {"log_id": "L2", "technician": "Bob", "date": "2024-02-01", "cost": 99.5, "parts_used": ["Fuse"]}
+        ]
+        frame_records = FrameRecords(build_frame(records))
+        
+        assert len(frame_records) == 2
+        assert list(frame_records) == records
+        assert frame_records[-1] == records[1]
+    
+    def test_columnar_engine_matches_row_engine(self):
+        """Test endpoints return the same results under both engines."""
+        urls = [
+            "/api/equipment?equipment_type=transformer&status=active",
+            "/api/maintenance?technician=John Smith",
+            "/api/search?query=transformer"
+        ]
+        try:
+            set_storage_engine("columnar")
+            with TestClient(app) as loaded_client:
+                assert isinstance(data_processor.get_equipment_data(), FrameRecords)
+                columnar = [loaded_client.get(url).json() for url in urls]
+                columnar_relationships = build_equipment_relationships("EQ001")
+        finally:
+            set_storage_engine("rows")
+        
+        with TestClient(app) as loaded_client:
+            rows = [loaded_client.get(url).json() for url in urls]
+            row_relationships = build_equipment_relationships("EQ001")
+        
+        assert columnar == rows
+        assert columnar_relationships["summary"]["total_cost"] == row_relationships["summary"]["total_cost"]
+    
+    def test_invalid_storage_engine(self):
+        """Test unknown engines are rejected."""
+        with pytest.raises(ValueError):
+            set_storage_engine("parquet")
+
+
+class TestStreamingIngestion:
+    """Test class for streaming, batched data loading."""
+    
+    def test_json_array_parsed_incrementally(self):
+        """Test JSON arrays parse identically with tiny read chunks."""
+        with open("data/maintenance_logs.json", encoding="utf-8") as f:
+            text = f.read()
+        expected = json.loads(text)
+        
+        for chunk_size in (1, 7, 4096):
+            assert list(iter_json_records(io.StringIO(text), chunk_size)) == expected
+    
+    def test_chunk_boundaries_in_numbers_and_leading_whitespace(self):
+        """Test numbers split across chunks and whitespace-only first chunks."""
+        for chunk_size in (1, 2, 3, 4):
+            assert list(iter_json_records(io.StringIO("[2.5, -1e-3, 10]"), chunk_size)) == [2.5, -1e-3, 10]
+            assert list(iter_json_records(io.StringIO(" " * 10 + '[{"log_id": "L1"}]'), chunk_size)) == [{"log_id": "L1"}]
+        assert list(iter_json_records(io.StringIO("\n" * 9 + '{"log_id": "L1"}'), 4)) == [{"log_id": "L1"}]
+        with pytest.raises(ValueError):
+            list(iter_json_records(io.StringIO("[2x]"), 2))
+    
+    def test_ndjson_and_malformed_input(self):
+        """Test NDJSON is detected and malformed arrays raise errors."""
+        ndjson = '{"log_id": "L1"}\n\n{"log_id": "L2"}'
+        assert list(iter_json_records(io.StringIO(ndjson))) == [{"log_id": "L1"}, {"log_id": "L2"}]
+        
+        for malformed in ('[{"log_id": "L1"}', '[{"log_id": "L1"} {"log_id": "L2"}]'):
+            with pytest.raises(ValueError):
+                list(iter_json_records(io.StringIO(malformed), 4))
+    
+    def test_batches_and_validation(self):
+        """Test batching and per-record validation."""
+        assert [len(batch) for batch in iter_batches(range(25), 10)] == [10, 10, 5]
+        assert validate_record("maintenance", {"log_id": "L1", "cost": "12.5"}) is None
+        assert validate_record("maintenance", {"log_id": "", "cost": 1}) == "missing log_id"
+        assert validate_record("maintenance", {"log_id": "L1", "cost": "n/a"}) == "cost is not numeric"
+        assert validate_record("equipment", ["EQ1"]) == "record is not an object"
+    
+    def test_load_ndjson_file_rejects_invalid_records(self, tmp_path):
+        """Test loading an NDJSON export indexes valid records and counts rejects."""
+        export = tmp_path / "maintenance.ndjson"
+        export.write_text("\n".join(json.dumps(record) for record in [
+            {"log_id": "L1", "equipment_id": "EQ001", "technician": "Ann Lee", "cost": 10},
+            {"equipment_id": "EQ002"},
+            {"log_id": "L2", "equipment_id": "EQ002", "technician": "Ann Lee", "cost": 5}
+        ]), encoding="utf-8")
+        
+        try:
+            assert load_maintenance_logs(export)
+            assert get_snapshot().maintenance.stats["records"] == 2
+            assert get_snapshot().maintenance.stats["rejected"] == 1
+            assert filter_row_ids("maintenance", {"technician": "ann lee"}) == [0, 1]
+            assert search_row_ids("maintenance", "l2") == [1]
+        finally:
+            load_maintenance_logs()
+
+
+class TestEntityCatalog:
+    """Test class for the incrementally maintained entity catalog."""
+    
+    @classmethod
+    def setup_class(cls):
+        """Load real data so the catalog is populated."""
+        load_equipment_data()
+        load_maintenance_logs()
+    
+    def test_catalog_counts_occurrences(self):
+        """Test entity counts match the number of records mentioning them."""
+        counts = get_snapshot().entity_counts
+        logs = get_maintenance_logs()
+        
+        assert counts["technicians"]["John Smith"] == sum(
+            1 for log in logs if log.get("technician", "").strip() == "John Smith")
+        assert sum(counts["manufacturers"].values()) == len(get_equipment_data())
+        assert extract_entities()["technicians"] == sorted(counts["technicians"])
+    
+    def test_top_entities_ranked_by_frequency(self):
+        """Test top-N entities are ordered by descending count."""
+        top = top_entities(2)
+        for ranked in top.values():
+            assert len(ranked) <= 2
+            assert [item["count"] for item in ranked] == sorted(
+                (item["count"] for item in ranked), reverse=True)
+    
+    def test_catalog_version_changes_on_reload(self):
+        """Test reloading data publishes a new catalog version."""
+        version = get_entity_catalog()["version"]
+        load_equipment_data()
+        assert get_entity_catalog()["version"] > version
+    
+    def test_entities_endpoint_top(self):
+        """Test the entities endpoint returns top entities on request."""
+        with TestClient(app) as loaded_client:
+            data = loaded_client.get("/api/entities?top=1").json()
+        
+        assert data["version"] == get_entity_catalog()["version"]
+        assert all(len(ranked) == 1 for ranked in data["top_entities"].values())
+        assert data["summary"]["total_unique_entities"] == sum(
+            len(values) for values in data["entities"].values())
+
+
+class TestDataIntegrity:
+    """Test class for incremental data-integrity validation."""
+    
+    def test_orphans_tracked_across_loads(self, tmp_path):
+        """Test orphaned logs are detected and cleared as equipment changes."""
+        equipment_file = tmp_path / "equipment.csv"
+        equipment_file.write_text("equipment_id,equipment_type\nEQ1,Transformer\n", encoding="utf-8")
+        logs_file = tmp_path / "logs.json"
+        logs_file.write_text(json.dumps([
+            {"log_id": "L1", "equipment_id": "EQ1"},
+            {"log_id": "L2", "equipment_id": "EQ2"},
+            {"log_id": "L3", "equipment_id": "EQ2"}
+        ]), encoding="utf-8")
+        
+        try:
+            load_equipment_data(equipment_file)
+            load_maintenance_logs(logs_file)
+            assert validate_data_integrity() == [
+                "Maintenance record L2 references unknown equipment",
+                "Maintenance record L3 references unknown equipment"
+            ]
+            
+            equipment_file.write_text("equipment_id,equipment_type\nEQ1,Transformer\nEQ2,Switch\n",
+                                      encoding="utf-8")
+            load_equipment_data(equipment_file)
+            assert validate_data_integrity() == []
+        finally:
+            load_equipment_data()
+            load_maintenance_logs()
+    
+    def test_issues_cached_per_version(self):
+        """Test the issue list is reused until a dataset changes."""
+        load_equipment_data()
+        load_maintenance_logs()
+        issues = validate_data_integrity()
+        assert validate_data_integrity() is issues
+        
+        load_maintenance_logs()
+        assert validate_data_integrity() is not issues
+    
+    def test_liveness_endpoint(self):
+        """Test the liveness probe answers without loaded data."""
+        response = client.get("/health/live")
+        assert response.status_code == 200
+        assert response.json() == {"status": "alive"}
+
+
+class TestHotReload:
+    """Test class for snapshot swaps and hot reload."""
+    
+    def test_reload_swaps_snapshot(self, tmp_path):
+        """Test a reload publishes a new snapshot and leaves the old one intact."""
+        load_equipment_data()
+        load_maintenance_logs()
+        before = get_snapshot()
+        
+        equipment_file = tmp_path / "equipment.csv"
+        equipment_file.write_text("equipment_id,equipment_type\nEQ9,Relay\n", encoding="utf-8")
+        logs_file = tmp_path / "logs.json"
+        logs_file.write_text('[{"log_id": "L9", "equipment_id": "EQ9", "technician": "Ann"}]', encoding="utf-8")
+        
+        try:
+            after = reload_data(equipment_file, logs_file)
+            assert after is get_snapshot()
+            assert after.version > before.version
+            assert extract_entities(after)["technicians"] == ["Ann"]
+            assert filter_row_ids("equipment", {"equipment_type": "relay"}, after) == [0]
+            
+            # Requests still holding the old snapshot keep a consistent view
+            assert len(get_equipment_data(before)) == 10
+            assert "John Smith" in extract_entities(before)["technicians"]
+        finally:
+            reload_data()
+    
+    def test_failed_reload_keeps_current_snapshot(self, tmp_path):
+        """Test a broken file does not replace the served data."""
+        reload_data()
+        current = get_snapshot()
+        broken = tmp_path / "logs.json"
+        broken.write_text('[{"log_id": "L1"', encoding="utf-8")
+        
+        assert reload_data(maintenance_path=broken) is None
+        assert get_snapshot() is current
+    
+    def test_watcher_detects_changes(self, tmp_path):
+        """Test the watcher reloads only after a file changes."""
+        watched = tmp_path / "equipment.csv"
+        watched.write_text("equipment_id\nEQ1\n", encoding="utf-8")
+        reloads = []
+        watcher = DataFileWatcher([watched], interval=0.01, on_change=lambda: reloads.append(1))
+        
+        assert not watcher.check()
+        watched.write_text("equipment_id\nEQ1\nEQ2\n", encoding="utf-8")
+        assert watcher.check()
+        assert reloads == [1]
+    
+    def test_reload_endpoint(self, admin_token):
+        """Test the admin reload endpoint reports the new version."""
+        with TestClient(app, headers=ADMIN_HEADERS) as loaded_client:
+            version = loaded_client.get("/").json()["data_version"]
+            response = loaded_client.post("/admin/reload")
+        
+        assert response.status_code == 200
+        assert response.json()["data_version"] > version
+        assert response.json()["equipment_count"] == 10
+
+
+@pytest.mark.usefixtures("admin_token")
+class TestBulkIngestion:
+    """Test class for appending records through the ingestion endpoints."""
+    
+    def setup_method(self):
+        """Start every test from the sample data."""
+        reload_data()
+    
+    def teardown_method(self):
+        """Drop ingested records again."""
+        for dataset in ("equipment", "maintenance"):
+            data_processor.ingest_log_path(dataset).unlink(missing_ok=True)
+        reload_data()
+    
+    def test_append_is_incremental_and_isolated(self):
+        """Test appends extend indexes without changing older snapshots."""
+        before = get_snapshot()
+        result = append_records("maintenance", [
+            {"log_id": "NEW1", "equipment_id": "EQ001", "technician": "Zed Quinn", "description": "oil leak"},
+            {"log_id": "NEW2", "equipment_id": "EQ404", "technician": "Zed Quinn"},
+            {"equipment_id": "EQ001"}
+        ])
+        after = get_snapshot()
+        
+        assert result["accepted"] == 2 and result["rejected"] == 1
+        assert result["errors"] == [{"record": 2, "error": "missing log_id"}]
+        assert filter_row_ids("maintenance", {"technician": "zed quinn"}, after) == [7, 8]
+        assert search_row_ids("maintenance", "leak", snapshot=after) == [7]
+        assert "zed" in after.maintenance.search_index["vocabulary"]
+        assert after.entity_counts["technicians"]["Zed Quinn"] == 2
+        assert "Maintenance record NEW2 references unknown equipment" in validate_data_integrity(after)
+        
+        # The previous snapshot still sees exactly the data it was published with
+        assert len(before.maintenance.records) == 7
+        assert filter_row_ids("maintenance", {"technician": "zed quinn"}, before) == []
+        assert search_row_ids("maintenance", "leak", snapshot=before) == []
+        assert "Zed Quinn" not in before.entity_counts["technicians"]
+    
+    def test_ingested_records_survive_reloads(self):
+        """Test accepted records are logged and replayed by loads, and failed or empty batches change nothing."""
+        result = append_records("maintenance", [{"log_id": "KEEP1", "equipment_id": "EQ001", "description": "gasket"},
+                                                {"equipment_id": "EQ001"}])
+        log = data_processor.ingest_log_path("maintenance")
+        assert result["accepted"] == 1 and result["ingest_log"] == str(log)
+        assert [json.loads(line)["log_id"] for line in log.read_bytes().splitlines()] == ["KEEP1"]
+        logged = log.read_bytes()
+        
+        def failing():
+            yield {"log_id": "LOST1", "equipment_id": "EQ001"}
+            raise ValueError("connection reset")
+        version = get_snapshot().version
+        with pytest.raises(ValueError):
+            append_records("maintenance", failing())
+        rejected = append_records("maintenance", [{"equipment_id": "EQ001"}])
+        assert rejected["accepted"] == 0 and rejected["data_version"] == version == get_snapshot().version
+        assert rejected["total_records"] == 8 and log.read_bytes() == logged
+        
+        # A crash while writing a batch leaves a line without its newline; loads drop it
+        with log.open("ab") as f:
+            f.write(b'{"log_id": "HAL')
+        snapshot = reload_data()
+        assert [record["log_id"] for record in snapshot.maintenance.records][-2:] == ["LOG007", "KEEP1"]
+        assert search_row_ids("maintenance", "gasket", snapshot=snapshot) == [7]
+        assert log.read_bytes() == logged
+        
+        assert load_maintenance_logs()
+        assert get_maintenance_logs()[-1]["log_id"] == "KEEP1"
+    
+    def test_repeated_appends_match_a_fresh_build(self):
+        """Test many small appends leave the same indexes as building them at once, and old snapshots alone."""
+        first = get_snapshot()
+        for batch in range(60):
+            append_records("maintenance", [
+                {"log_id": f"R{batch}-{i}", "equipment_id": f"EQ00{i % 3 + 1}", "technician": f"Tech {batch % 7}",
+                 "description": f"check {batch} retorque {i}", "date": f"2024-01-{batch % 28 + 1:02d}", "cost": i}
+                for i in range(30)
+            ])
+        middle = get_snapshot()
+        append_records("maintenance", [{"log_id": "R-last", "equipment_id": "EQ001", "technician": "Tech 0"}])
+        snapshot = get_snapshot()
+        
+        logs = list(snapshot.maintenance.records)
+        fresh = data_processor._ingest_stream("maintenance", iter(logs))
+        search_index, filter_index = fresh.search_index, fresh.filter_index
+        assert len(logs) == 7 + 60 * 30 + 1
+        assert snapshot.maintenance.search_index["vocabulary"] == search_index["vocabulary"]
+        assert dict(snapshot.maintenance.search_index["postings"]) == search_index["postings"]
+        assert list(snapshot.maintenance.search_index["lengths"]) == list(search_index["lengths"])
+        for field, buckets in filter_index.items():
+            assert dict(snapshot.maintenance.filter_index[field]) == buckets
+        
+        assert len(middle.maintenance.records) == len(logs) - 1
+        assert filter_row_ids("maintenance", {"technician": "tech 0"}, middle)[-1] < len(logs) - 1
+        assert len(search_row_ids("maintenance", "retorque", snapshot=middle)) == 60 * 30
+        assert len(first.maintenance.records) == 7
+        assert search_row_ids("maintenance", "retorque", snapshot=first) == []
+    
+    def test_ingest_ndjson_body(self):
+        """Test NDJSON request bodies are appended."""
+        body = "\n".join(json.dumps({"log_id": f"N{i}", "equipment_id": "EQ001", "cost": i}) for i in range(100))
+        with TestClient(app, headers=ADMIN_HEADERS) as loaded_client:
+            existing = loaded_client.get("/api/maintenance?equipment_id=EQ001").json()["count"]
+            response = loaded_client.post("/api/maintenance/ingest", content=body,
+                                          headers={"content-type": "application/x-ndjson"})
+            count = loaded_client.get("/api/maintenance?equipment_id=EQ001").json()["count"]
+        
+        assert response.status_code == 200
+        assert response.json()["accepted"] == 100
+        assert count == existing + 100
+    
+    def test_ingest_csv_upload_and_json_batch(self):
+        """Test multipart CSV uploads and JSON array bodies."""
+        with TestClient(app, headers=ADMIN_HEADERS) as loaded_client:
+            upload = loaded_client.post("/api/equipment/ingest", files={
+                "file": ("equipment.csv", "equipment_id,equipment_type\nEQ100,Relay\n", "text/csv")})
+            batch = loaded_client.post("/api/equipment/ingest", json=[{"equipment_id": "EQ101"}])
+            relays = loaded_client.get("/api/equipment?equipment_type=relay").json()
+        
+        assert upload.json()["accepted"] == 1
+        assert batch.json()["total_records"] == 12
+        assert relays["equipment"][-1]["equipment_id"] == "EQ100"
+    
+    def test_malformed_upload_ingests_nothing(self):
+        """Test a malformed body is rejected as a whole."""
+        with TestClient(app, headers=ADMIN_HEADERS) as loaded_client:
+            version = get_snapshot().version
+            malformed = loaded_client.post("/api/maintenance/ingest", content='[{"log_id": "X"}, {',
+                                           headers={"content-type": "application/json"})
+            unsupported = loaded_client.post("/api/maintenance/ingest", content="log",
+                                             headers={"content-type": "text/plain"})
+        
+        assert malformed.status_code == 400
+        assert unsupported.status_code == 415
+        assert get_snapshot().version == version
+    
+    def test_admin_endpoints_fail_closed(self, monkeypatch):
+        """Test write endpoints need the token, and are refused while none is configured."""
+        body = json.dumps([{"log_id": "AUTH1", "equipment_id": "EQ001"}])
+        headers = {"content-type": "application/json"}
+        assert client.post("/api/maintenance/ingest", content=body, headers=headers).status_code == 403
+        assert client.post("/api/maintenance/ingest", content=body,
+                           headers={**headers, "X-Admin-Token": "wrong"}).status_code == 403
+        
+        monkeypatch.setattr(api_module, "ADMIN_TOKEN", None)
+        assert client.post("/admin/reload", headers=ADMIN_HEADERS).status_code == 403
+        assert client.post("/api/maintenance/ingest", content=body, headers=headers).status_code == 403
+        
+        monkeypatch.setattr(api_module, "ADMIN_AUTH_DISABLED", True)
+        assert client.post("/api/maintenance/ingest", content=body, headers=headers).status_code == 200
+
+
+class TestResponseCache:
+    """Test class for the versioned response cache."""
+    
+    def test_lru_eviction_by_entries_and_bytes(self):
+        """Test the cache evicts least recently used entries to stay in bounds."""
+        cache = ResponseCache(max_entries=2, max_bytes=400)
+        cache.put("a", CachedResponse(b'"a"', b"x" * 10, []))
+        cache.put("b", CachedResponse(b'"b"', b"x" * 10, []))
+        cache.get("a")
+        cache.put("c", CachedResponse(b'"c"', b"x" * 10, []))
+        
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        
+        cache.put("d", CachedResponse(b'"d"', b"x" * 100, []))
+        cache.put("e", CachedResponse(b'"e"', b"x" * 100, []))
+        assert cache.size <= 400 and len(cache) <= 2
+        
+        cache.put("huge", CachedResponse(b'"h"', b"x" * 200, []))
+        assert cache.get("huge") is None
+    
+    def test_etag_matching(self):
+        """Test If-None-Match lists, wildcards and weak tags."""
+        assert etag_matches(b'"x", "abc"', b'"abc"')
+        assert etag_matches(b'W/"abc"', b'"abc"')
+        assert etag_matches(b"*", b'"abc"')
+        assert not etag_matches(b'"abd"', b'"abc"')
+    
+    def test_conditional_requests_and_invalidation(self):
+        """Test cache hits, 304 responses and invalidation on new data."""
+        with TestClient(app) as loaded_client:
+            first = loaded_client.get("/api/equipment?status=active&equipment_type=transformer")
+            reordered = loaded_client.get("/api/equipment?equipment_type=transformer&status=active")
+            etag = first.headers["etag"]
+            not_modified = loaded_client.get("/api/equipment?status=active&equipment_type=transformer",
+                                             headers={"If-None-Match": etag})
+            
+            # Maintenance changes do not invalidate equipment responses
+            append_records("maintenance", [{"log_id": "C1", "equipment_id": "EQ001"}])
+            still_cached = loaded_client.get("/api/equipment?status=active&equipment_type=transformer",
+                                             headers={"If-None-Match": etag})
+            
+            append_records("equipment", [{"equipment_id": "EQ900", "equipment_type": "Transformer",
+                                          "status": "Active"}])
+            changed = loaded_client.get("/api/equipment?status=active&equipment_type=transformer",
+                                        headers={"If-None-Match": etag})
+        
+        assert first.headers["x-cache"] == "MISS"
+        assert reordered.headers["x-cache"] == "HIT" and reordered.content == first.content
+        assert not_modified.status_code == 304 and not_modified.content == b""
+        assert still_cached.status_code == 304
+        assert changed.status_code == 200 and changed.headers["etag"] != etag
+        assert changed.json()["count"] == first.json()["count"] + 1
+    
+    def test_large_bodies_are_tagged_off_the_loop(self, monkeypatch):
+        """Test bodies hashed on a thread get the same ETag as those hashed inline."""
+        with TestClient(app) as loaded_client:
+            inline = loaded_client.get("/api/equipment?status=active&fields=equipment_id")
+            monkeypatch.setattr(response_cache_module, "INLINE_ETAG_BYTES", 0)
+            threaded = loaded_client.get("/api/equipment?fields=equipment_id&status=active&limit=100")
+            not_modified = loaded_client.get("/api/equipment?fields=equipment_id&status=active&limit=100",
+                                             headers={"If-None-Match": threaded.headers["etag"]})
+        
+        assert inline.headers["x-cache"] == "MISS" and threaded.headers["x-cache"] == "MISS"
+        assert threaded.headers["etag"] == inline.headers["etag"]
+        assert not_modified.status_code == 304
+    
+    def test_errors_are_not_cached(self):
+        """Test failed requests are passed through uncached."""
+        with TestClient(app) as loaded_client:
+            response = loaded_client.get("/api/search?query=")
+        assert response.status_code == 400
+        assert "etag" not in response.headers
+
+
+class TestSerialization:
+    """Test class for the pre-encoded JSON fast path."""
+    
+    def test_encode_json_embeds_raw_fragments(self):
+        """Test pre-encoded fragments are embedded without re-encoding."""
+        body = encode_json({"count": 2, "items": join_array([b'{"a":1}', b'{"b":"\xc3\xbc"}']), "next": None})
+        
+        assert body == b'{"count":2,"items":[{"a":1},{"b":"\xc3\xbc"}],"next":null}'
+        assert json.loads(body)["items"][1] == {"b": "\u00fc"}
+        assert encode_json(RawJSON(b"[]")) == b"[]"
+        assert encode_json([{"record": RawJSON(b'{"a":1}')}, {"record": None}]) == b'[{"record":{"a":1}},{"record":null}]'
+    
+    @pytest.mark.parametrize("engine", ["rows", "columnar"])
+    def test_encoded_records_match_records(self, engine):
+        """Test every record encodes to JSON that decodes back to it, also after appends."""
+        try:
+            set_storage_engine(engine)
+            reload_data()
+            append_records("equipment", [{"equipment_id": "EQ900", "notes": "new column"}])
+            append_records("maintenance", [{"log_id": "L900", "equipment_id": "EQ900", "cost": "12"}])
+            snapshot = get_snapshot()
+        finally:
+            set_storage_engine("rows")
+            reload_data()
+        
+        for name in ("equipment", "maintenance"):
+            state = snapshot.dataset(name)
+            fragments = get_encoded_records(name, range(len(state.records)), snapshot)
+            assert [json.loads(fragment) for fragment in fragments] == list(state.records)
+            # Only the rows engine keeps the bytes of every record
+            assert (state.encoded is None) == (engine == "columnar")
+    
+    def test_responses_match_standard_encoding(self):
+        """Test fast-path responses decode to the same records as the stored data."""
+        with TestClient(app) as loaded_client:
+            response = loaded_client.get("/api/maintenance?limit=3")
+            projected = loaded_client.get("/api/equipment?fields=equipment_id,status&limit=2")
+            records = get_maintenance_logs()
+        
+        assert response.headers["content-type"] == "application/json"
+        assert response.json()["maintenance"] == list(records[:3])
+        assert response.content == dumps(response.json())
+        assert projected.json()["equipment"][0].keys() == {"equipment_id", "status"}
+
+
+class TestRelationshipGraph:
+    """Test class for relationship queries over the equipment-maintenance graph."""
+    
+    def setup_method(self):
+        reload_data()
+    
+    def test_multi_hop_technicians(self):
+        """Test finding technicians who worked on transformers at a location."""
+        related = find_related("technicians", {"equipment_type": "transformer", "location": "Substation Alpha"})
+        
+        assert related["results"] == [{"name": "John Smith", "count": 1, "equipment": ["EQ001"]}]
+    
+    def test_technician_to_equipment_attributes(self):
+        """Test walking from a technician to the locations of the equipment they maintained."""
+        related = find_related("locations", {"technician": "john smith"})
+        assert [result["name"] for result in related["results"]] == ["Substation Alpha"]
+        
+        # Equipment without logs is still a node of the graph
+        equipment = find_related("equipment", {"equipment_type": "Transformer"})
+        assert {result["name"]: result["count"] for result in equipment["results"]} == {"EQ001": 1, "EQ006": 0}
+    
+    def test_graph_follows_appends(self):
+        """Test appended logs are linked into the graph incrementally."""
+        append_records("maintenance", [{"log_id": "L900", "equipment_id": "EQ006", "technician": "John Smith"}])
+        related = find_related("equipment", {"technician": "John Smith", "equipment_type": "transformer"})
+        
+        assert {result["name"] for result in related["results"]} == {"EQ001", "EQ006"}
+    
+    def test_only_known_equipment_is_related(self):
+        """Test unknown equipment ids, and orphans reached through logs, are not graph nodes."""
+        assert find_related("equipment", {"equipment_id": "NOPE"})["results"] == []
+        assert find_related("technicians", {"equipment_id": "NOPE"})["count"] == 0
+        assert [result["name"] for result in find_related("equipment", {"equipment_id": "eq001"})["results"]] == ["EQ001"]
+        
+        append_records("maintenance", [{"log_id": "L901", "equipment_id": "EQ404", "technician": "Orphan Tech"}])
+        assert find_related("equipment", {"technician": "orphan tech"})["results"] == []
+    
+    def test_invalid_queries(self):
+        """Test unknown targets and unfiltered queries are rejected."""
+        with pytest.raises(ValueError):
+            find_related("models", {"location": "Substation Alpha"})
+        with pytest.raises(ValueError):
+            find_related("technicians", {})
+    
+    def test_relationship_endpoints(self):
+        """Test the per-equipment summary and multi-hop endpoints."""
+        with TestClient(app) as loaded_client:
+            summary = loaded_client.get("/api/equipment/EQ001/relationships")
+            missing = loaded_client.get("/api/equipment/UNKNOWN/relationships")
+            related = loaded_client.get("/api/relationships/technicians?equipment_type=Transformer&location=Substation Alpha")
+            unfiltered = loaded_client.get("/api/relationships/technicians")
+            unknown = loaded_client.get("/api/relationships/models?location=Substation Alpha")
+        
+        assert summary.status_code == 200
+        assert summary.json()["summary"]["technicians_involved"] == ["John Smith"]
+        assert missing.status_code == 404
+        assert related.json()["results"][0]["name"] == "John Smith"
+        assert unfiltered.status_code == 400
+        assert unknown.status_code == 404
+
+
+class TestCostAnalytics:
+    """Test class for the materialized maintenance cost aggregates."""
+    
+    def setup_method(self):
+        reload_data()
+    
+    def test_rollups_match_logs(self):
+        """Test every dimension matches a direct computation over the logs."""
+        logs = get_maintenance_logs()
+        equipment = {record["equipment_id"]: record for record in get_equipment_data()}
+        
+        for dimension in ("location", "equipment_type", "technician", "month"):
+            expected = {}
+            for log in logs:
+                if dimension == "month":
+                    key = log["date"][:7]
+                elif dimension == "technician":
+                    key = log["technician"]
+                else:
+                    key = equipment[log["equipment_id"]][dimension]
+                expected.setdefault(key, []).append(log["cost"])
+            
+            rollup = {key: format_cost_stats(stat) for key, stat in cost_rollup(dimension).items()}
+            assert rollup == {key: {"count": len(costs), "sum": round(sum(costs), 2),
+                                    "mean": round(sum(costs) / len(costs), 2), "min": min(costs), "max": max(costs)}
+                              for key, costs in expected.items()}
+    
+    def test_appends_update_aggregates_without_touching_old_snapshot(self):
+        """Test appended logs update the aggregates copy-on-write."""
+        before = get_snapshot()
+        append_records("maintenance", [
+            {"log_id": "L900", "equipment_id": "EQ001", "technician": "John Smith", "date": "2024-01-30", "cost": 1000},
+            {"log_id": "L901", "equipment_id": "EQ001", "technician": "John Smith", "date": "2024-03-01"}
+        ])
+        
+        assert format_cost_stats(cost_rollup("technician")["John Smith"]) == {
+            "count": 3, "sum": 1250.0, "mean": 625.0, "min": 250.0, "max": 1000.0
+        }
+        assert cost_rollup("location")["Substation Alpha"][0] == 3
+        assert cost_rollup("month")["2024-03"][:2] == [1, 0]
+        assert cost_rollup("technician", before)["John Smith"][0] == 1
+        assert cost_rollup("location", before)["Substation Alpha"][0] == 1
+    
+    def test_cost_analytics_endpoint(self):
+        """Test grouping, ordering and validation of the analytics endpoint."""
+        with TestClient(app) as loaded_client:
+            response = loaded_client.get("/api/analytics/costs?group_by=location&sort=sum&limit=2")
+            by_month = loaded_client.get("/api/analytics/costs?group_by=month")
+            invalid = loaded_client.get("/api/analytics/costs?group_by=model")
+        
+        data = response.json()
+        assert data["total"]["count"] == 7
+        assert data["group_count"] == 7 and len(data["groups"]) == 2
+        assert data["groups"][0] == {"key": "Pump Station Delta", "count": 1, "sum": 2500.0,
+                                     "mean": 2500.0, "min": 2500.0, "max": 2500.0}
+        assert [group["key"] for group in by_month.json()["groups"]] == ["2023-12", "2024-01", "2024-02"]
+        assert invalid.status_code == 400
+
+
+class TestSnapshotFile:
+    """Test class for on-disk dataset snapshots."""
+    
+    def setup_method(self):
+        self.source = None
+    
+    def teardown_method(self):
+        set_storage_engine("rows")
+        reload_data()
+    
+    def _load(self):
+        assert load_maintenance_logs(self.source)
+        return get_snapshot().maintenance
+    
+    @pytest.mark.parametrize("engine", ["rows", "columnar"])
+    def test_snapshot_restores_state(self, engine, tmp_path, monkeypatch):
+        """Test a second load is served from the snapshot with identical data and indexes."""
+        monkeypatch.setattr(data_processor, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+        self.source = tmp_path / "logs.json"
+        shutil.copy("data/maintenance_logs.json", self.source)
+        set_storage_engine(engine)
+        
+        parsed = self._load()
+        restored = self._load()
+        
+        assert "snapshot" not in parsed.stats and restored.stats["snapshot"]
+        assert restored.version != parsed.version
+        assert list(restored.records) == list(parsed.records)
+        assert restored.encoded == parsed.encoded
+        assert search_row_ids("maintenance", "oil") == [0]
+        assert filter_row_ids("maintenance", {"technician": "john smith"}) == [0]
+        
+        # Restored states accept appends like parsed ones
+        append_records("maintenance", [{"log_id": "L900", "equipment_id": "EQ001", "cost": 5}])
+        assert get_maintenance_logs()[-1]["log_id"] == "L900"
+    
+    def test_snapshot_invalidated_by_source_changes(self, tmp_path, monkeypatch):
+        """Test edited sources are re-parsed while touched but unchanged ones are not."""
+        monkeypatch.setattr(data_processor, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+        self.source = tmp_path / "logs.json"
+        shutil.copy("data/maintenance_logs.json", self.source)
+        self._load()
+        
+        stat = os.stat(self.source)
+        os.utime(self.source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert self._load().stats.get("snapshot")
+        
+        logs = json.loads(self.source.read_text())
+        self.source.write_text(json.dumps(logs[:3]))
+        changed = self._load()
+        assert "snapshot" not in changed.stats and len(changed.records) == 3
+        assert len(self._load().records) == 3
+    
+    def test_corrupt_snapshot_is_ignored(self, tmp_path, monkeypatch):
+        """Test an unreadable snapshot falls back to parsing the source."""
+        monkeypatch.setattr(data_processor, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+        self.source = tmp_path / "logs.json"
+        shutil.copy("data/maintenance_logs.json", self.source)
+        self._load()
+        
+        path = snapshot_path("maintenance", "rows", tmp_path / "snapshots")
+        data = path.read_bytes()
+        path.write_bytes(data[:len(data) // 2])
+        
+        reloaded = self._load()
+        assert "snapshot" not in reloaded.stats and len(reloaded.records) == 7
+
+
+class TestSharedData:
+    """Test class for sharing published data generations between workers."""
+    
+    def teardown_method(self):
+        reload_data()
+    
+    def test_workers_attach_and_follow_generations(self, tmp_path):
+        """Test a worker attaches to the supervisor's data and follows other workers' writes."""
+        supervisor = SharedDataStore(tmp_path)
+        assert supervisor.load_and_publish() == 1
+        
+        worker = SharedDataStore(tmp_path)
+        assert worker.attach()
+        assert len(get_equipment_data()) == 10
+        assert not worker.attach()
+        
+        other = SharedDataStore(tmp_path)
+        result = other.write(lambda: append_records("equipment", [{"equipment_id": "EQ900"}]))
+        assert result["accepted"] == 1 and other.generation == 2
+        
+        # Forget the append here, so that only the attached generation brings it back
+        data_processor.ingest_log_path("equipment").unlink()
+        reload_data()
+        assert len(get_equipment_data()) == 10
+        assert worker.attach()
+        assert get_equipment_data()[-1]["equipment_id"] == "EQ900"
+        assert sorted(path.name for path in tmp_path.glob("generation-*")) == ["generation-2"]
+    
+    def test_failed_reload_keeps_generation(self, tmp_path):
+        """Test a source that fails to load publishes nothing."""
+        store = SharedDataStore(tmp_path)
+        store.load_and_publish()
+        
+        assert store.load_and_publish(equipment_path=tmp_path / "missing.csv") is None
+        assert store.read_manifest()["generation"] == 1
+
+
+class TestBenchmarkSupport:
+    """Test class for the synthetic data generator and benchmark helpers."""
+    
+    def teardown_method(self):
+        reload_data()
+    
+    def test_synthetic_data_loads(self, tmp_path):
+        """Test generated files are deterministic, valid and skewed like real data."""
+        equipment_path, maintenance_path = generate_dataset(tmp_path / "a", 500, 5000, seed=7)
+        again, _ = generate_dataset(tmp_path / "b", 500, 5000, seed=7)
+        assert equipment_path.read_bytes() == again.read_bytes()
+        
+        snapshot = reload_data(equipment_path, maintenance_path)
+        assert len(snapshot.equipment.records) == 500 and len(snapshot.maintenance.records) == 5000
+        assert snapshot.equipment.stats["rejected"] == 0 and snapshot.maintenance.stats["rejected"] == 0
+        assert len(validate_data_integrity(snapshot)) < 50
+        
+        ranked = snapshot.entity_catalog["ranked"]["equipment_types"]
+        assert ranked[0][0] == "Meter" and ranked[0][1] > ranked[-1][1] * 5
+    
+    def test_ndjson_output(self, tmp_path):
+        """Test maintenance logs can be generated as NDJSON."""
+        _, maintenance_path = generate_dataset(tmp_path, 10, 25, ndjson=True)
+        with maintenance_path.open() as f:
+            assert len(list(iter_json_records(f))) == 25
+    
+    def test_regression_comparison(self):
+        """Test percentiles and the detection of slower endpoints."""
+        assert percentile([5, 1, 3, 2, 4], 0.5) == 3
+        assert percentile(list(range(1, 101)), 0.99) == 99
+        
+        def run(p99):
+            return {"equipment": 10, "maintenance": 100, "engine": "rows",
+                    "load": {"equipment_seconds": 1.0, "maintenance_seconds": 1.0, "reload_seconds": 1.0},
+                    "endpoints": {"GET /api/search": {"p99_ms": p99}}}
+        
+        regressions = compare({"runs": [run(3.0)]}, {"runs": [run(2.0)]})
+        assert [regression["metric"] for regression in regressions] == ["GET /api/search p99"]
+        assert compare({"runs": [run(2.1)]}, {"runs": [run(2.0)]}) == []
+
+
+class TestDateIndex:
+    """Test class for the sorted date indexes, date-range filters and the maintenance schedule."""
+    
+    def setup_method(self):
+        reload_data()
+    
+    def teardown_method(self):
+        reload_data()
+    
+    def test_date_ordinal(self):
+        """Test dates, datetimes and missing or invalid values."""
+        assert date_ordinal("2024-01-10") == date(2024, 1, 10).toordinal()
+        assert date_ordinal("2024-01-10T08:30:00") == date(2024, 1, 10).toordinal()
+        assert date_ordinal(date(2024, 1, 10)) == date(2024, 1, 10).toordinal()
+        assert date_ordinal(None) == date_ordinal("") == date_ordinal("soon") == 0
+    
+    def test_date_range_filters(self):
+        """Test range filters match a scan of the records, alone and with equality filters."""
+        logs = get_maintenance_logs()
+        start, end = date(2024, 2, 1), date(2024, 3, 31)
+        expected = [row_id for row_id, log in enumerate(logs) if start <= date.fromisoformat(log["date"]) <= end]
+        assert expected
+        assert filter_row_ids("maintenance", {}, date_ranges={"date": (start, end)}) == expected
+        assert filter_row_ids("maintenance", {}, date_ranges={"date": (None, None)}) == range(len(logs))
+        
+        technician = logs[expected[0]]["technician"]
+        combined = filter_row_ids("maintenance", {"technician": technician},
+                                  date_ranges={"date": (start, None), "next_scheduled": (None, date(2030, 1, 1))})
+        assert expected[0] in combined
+        assert all(logs[row_id]["technician"] == technician for row_id in combined)
+        
+        with pytest.raises(ValueError):
+            filter_row_ids("maintenance", {}, date_ranges={"cost": (start, end)})
+        
+        with TestClient(app) as loaded_client:
+            response = loaded_client.get("/api/maintenance?date_from=2024-02-01&date_to=2024-03-31&fields=log_id")
+            assert response.json()["count"] == len(expected)
+            assert loaded_client.get("/api/maintenance?date_from=2024-02-30").status_code == 400
+            response = loaded_client.get("/api/equipment?installed_to=2018-12-31&fields=installation_date")
+            assert all(record["installation_date"] <= "2018-12-31" for record in response.json()["equipment"])
+    
+    def test_appended_dates_stay_sorted(self):
+        """Test appended records are placed in date order without changing the old snapshot."""
+        before = get_snapshot()
+        append_records("maintenance", [
+            {"log_id": "D1", "equipment_id": "EQ001", "date": "2023-06-01"},
+            {"log_id": "D2", "equipment_id": "EQ001", "date": "2030-01-01"},
+            {"log_id": "D3", "equipment_id": "EQ001", "date": "not a date"}
+        ])
+        index = get_snapshot().maintenance.date_index["date"]
+        dates, rows = index["dates"].merged()
+        assert list(dates) == sorted(dates)
+        assert len(rows) == len(before.maintenance.date_index["date"]["dates"]) + 2
+        assert index["by_row"][-1] == 0
+        
+        new_rows = filter_row_ids("maintenance", {}, date_ranges={"date": (date(2023, 6, 1), date(2023, 6, 1))})
+        assert [get_maintenance_logs()[row_id]["log_id"] for row_id in new_rows] == ["D1"]
+        assert filter_row_ids("maintenance", {}, before, {"date": (date(2023, 6, 1), date(2023, 6, 1))}) == []
+    
+    def test_maintenance_schedule(self):
+        """Test only each equipment's latest log counts and windows are resolved by date."""
+        append_records("maintenance", [
+            {"log_id": "S1", "equipment_id": "EQ900", "date": "2024-01-01", "next_scheduled": "2024-02-01"},
+            {"log_id": "S2", "equipment_id": "EQ900", "date": "2024-03-01", "next_scheduled": "2024-09-01"},
+            {"log_id": "S3", "equipment_id": "EQ901", "date": "2024-03-01", "next_scheduled": "2024-06-15"}
+        ])
+        logs = get_maintenance_logs()
+        
+        def scheduled(status, as_of, days=30):
+            return [logs[row_id]["log_id"] for row_id in maintenance_schedule(status, as_of, days)
+                    if logs[row_id]["equipment_id"] in ("EQ900", "EQ901")]
+        
+        assert scheduled("overdue", date(2024, 7, 1)) == ["S3"]
+        assert scheduled("overdue", date(2024, 12, 1)) == ["S3", "S2"]
+        assert scheduled("upcoming", date(2024, 6, 1)) == ["S3"]
+        assert scheduled("upcoming", date(2024, 6, 1), days=100) == ["S3", "S2"]
+        assert scheduled("upcoming", date(2024, 6, 16)) == []
+        
+        with TestClient(app) as loaded_client:
+            response = loaded_client.get("/api/maintenance/schedule?status=overdue&as_of=2030-01-01&fields=log_id")
+            assert response.status_code == 200 and response.json()["count"] > 0
+            assert loaded_client.get("/api/maintenance/schedule?status=late").status_code == 400
+
+
+class TestBatchQueries:
+    """Test class for the batch query endpoint and the lookups its queries share."""
+    
+    def test_schedule_is_carried_across_appends(self):
+        """Test appends update a built schedule with their own logs and leave older snapshots' schedules alone."""
+        reference = date(2024, 5, 1)
+        first = get_snapshot()
+        first_overdue = maintenance_schedule("overdue", reference, snapshot=first)
+        for batch in range(5):
+            append_records("maintenance", [
+                {"log_id": f"C{batch}", "equipment_id": "EQ001", "date": f"2024-0{batch + 1}-15",
+                 "next_scheduled": f"2024-0{batch + 2}-15"},
+                {"log_id": f"C{batch}-old", "equipment_id": f"EQ8{batch}", "date": "2024-01-01",
+                 "next_scheduled": "2024-04-01"}
+            ])
+            snapshot = get_snapshot()
+            assert snapshot.schedule is not None
+            rebuilt = data_processor._build_schedule(snapshot.maintenance)
+            for status, days in (("overdue", 30), ("upcoming", 30), ("upcoming", 365)):
+                carried = maintenance_schedule(status, reference, days, snapshot)
+                assert carried == rebuilt["entries"].values_between(
+                    *((None, reference.toordinal()) if status == "overdue"
+                      else (reference.toordinal(), reference.toordinal() + days + 1)))
+        
+        logs = get_maintenance_logs()
+        def appended(status, days=30):
+            return [logs[row_id]["log_id"] for row_id in maintenance_schedule(status, reference, days)
+                    if logs[row_id]["log_id"].startswith("C")]
+        
+        assert appended("upcoming", 60) == ["C4"]
+        assert appended("overdue") == [f"C{batch}-old" for batch in range(5)]
+        assert maintenance_schedule("overdue", reference, snapshot=first) == first_overdue
+    
+    QUERIES = [
+        {"id": "transformers", "type": "equipment", "params": {"equipment_type": "Transformer", "fields": ["equipment_id"]}},
+        {"id": "first", "type": "equipment", "params": {"equipment_type": "transformer", "limit": 1}},
+        {"id": "spring", "type": "maintenance", "params": {"date_from": "2024-02-01", "date_to": "2024-03-31"}},
+        {"id": "oil", "type": "search", "params": {"query": "oil", "mode": "substring"}},
+        {"id": "oil again", "type": "search", "params": {"query": "OIL", "mode": "substring"}},
+        {"type": "search", "params": {"query": "oil leak", "mode": "ranked", "limit": 2}}
+    ]
+    
+    def setup_method(self):
+        reload_data()
+    
+    def test_shared_lookups(self):
+        """Test equal lookups are resolved once and prefetched substrings match a scan."""
+        lookups = QueryLookups(get_snapshot())
+        lookups.prefetch_substrings(["ransf", "oil", "ransf"])
+        assert lookups.resolved == 4
+        assert lookups.search_row_ids("equipment", "ransf", "substring") == search_row_ids("equipment", "ransf", "substring")
+        assert lookups.search_row_ids("maintenance", "OIL", "substring") == search_row_ids("maintenance", "oil", "substring")
+        assert lookups.shared == 0
+        
+        first = lookups.filter_row_ids("equipment", {"status": "Active", "location": None})
+        assert lookups.filter_row_ids("equipment", {"status": " active"}) is first
+        assert lookups.search_row_ids("equipment", "alpha transformer") is lookups.search_row_ids("equipment", "transformer alpha")
+        assert (lookups.resolved, lookups.shared) == (6, 2)
+    
+    def test_batch_matches_individual_requests(self):
+        """Test each batch result equals the response of the matching GET request."""
+        with TestClient(app) as loaded_client:
+            response = loaded_client.post("/api/batch", json={"queries": self.QUERIES})
+            assert response.status_code == 200
+            data = response.json()
+            assert data["count"] == len(self.QUERIES)
+            assert data["lookups"]["shared"] >= 2
+            
+            paths = {"equipment": "/api/equipment", "maintenance": "/api/maintenance", "search": "/api/search"}
+            for query, entry in zip(self.QUERIES, data["results"]):
+                params = {name: ",".join(value) if isinstance(value, list) else value
+                          for name, value in query["params"].items()}
+                assert entry["status"] == 200
+                assert entry["result"] == loaded_client.get(paths[query["type"]], params=params).json()
+            assert data["results"][-1]["id"] == len(self.QUERIES) - 1
+    
+    def test_streamed_batch(self):
+        """Test NDJSON streaming sends one line per query and a summary."""
+        with TestClient(app) as loaded_client:
+            response = loaded_client.post("/api/batch?stream=true", json={"queries": self.QUERIES})
+            plain = loaded_client.post("/api/batch", json={"queries": self.QUERIES}).json()
+        
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines[:-1] == plain["results"]
+        assert lines[-1]["summary"]["count"] == len(self.QUERIES)
+    
+    def test_invalid_batches(self):
+        """Test malformed batches are rejected before anything runs."""
+        assert client.post("/api/batch", content=b"not json").status_code == 400
+        assert client.post("/api/batch", json={"queries": []}).status_code == 400
+        assert client.post("/api/batch", json={"queries": [{"type": "equipment"}] * 101}).status_code == 400
+        
+        response = client.post("/api/batch", json={"queries": [
+            {"type": "equipment", "params": {}},
+            {"type": "maintenance", "params": {"location": "Substation Alpha"}}
+        ]})
+        assert response.status_code == 400 and response.json()["detail"].startswith("Query 1:")
+        response = client.post("/api/batch", json={"queries": [{"type": "search", "params": {"query": "a", "limit": 0}}]})
+        assert response.status_code == 400
+        response = client.post("/api/batch", json={"queries": [{"type": "maintenance", "params": {"date_to": "soon"}}]})
+        assert response.json()["detail"] == "Query 0: date_to must be a date (YYYY-MM-DD)"
+        
+        for params, detail in [
+            ({"fields": 5}, "Query 0: fields must be a string or a list of strings"),
+            ({"installed_from": 2020}, "Query 0: installed_from must be a string"),
+            ({"status": True}, "Query 0: status must be a string")
+        ]:
+            response = client.post("/api/batch", json={"queries": [{"type": "equipment", "params": params}]})
+            assert response.status_code == 400 and response.json()["detail"] == detail
+        response = client.post("/api/batch", json={"queries": [{"type": "search", "params": {"query": ["a"]}}]})
+        assert response.json()["detail"] == "Query 0: query must be a string"
+
+
+class TestQueryPool:
+    """Test class for running heavy queries on the bounded worker pool."""
+    
+    def test_admission_and_timeouts(self):
+        """Test queries beyond the queue limit are rejected and waiting ones time out."""
+        pool = QueryPool(workers=1, queue_limit=1, timeout=0.05)
+        release = threading.Event()
+        
+        async def scenario():
+            running = asyncio.ensure_future(pool.run(release.wait, timeout=5))
+            queued = asyncio.ensure_future(pool.run(lambda: "never runs"))
+            await asyncio.sleep(0.01)
+            assert (pool.running, pool.queued) == (1, 1)
+            
+            with pytest.raises(QueryRejected):
+                await pool.run(lambda: None)
+            with pytest.raises(QueryTimeout):
+                await queued
+            
+            release.set()
+            assert await running is True
+            assert await pool.run(sum, [1, 2, 3]) == 6
+        
+        try:
+            asyncio.run(scenario())
+            assert pool.admitted == 0 and pool.running == 0
+        finally:
+            release.set()
+            pool.shutdown()
+    
+    def test_errors_propagate(self):
+        """Test exceptions raised by a query reach the caller."""
+        pool = QueryPool(workers=1, queue_limit=0)
+        try:
+            with pytest.raises(ValueError):
+                asyncio.run(pool.run(int, "not a number"))
+        finally:
+            pool.shutdown()
+    
+    def test_overload_responses(self, monkeypatch):
+        """Test overload and timeouts are answered with 503 and 504, and cheap lookups stay inline."""
+        async def rejected(func, *args, timeout=None):
+            raise QueryRejected("full")
+        
+        async def timed_out(func, *args, timeout=None):
+            raise QueryTimeout("Query did not finish within 10s")
+        
+        monkeypatch.setattr(api_module.query_pool, "run", rejected)
+        # A query no other test sends, so the response cache cannot answer it
+        response = client.get("/api/search?query=overloaded%20pool")
+        assert response.status_code == 503 and response.headers["retry-after"] == "1"
+        assert client.get("/health/live").status_code == 200
+        assert client.get("/metrics").status_code == 200
+        
+        # Small list pages are built inline, larger ones (or every record, without a limit) on the pool
+        monkeypatch.setattr(api_module, "INLINE_PAGE_SIZE", 2)
+        assert client.get("/api/equipment?limit=2&fields=equipment_id,location").status_code == 200
+        assert client.get("/api/equipment?fields=equipment_id,location").status_code == 503
+        assert client.get("/api/maintenance?limit=3&fields=log_id,cost").status_code == 503
+        
+        # The status check probed by load balancers reads the issues computed at publish time
+        snapshot = reload_data()
+        assert snapshot.integrity_issues is not None
+        assert client.get("/").json()["data_version"] == snapshot.version
+        
+        monkeypatch.setattr(api_module.query_pool, "run", timed_out)
+        response = client.get("/api/analytics/costs?group_by=technician&limit=7")
+        assert response.status_code == 504 and "10s" in response.json()["detail"]
+
+
+class TestMetrics:
+    """Test class for request metrics, the /metrics endpoint and the slow-request profiler."""
+    
+    @classmethod
+    def setup_class(cls):
+        """Load the data so load metrics exist when this class runs on its own."""
+        load_equipment_data()
+        load_maintenance_logs()
+    
+    def setup_method(self):
+        self.client = TestClient(app)
+    
+    def test_metric_rendering(self):
+        """Test counters and histograms render in the Prometheus text format."""
+        counter = Counter("test_total", "A counter", ("kind",))
+        counter.inc(kind="a")
+        counter.inc(2, kind='say "hi"')
+        assert 'test_total{kind="a"} 1' in counter.render()
+        assert 'test_total{kind="say \\"hi\\""} 2' in counter.render()
+        
+        histogram = Histogram("test_seconds", "A histogram", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value)
+        lines = histogram.render().splitlines()
+        assert "# TYPE test_seconds histogram" in lines
+        assert 'test_seconds_bucket{le="0.1"} 1' in lines
+        assert 'test_seconds_bucket{le="1"} 2' in lines
+        assert 'test_seconds_bucket{le="+Inf"} 3' in lines
+        assert "test_seconds_count 3" in lines and "test_seconds_sum 5.55" in lines
+    
+    def test_requests_labelled_by_route(self):
+        """Test requests are counted by route template, including cache hits."""
+        route = "/api/equipment/{equipment_id}/relationships"
+        before = REQUEST_LATENCY.count(method="GET", route=route)
+        self.client.get("/api/equipment/EQ001/relationships")
+        self.client.get("/api/equipment/EQ002/relationships")
+        self.client.get("/api/equipment/EQ002/relationships")
+        assert REQUEST_LATENCY.count(method="GET", route=route) == before + 3
+        
+        before = REQUESTS.value(method="GET", route="unmatched", status="404")
+        self.client.get("/no/such/route")
+        assert REQUESTS.value(method="GET", route="unmatched", status="404") == before + 1
+    
+    def test_metrics_endpoint(self):
+        """Test the exposition includes request, data, index and cache metrics."""
+        misses = INDEX_LOOKUPS.value(index="search_token", result="miss")
+        self.client.get("/api/search?query=nomatchanywhere")
+        assert INDEX_LOOKUPS.value(index="search_token", result="miss") == misses + 2
+        
+        response = self.client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        body = response.text
+        assert 'http_requests_total{method="GET",route="/api/search",status="200"}' in body
+        assert f'data_records{{dataset="equipment"}} {len(get_equipment_data())}' in body
+        assert "http_requests_in_flight 1" in body  # the scrape itself
+        assert 'response_cache_lookups_total{result="hit"}' in body
+        assert 'data_load_duration_seconds_count{dataset="maintenance",source="parse"}' in body
+    
+    def test_slow_requests_are_profiled(self, monkeypatch):
+        """Test sampled requests slower than the threshold keep a profile report."""
+        request_profiler = RequestProfiler(slow_seconds=1e-9, sample_rate=1.0)
+        profile = request_profiler.start()
+        assert profile is not None
+        assert request_profiler.start() is None
+        sum(range(10000))
+        request_profiler.finish(profile, "GET", "/api/search", 0.5)
+        assert request_profiler.profiles[0]["path"] == "/api/search"
+        assert "function calls" in request_profiler.profiles[0]["report"]
+        
+        assert RequestProfiler(slow_seconds=0).start() is None
+        
+        def other_request_work():
+            return sum(range(1000))
+        
+        def profiled_handler_work():
+            return sum(range(1000))
+        
+        async def handler(scope, receive, send):
+            profiled_handler_work()
+            await asyncio.sleep(0.01)
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+        
+        async def other_request():
+            for _ in range(5):
+                other_request_work()
+                await asyncio.sleep(0.001)
+        
+        async def send(message):
+            pass
+        
+        async def scenario():
+            middleware = MetricsMiddleware(handler, RequestProfiler(slow_seconds=1e-9, sample_rate=1.0))
+            await asyncio.gather(middleware({"type": "http", "method": "GET", "path": "/slow"}, None, send),
+                                 other_request())
+            return middleware.profiler.profiles[0]["report"]
+        
+        report = asyncio.run(scenario())
+        assert "profiled_handler_work" in report
+        assert "other_request_work" not in report
+        assert self.client.get("/admin/profiles").status_code == 403
+        monkeypatch.setattr(api_module, "ADMIN_TOKEN", ADMIN_HEADERS["X-Admin-Token"])
+        assert self.client.get("/admin/profiles", headers=ADMIN_HEADERS).status_code == 200
+
+
+class TestShardedLoading:
+    """Test class for loading a directory or glob of data shards."""
+    
+    def teardown_method(self):
+        set_storage_engine("rows")
+        reload_data()
+    
+    def _write_shards(self, directory):
+        """Split the sample logs over JSON, NDJSON and CSV shards; LOG003 and LOG006 are re-exported with a change."""
+        logs = json.loads(open("data/maintenance_logs.json", encoding="utf-8").read())
+        directory.mkdir()
+        (directory / "2024-01.json").write_text(json.dumps(logs[:4]), encoding="utf-8")
+        updated = dict(logs[2], technician="Dana Cruz")
+        repriced = dict(logs[5], cost=1.5)
+        (directory / "2024-02.ndjson").write_text("\n".join(json.dumps(record) for record in [
+            updated, {"equipment_id": "EQ001"}, logs[4]
+        ]), encoding="utf-8")
+        with open(directory / "2024-03.csv", "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(logs[5]))
+            writer.writeheader()
+            writer.writerows(logs[5:] + [repriced])
+        (directory / "notes.txt").write_text("not a shard", encoding="utf-8")
+        
+        expected = directory.parent / "expected.ndjson"
+        csv_logs = [{key: "" if value is None else str(value) for key, value in record.items()}
+                    for record in logs[6:] + [repriced]]
+        expected.write_text("\n".join(json.dumps(record) for record in
+                                      logs[:2] + [logs[3], updated, logs[4]] + csv_logs), encoding="utf-8")
+        return expected
+    
+    @pytest.mark.parametrize("engine", ["rows", "columnar"])
+    def test_shards_merge_with_deduplication(self, engine, tmp_path):
+        """Test shards load like one file holding each id's latest record."""
+        expected_file = self._write_shards(tmp_path / "shards")
+        set_storage_engine(engine)
+        assert load_maintenance_logs(expected_file)
+        expected = get_snapshot().maintenance
+        assert load_maintenance_logs(tmp_path / "shards")
+        state = get_snapshot().maintenance
+        
+        assert list(state.records) == list(expected.records)
+        assert [record["log_id"] for record in state.records][:4] == ["LOG001", "LOG002", "LOG004", "LOG003"]
+        assert state.encoded == expected.encoded
+        assert state.search_index == expected.search_index
+        assert state.filter_index == expected.filter_index
+        assert state.entity_counts == expected.entity_counts
+        assert state.references == expected.references
+        assert state.aggregates == expected.aggregates
+        assert state.date_index == expected.date_index
+        assert state.stats["shards"] == 3 and state.stats["duplicates"] == 2
+        assert state.aggregates["total"]["all"][3] == 1.5
+        assert state.stats["rejected"] == 1
+        assert state.stats["errors"] == [{"record": 1, "error": "missing log_id", "shard": "2024-02.ndjson"}]
+        assert filter_row_ids("maintenance", {"technician": "dana cruz"}) == [3]
+    
+    def test_parallel_load_matches_sequential(self, tmp_path, monkeypatch):
+        """Test shards parsed in worker processes give the same state as in-process parsing."""
+        self._write_shards(tmp_path / "shards")
+        source = tmp_path / "shards" / "2024-0*"
+        
+        monkeypatch.setattr(data_processor, "LOAD_WORKERS", 1)
+        assert load_maintenance_logs(source)
+        sequential = get_snapshot().maintenance
+        monkeypatch.setattr(data_processor, "LOAD_WORKERS", 2)
+        assert load_maintenance_logs(source)
+        parallel = get_snapshot().maintenance
+        
+        assert parallel.stats["workers"] == 2
+        assert list(parallel.records) == list(sequential.records)
+        assert parallel.search_index == sequential.search_index
+        assert parallel.date_index == sequential.date_index
+    
+    def test_sharded_source_snapshots_and_watching(self, tmp_path, monkeypatch):
+        """Test snapshots and the file watcher notice shards being added."""
+        monkeypatch.setattr(data_processor, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+        shards = tmp_path / "shards"
+        self._write_shards(shards)
+        assert not load_maintenance_logs(tmp_path / "missing" / "*.json")
+        
+        assert load_maintenance_logs(shards)
+        assert load_maintenance_logs(shards)
+        assert get_snapshot().maintenance.stats.get("snapshot")
+        signature = file_signature([shards])
+        
+        (shards / "2024-04.ndjson").write_text(json.dumps({"log_id": "L100", "equipment_id": "EQ001"}),
+                                               encoding="utf-8")
+        assert file_signature([shards]) != signature
+        assert load_maintenance_logs(shards)
+        state = get_snapshot().maintenance
+        assert "snapshot" not in state.stats and state.records[-1]["log_id"] == "L100"
+
+
+
+class TestAutocomplete:
+    """Test class for prefix autocomplete over ids and entity names."""
+    
+    def setup_method(self):
+        load_equipment_data()
+        load_maintenance_logs()
+        self.client = TestClient(app)
+    
+    def test_prefix_index_ranks_by_frequency(self):
+        """Test matches are case-insensitive, most frequent first and limited."""
+        index = build_prefix_index({"Substation Alpha": 3, "substation beta": 5, "Sub Gamma": 3,
+                                    "Pump Station": 9, "": 4})
+        assert prefix_matches(index, "sub", 10) == [("substation beta", 5), ("Sub Gamma", 3), ("Substation Alpha", 3)]
+        assert prefix_matches(index, "SUBSTATION ", 1) == [("substation beta", 5)]
+        assert prefix_matches(index, "", 2) == [("Pump Station", 9), ("substation beta", 5)]
+        assert prefix_matches(index, "x", 10) == []
+        assert prefix_matches(build_prefix_index({}), "a", 10) == []
+    
+    def test_prefix_index_matches_full_scan(self):
+        """Test the tree lookup agrees with sorting every match."""
+        names = {f"{'ab'[i % 2]}{'abc'[i % 3]}{i}": (i * 7) % 5 for i in range(300)}
+        index = build_prefix_index(names)
+        for prefix in ("", "a", "ab", "ba1", "bc29", "z"):
+            for limit in (1, 4, 500):
+                expected = sorted(((name, count) for name, count in names.items() if name.startswith(prefix)),
+                                  key=lambda match: (-match[1], match[0]))[:limit]
+                assert prefix_matches(index, prefix, limit) == expected
+    
+    def test_autocomplete_categories(self):
+        """Test suggestions of ids and entities from the loaded data."""
+        suggestions = autocomplete("EQ00", ["equipment_ids", "log_ids"], 2)
+        assert [match["value"] for match in suggestions["equipment_ids"]] == ["EQ001", "EQ002"]
+        assert suggestions["log_ids"] == []
+        
+        counts = get_snapshot().entity_counts["locations"]
+        assert autocomplete("substation", ["locations"], 10)["locations"] == [
+            {"value": name, "count": count} for name, count in
+            sorted(((name, count) for name, count in counts.items() if name.lower().startswith("substation")),
+                   key=lambda match: (-match[1], match[0].casefold()))
+        ]
+        with pytest.raises(ValueError):
+            autocomplete("a", ["serial_numbers"])
+    
+    def test_autocomplete_endpoint(self):
+        """Test the endpoint validates its parameters and reuses the snapshot's indexes."""
+        response = self.client.get("/api/autocomplete", params={"prefix": "log", "limit": 3})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["data_version"] == get_snapshot().version
+        assert [match["value"] for match in data["suggestions"]["log_ids"]] == ["LOG001", "LOG002", "LOG003"]
+        assert set(data["suggestions"]) == set(AUTOCOMPLETE_CATEGORIES)
+        assert "log_ids" in get_snapshot().autocomplete
+        
+        response = self.client.get("/api/autocomplete", params={"prefix": "s", "categories": "technicians"})
+        assert list(response.json()["suggestions"]) == ["technicians"]
+        assert self.client.get("/api/autocomplete", params={"prefix": " "}).status_code == 400
+        assert self.client.get("/api/autocomplete", params={"prefix": "a", "categories": "models"}).status_code == 400
+    
+    def test_indexes_are_carried_across_appends(self):
+        """Test appends extend built indexes to match a rebuild and leave older snapshots' indexes alone."""
+        first = get_snapshot()
+        first_suggestions = autocomplete("", AUTOCOMPLETE_CATEGORIES, 5, first)
+        for batch in range(12):
+            if batch % 4 == 3:
+                append_records("equipment", [{"equipment_id": f"EQ9{batch:02d}", "location": "Substation Carry",
+                                              "equipment_type": "Transformer"}])
+            else:
+                append_records("maintenance", [
+                    {"log_id": f"LOG9{batch:02d}{i}", "equipment_id": f"EQ00{1 + i % 3}",
+                     "technician": f"Carry {i % 2}", "date": "2024-05-01"} for i in range(batch + 1)
+                ])
+            snapshot = get_snapshot()
+            assert set(snapshot.autocomplete) == set(AUTOCOMPLETE_CATEGORIES)
+            for category in AUTOCOMPLETE_CATEGORIES:
+                rebuilt = build_prefix_index(data_processor._autocomplete_counts(category, snapshot))
+                for prefix in ("", "c", "eq00", "log9", "substation"):
+                    assert autocomplete(prefix, [category], 4, snapshot)[category] == [
+                        {"value": name, "count": count} for name, count in prefix_matches(rebuilt, prefix, 4)]
+        
+        assert autocomplete("", ["technicians"], 2)["technicians"][:1] == [{"value": "Carry 0", "count": 30}]
+        assert autocomplete("", AUTOCOMPLETE_CATEGORIES, 5, first) == first_suggestions
+
+
+class TestSegments:
+    """Test class for the append-friendly containers shared between snapshots."""
+    
+    def test_segmented_list_forks_are_independent(self):
+        """Test appends to a fork leave the original as it was, across segment boundaries."""
+        base = SegmentedList(range(SEGMENT_SIZE + 5))
+        first, second = base.fork(), base.fork()
+        first.extend(range(SEGMENT_SIZE))
+        second.append("x")
+        
+        assert list(base) == list(range(SEGMENT_SIZE + 5))
+        assert len(first) == 2 * SEGMENT_SIZE + 5 and first[-1] == SEGMENT_SIZE - 1
+        assert second[SEGMENT_SIZE + 5] == "x" and len(second) == SEGMENT_SIZE + 6
+        assert first[SEGMENT_SIZE:SEGMENT_SIZE + 6] == [SEGMENT_SIZE, SEGMENT_SIZE + 1, SEGMENT_SIZE + 2,
+                                                         SEGMENT_SIZE + 3, SEGMENT_SIZE + 4, 0]
+        assert pickle.loads(pickle.dumps(second)) == second
+    
+    def test_layered_dict_and_sorted_runs(self):
+        """Test layers read like one dict and runs like one sorted list, however many batches were added."""
+        mapping, runs, expected = {}, SortedRuns(), {}
+        for batch in range(50):
+            changes = {batch % 10: batch, 100 + batch: batch}
+            mapping = layered(mapping, changes)
+            expected.update(changes)
+            runs = runs.added(sorted([batch % 10, 100 + batch]))
+        
+        assert dict(mapping) == expected and len(mapping) == len(expected)
+        assert len(mapping.layers) <= 8
+        assert list(runs) == sorted([batch % 10 for batch in range(50)] + list(range(100, 150)))
+        assert 149 in runs and 50 not in runs
+        assert len(runs.runs) <= 8
+    
+    def test_append_array_keeps_older_views(self):
+        """Test appending past an older view, or twice to the same one, never changes what it shows."""
+        base = append_array(array("l"), [1, 2, 3])
+        newer = append_array(base, [4])
+        branch = append_array(base, [5])
+        
+        assert list(base) == [1, 2, 3]
+        assert list(newer) == [1, 2, 3, 4]
+        assert list(branch) == [1, 2, 3, 5]
+        assert plain_array(newer) == array("l", [1, 2, 3, 4])
+        with pytest.raises(TypeError):
+            newer[0] = 9
+
+
+
 # Optional: Run tests directly
 if __name__ == "__main__":
     print("Running data processing tests.")